@@ -1,22 +1,50 @@
-from flask import Flask, request, jsonify
+from utils.estado_modelo import MonitorModelo  # primero: marca el inicio del proceso
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-from langchain_ollama import ChatOllama
-from langchain_core.prompts import ChatPromptTemplate
 import json
+from collections import Counter
+import logging
+import time
 
 from config import Config
 import traceback
 from tools.rekaliber_tools import obtener_info_rekaliber, obtener_info_kristof
 from tools.database_tools import buscar_propiedades, contar_propiedades
-from prompts.system_prompts import generar_system_prompt
-from utils.helpers import ejecutar_tool, detectar_tool_en_respuesta
+from tools.busqueda_semantica import buscar_propiedades_semantica
+from utils.helpers import _normalize_name
+from utils.ejecutor_tools import EjecutorTools, ToolError
+from utils.cache import obtener_cache
+from utils.cache_conversaciones import obtener_cache_conversaciones
+from utils.cache_http import calcular_etag, comprimir, respuesta_condicional
+from utils.chat_lote import normalizar_items, procesar_lote
+from utils.limites import LimitadorChat
+from utils.logs import Recortado, configurar_logging, muestrear, nuevo_request_id, request_id_actual
 from utils.database_helpers import (
     obtener_o_crear_usuario,
     crear_conversacion,
     guardar_mensaje,
+    registrar_uso_llm,
     obtener_mensajes_conversacion,
     listar_conversaciones_usuario,
+    get_db_connection,
+    obtener_version_catalogo,
+    resumen_uso_llm,
 )
+from utils.init_db import migrar_esquema
+from utils.llm import estado_backends
+from utils.cascada import (
+    modelos_configurados,
+    nombre_tool,
+    resumen_cascada,
+    responder_charla,
+    responder_final,
+    rutear,
+)
+from utils.resiliencia import CircuitoAbierto, Deadline, DeadlineExcedido
+
+# ===== LOGGING =====
+configurar_logging()
+logger = logging.getLogger("chatbot")
 
 # ===== INICIALIZAR APP =====
 app = Flask(__name__)
@@ -25,48 +53,142 @@ app.config.from_object(Config)
 # ===== CONFIGURAR CORS =====
 CORS(app, resources={r"/*": {"origins": "*"}})
 
+# ===== COMPRESIÓN =====
+app.after_request(comprimir)
+
+# ===== REQUEST ID =====
+@app.before_request
+def asignar_request_id():
+    g.inicio = time.perf_counter()
+    g.request_id = request.headers.get("X-Request-ID") or nuevo_request_id()
+    request_id_actual.set(g.request_id)
+
+
+@app.after_request
+def registrar_peticion(response):
+    response.headers["X-Request-ID"] = g.get("request_id", "")
+    logger.info(
+        "%s %s %s",
+        request.method,
+        request.path,
+        response.status_code,
+        extra={"status": response.status_code, "ms": round((time.perf_counter() - g.inicio) * 1000, 1)},
+    )
+    return response
+
+
+# ===== MIGRAR ESQUEMA =====
+_conn = get_db_connection()
+migrar_esquema(_conn)
+_conn.commit()
+_conn.close()
+
 # ===== CONFIGURAR TOOLS =====
-tools = [
-    obtener_info_rekaliber,
-    obtener_info_kristof,
-    buscar_propiedades,
-    contar_propiedades,
-]
-
-# ===== CONFIGURAR MODELO =====
-print(f"🤖 Inicializando modelo: {Config.MODEL_NAME}")
-llm = ChatOllama(model=Config.MODEL_NAME, temperature=Config.MODEL_TEMPERATURE)
-
-# ===== CREAR PROMPT =====
-SYSTEM_PROMPT = generar_system_prompt(tools)
-prompt = ChatPromptTemplate.from_messages(
-    [("system", SYSTEM_PROMPT), ("human", "{input}")]
-)
+# Cada tool declara su timeout y cuántas llamadas simultáneas admite
+ejecutor = EjecutorTools()
+ejecutor.registrar(obtener_info_rekaliber, timeout=2)
+ejecutor.registrar(obtener_info_kristof, timeout=2)
+ejecutor.registrar(buscar_propiedades, timeout=5, max_concurrencia=8)
+ejecutor.registrar(contar_propiedades, timeout=5, max_concurrencia=8)
+ejecutor.registrar(buscar_propiedades_semantica, timeout=10, max_concurrencia=4, en_proceso=True)
+
+tools = ejecutor.tools
+
+# El registro no cambia mientras corre el proceso: /tools y su ETag se arman una vez
+TOOLS_INFO = [{"nombre": tool_obj.name, "descripcion": tool_obj.description} for tool_obj in tools]
+ETAG_TOOLS = calcular_etag(TOOLS_INFO)
+
+# ===== MONITOR DEL MODELO =====
+# El modelo y la cadena se crean en la primera petición (utils/llm.py); el
+# monitor verifica Ollama en segundo plano y opcionalmente precarga el modelo.
+# No arranca al importar: los CLI (chat_lote, reproducir_conversaciones)
+# importan este módulo y no deben lanzar el hilo ni calentar el modelo.
+monitor = MonitorModelo(modelos_configurados())
+
+
+@app.before_request
+def iniciar_monitor():
+    """Bajo un servidor WSGI el monitor arranca con la primera petición"""
+    monitor.iniciar(calentar=Config.MODEL_WARMUP)
+
+# ===== CACHÉ =====
+# Resultados de tools y respuestas finales. Las claves incluyen la versión del
+# catálogo, así que cualquier cambio en `propiedades` las invalida.
+cache = obtener_cache()
+
+
+# ===== LÍMITES DE USO =====
+limitador = LimitadorChat()
+
+
+def rechazo_por_limites(usuario_id=None, mensajes_por_usuario=None):
+    """
+    Respuesta 429 si la petición supera algún límite, o None si puede pasar.
+
+    Para un lote se pasa mensajes_por_usuario ({usuario_id: cantidad}).
+    """
+    rechazo = limitador.verificar_lote(mensajes_por_usuario or {usuario_id: 1}, request.remote_addr)
+    if rechazo is None:
+        return None
+    mensaje, espera = rechazo
+    return (
+        jsonify({"error": mensaje, "reintentar_en_seg": espera}),
+        429,
+        {"Retry-After": str(espera)},
+    )
+
+
+def ejecutar_tool_con_cache(tool_spec, deadline=None, cancelacion=None):
+    """Ejecuta una tool reutilizando resultados recientes de la caché"""
+    if isinstance(tool_spec, dict):
+        nombre, params = tool_spec.get("name"), tool_spec.get("params") or {}
+    else:
+        nombre, params = tool_spec, {}
+    clave = json.dumps(
+        [_normalize_name(nombre), params, obtener_version_catalogo()],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+
+    resultado = cache.get("tools", clave)
+    if resultado is None:
+        resultado = ejecutor.ejecutar(tool_spec, deadline, cancelacion, tools=tools)
+        # Los fallos llegan como ToolError, así que nunca se cachean
+        if resultado is not None:
+            cache.set("tools", clave, resultado, ttl=Config.CACHE_TTL_TOOLS)
+    return resultado
+
+
+def clave_respuesta(user_message: str) -> str:
+    """Clave de caché de una respuesta: modelos, pregunta normalizada y catálogo"""
+    pregunta = " ".join(user_message.lower().split())
+    return json.dumps(
+        [modelos_configurados(), pregunta, obtener_version_catalogo()], ensure_ascii=False
+    )
 
-# ===== CREAR CADENA =====
-chain = prompt | llm
 
 # ===== ENDPOINTS =====
 
 
-@app.route("/chat", methods=["POST"])
-def chat():
+def procesar_chat(data, cancelacion=None):
     """
-    Endpoint para chatear con el asistente que usa tools.
+    Procesa un mensaje de chat completo: ruteo, tool, respuesta y persistencia.
 
-    Body JSON:
-    {
-        "message": "Tu pregunta aquí",
-        "conversacion_id": 123,  // Opcional: ID de conversación existente
-        "usuario_id": 1  // Opcional: ID del usuario (por defecto usa usuario demo)
-    }
+    Lo comparten /chat, /chat/batch y la línea de comandos (utils/chat_lote.py).
 
-    El modelo automáticamente decidirá si usar tools o no.
+    Args:
+        data: {"message", "conversacion_id" (opcional), "usuario_id" (opcional)}
+        cancelacion: threading.Event opcional; si se activa, se abandona la tool en curso
+
+    Returns:
+        (diccionario de respuesta, código HTTP)
     """
-    data = request.json
+    # Plazo total de la petición; cada llamada al modelo y la tool lo respetan
+    deadline = Deadline(Config.CHAT_DEADLINE_SEG)
 
     if not data or "message" not in data:
-        return jsonify({"error": 'El campo "message" es requerido'}), 400
+        return {"error": 'El campo "message" es requerido'}, 400
 
     user_message = data["message"]
     conversacion_id = data.get("conversacion_id")
@@ -84,113 +206,257 @@ def chat():
     try:
         guardar_mensaje(conversacion_id, "usuario", user_message)
     except Exception as e:
-        print(f"[WARNING] Error al guardar mensaje del usuario: {e}")
+        logger.warning("Error al guardar mensaje del usuario: %s", e)
+
+    # El consumo de cada llamada se guarda en cuanto vuelve y se liga al
+    # mensaje del asistente al final, si el turno llega a producirlo
+    uso_ids = []
+
+    def registrar_uso(uso):
+        try:
+            uso_ids.extend(registrar_uso_llm(conversacion_id, [uso]))
+        except Exception as e:
+            logger.warning("Error al registrar el uso del modelo: %s", e)
 
     try:
-        # Primera llamada al modelo
-        print(f"[REQUEST] user_message={user_message}")
-        response = chain.invoke({"input": user_message})
-        response_text = getattr(response, "content", None)
+        logger.info(
+            "Chat recibido",
+            extra={
+                "usuario_id": usuario_id,
+                "conversacion_id": conversacion_id,
+                "mensaje": Recortado(user_message),
+            },
+        )
+
+        # Respuesta reciente a la misma pregunta: no hace falta llamar al modelo
+        clave = clave_respuesta(user_message)
+        cacheada = cache.get("respuestas", clave) if Config.CACHE_TTL_RESPUESTAS > 0 else None
+        if cacheada is not None:
+            try:
+                guardar_mensaje(conversacion_id, "asistente", cacheada["response"])
+            except Exception as e:
+                logger.warning("Error al guardar mensaje del asistente: %s", e)
+            return {
+                "response": cacheada["response"],
+                "conversacion_id": conversacion_id,
+                "tool_used": cacheada["tool_used"],
+                "tool_result": cacheada.get("tool_result") if Config.FLASK_DEBUG else None,
+            }, 200
+
+        # Primera llamada: ruteo (modelo chico, escala al grande si la salida no es válida)
+        ruteo = rutear(tools, user_message, deadline, registrar_uso)
+        response_text = ruteo["texto"]
 
         if response_text is None:
             raise RuntimeError("Respuesta del modelo vacía o inválida")
 
-        if Config.FLASK_DEBUG:
-            print(f"[DEBUG] Respuesta inicial: {response_text}")
+        if ruteo["escalado"]:
+            logger.info("Ruteo escalado", extra={"motivo": ruteo["escalado"], "modelo": ruteo["modelo"]})
+        if logger.isEnabledFor(logging.DEBUG) and muestrear():
+            logger.debug("Respuesta de ruteo (%s): %s", ruteo["modelo"], Recortado(response_text))
 
-        # Detectar si el modelo quiere usar una tool (puede venir con params)
-        tool_spec = detectar_tool_en_respuesta(response_text)
+        # Tool pedida por el modelo (puede venir con params)
+        tool_spec = ruteo["tool_spec"]
 
         if tool_spec:
-            tool_name = (
-                tool_spec.get("name") if isinstance(tool_spec, dict) else str(tool_spec)
+            tool_name = nombre_tool(tool_spec)
+            logger.debug("Tool detectada: %s", tool_name)
+
+            # Ejecutar la tool fuera del hilo de la petición, con su timeout
+            try:
+                tool_result = ejecutar_tool_con_cache(tool_spec, deadline, cancelacion)
+            except ToolError as e:
+                logger.error("%s", e, extra={"tool": tool_name, "status": e.status})
+                return {"error": str(e)}, e.status
+
+            # Segunda llamada con el resultado de la tool
+            context_prompt = f"""Has usado la herramienta '{tool_name}' y obtuviste este resultado:
+
+            {json.dumps(tool_result, ensure_ascii=False, indent=2)}
+
+            Pregunta original del usuario: "{user_message}"
+
+            Ahora responde al usuario de forma natural, clara y amigable usando esta información. 
+            Incluye emojis si es apropiado. NO menciones que usaste una herramienta."""
+
+            final_response, _ = responder_final(
+                tools, context_prompt, tool_name, deadline, registrar_uso
             )
-            if Config.FLASK_DEBUG:
-                print(
-                    f"[DEBUG] Tool detectada: {tool_name} params={tool_spec.get('params') if isinstance(tool_spec, dict) else {}}"
-                )
-
-            # Ejecutar la tool (ejecutar_tool acepta ahora spec o nombre simple)
-            tool_result = ejecutar_tool(tool_spec, tools)
-
-            # Verificar resultado de la tool
-            if isinstance(tool_result, dict) and tool_result.get("error"):
-                # La tool devolvió un error internamente
-                err = tool_result.get("error")
-                print(f"[ERROR] tool '{tool_name}' returned error: {err}")
-                return (
-                    jsonify({"error": f"Tool '{tool_name}' error: {err}"}),
-                    500,
-                )
-
-            if tool_result:
-                # Segunda llamada con el resultado de la tool
-                context_prompt = f"""Has usado la herramienta '{tool_name}' y obtuviste este resultado:
-
-                {json.dumps(tool_result, ensure_ascii=False, indent=2)}
-
-                Pregunta original del usuario: "{user_message}"
-
-                Ahora responde al usuario de forma natural, clara y amigable usando esta información. 
-                Incluye emojis si es apropiado. NO menciones que usaste una herramienta."""
-
-                final_response = chain.invoke({"input": context_prompt})
-
-                final_text = getattr(final_response, "content", None)
-                if final_text is None:
-                    raise RuntimeError("Respuesta final del modelo vacía o inválida")
-
-                # Guardar respuesta del asistente
-                try:
-                    guardar_mensaje(conversacion_id, "asistente", final_text)
-                except Exception as e:
-                    print(f"[WARNING] Error al guardar mensaje del asistente: {e}")
-
-                return jsonify(
-                    {
-                        "response": final_text,
-                        "conversacion_id": conversacion_id,
-                        "tool_used": tool_name,
-                        "tool_result": tool_result if Config.FLASK_DEBUG else None,
-                    }
-                )
-            else:
-                return jsonify({"error": f"Tool '{tool_name}' no encontrada"}), 500
-
-        # Si no necesitó tools, devolver la respuesta directa
+
+            final_text = getattr(final_response, "content", None)
+            if final_text is None:
+                raise RuntimeError("Respuesta final del modelo vacía o inválida")
+
+            # Guardar respuesta del asistente
+            try:
+                guardar_mensaje(conversacion_id, "asistente", final_text, uso_ids=uso_ids)
+            except Exception as e:
+                logger.warning("Error al guardar mensaje del asistente: %s", e)
+
+            cache.set(
+                "respuestas",
+                clave,
+                {"response": final_text, "tool_used": tool_name, "tool_result": tool_result},
+                ttl=Config.CACHE_TTL_RESPUESTAS,
+            )
+
+            return {
+                "response": final_text,
+                "conversacion_id": conversacion_id,
+                "tool_used": tool_name,
+                "tool_result": tool_result if Config.FLASK_DEBUG else None,
+            }, 200
+
+        # Si no necesitó tools, devolver la respuesta directa (modelo de charla)
+        response_text, _ = responder_charla(tools, user_message, ruteo, deadline, registrar_uso)
+        if response_text is None:
+            raise RuntimeError("Respuesta del modelo vacía o inválida")
+
         # Guardar respuesta del asistente
         try:
-            guardar_mensaje(conversacion_id, "asistente", response_text)
+            guardar_mensaje(conversacion_id, "asistente", response_text, uso_ids=uso_ids)
         except Exception as e:
-            print(f"[WARNING] Error al guardar mensaje del asistente: {e}")
+            logger.warning("Error al guardar mensaje del asistente: %s", e)
 
-        return jsonify({
+        cache.set(
+            "respuestas",
+            clave,
+            {"response": response_text, "tool_used": None},
+            ttl=Config.CACHE_TTL_RESPUESTAS,
+        )
+
+        return {
             "response": response_text,
             "conversacion_id": conversacion_id,
             "tool_used": None
-        })
+        }, 200
+
+    except DeadlineExcedido as e:
+        logger.error("Plazo agotado: %s", e)
+        return {"error": "El modelo tardó demasiado en responder"}, 504
+    except CircuitoAbierto as e:
+        logger.error("%s", e)
+        return {"error": "El modelo no está disponible, intenta más tarde"}, 503
 
     except Exception as e:
         tb = traceback.format_exc()
-        print(f"[ERROR] {str(e)}")
-        print(tb)
+        logger.exception("Error procesando el chat: %s", e)
         if Config.FLASK_DEBUG:
-            return jsonify({"error": str(e), "trace": tb}), 500
-        return jsonify({"error": "Internal server error"}), 500
+            return {"error": str(e), "trace": tb}, 500
+        return {"error": "Internal server error"}, 500
+
+
+@app.route("/chat", methods=["POST"])
+def chat():
+    """
+    Endpoint para chatear con el asistente que usa tools.
+
+    Body JSON:
+    {
+        "message": "Tu pregunta aquí",
+        "conversacion_id": 123,  // Opcional: ID de conversación existente
+        "usuario_id": 1  // Opcional: ID del usuario (por defecto usa usuario demo)
+    }
+
+    El modelo automáticamente decidirá si usar tools o no.
+    """
+    data = request.json
+    if not isinstance(data, dict) or "message" not in data:
+        return jsonify({"error": 'El campo "message" es requerido'}), 400
+
+    # Antes de tocar la base de datos o el modelo
+    rechazo = rechazo_por_limites(data.get("usuario_id"))
+    if rechazo:
+        return rechazo
+
+    resultado, status = procesar_chat(data)
+    return jsonify(resultado), status
+
+
+@app.route("/chat/batch", methods=["POST"])
+def chat_batch():
+    """
+    Procesa un lote de mensajes en paralelo y devuelve los resultados en
+    streaming (NDJSON) a medida que terminan.
+
+    Body JSON:
+    {
+        "mensajes": ["pregunta", {"message": "...", "usuario_id": 1}, ...],
+        "usuario_id": 1,  // Opcional: usuario por defecto
+        "workers": 4  // Opcional: acotado por CHAT_LOTE_WORKERS
+    }
+    """
+    data = request.json or {}
+    mensajes = data.get("mensajes") if isinstance(data, dict) else None
+
+    if not isinstance(mensajes, list) or not mensajes:
+        return jsonify({"error": 'El campo "mensajes" debe ser una lista no vacía'}), 400
+    if len(mensajes) > Config.CHAT_LOTE_MAX:
+        return (
+            jsonify({"error": f"Máximo {Config.CHAT_LOTE_MAX} mensajes por lote"}),
+            413,
+        )
+
+    workers = data.get("workers")
+    if workers is None:
+        workers = Config.CHAT_LOTE_WORKERS
+    elif isinstance(workers, bool) or not str(workers).strip().isdigit() or int(workers) < 1:
+        return jsonify({"error": 'El campo "workers" debe ser un entero positivo'}), 400
+    workers = min(int(workers), Config.CHAT_LOTE_WORKERS)
+    items = normalizar_items(mensajes, data.get("usuario_id"))
+
+    usuarios = [item.get("usuario_id") for item in items]
+    if any(u is not None and (not isinstance(u, int) or isinstance(u, bool)) for u in usuarios):
+        return jsonify({"error": 'El campo "usuario_id" debe ser un entero'}), 400
+
+    # Cada mensaje del lote cuenta para los límites de la IP y de su usuario
+    rechazo = rechazo_por_limites(mensajes_por_usuario=Counter(usuarios))
+    if rechazo:
+        return rechazo
+
+    def generar():
+        for linea in procesar_lote(items, procesar_chat, workers):
+            yield json.dumps(linea, ensure_ascii=False) + "\n"
+
+    return Response(generar(), mimetype="application/x-ndjson")
 
 
 @app.route("/tools", methods=["GET"])
 def listar_tools():
-    """Lista todas las tools disponibles"""
-    tools_info = []
-    for tool_obj in tools:
-        tools_info.append(
-            {
-                "nombre": tool_obj.name,
-                "descripcion": tool_obj.description,
-            }
-        )
-    return jsonify({"tools": tools_info})
+    """Lista todas las tools disponibles (304 si el registro no cambió)"""
+    return respuesta_condicional(ETAG_TOOLS, lambda: jsonify({"tools": TOOLS_INFO}))
+
+
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    """Estadísticas de aciertos de la caché (por proceso/worker)"""
+    return jsonify(cache.estadisticas())
+
+
+@app.route("/uso", methods=["GET"])
+def uso_llm():
+    """
+    Consumo del modelo (tokens y tiempos de Ollama) agregado por usuario, tool y etapa.
+
+    Query params opcionales: usuario_id, dias
+    """
+    usuario_id = request.args.get("usuario_id", type=int)
+    dias = request.args.get("dias", type=int)
+    return jsonify(resumen_uso_llm(usuario_id=usuario_id, dias=dias))
+
+
+@app.route("/metricas", methods=["GET"])
+def metricas():
+    """Latencia y escalado por etapa de la cascada, métricas por tool y cachés (por proceso/worker)"""
+    return jsonify(
+        {
+            **resumen_cascada(),
+            **estado_backends(),
+            "tools": ejecutor.metricas(),
+            "limites": limitador.metricas(),
+            "conversaciones": obtener_cache_conversaciones().estadisticas(),
+        }
+    )
 
 
 @app.route("/debug/db", methods=["GET"])
@@ -198,25 +464,39 @@ def debug_db():
     """Endpoint de ayuda para testear la conexión a la base de datos y buscar propiedades."""
     ciudad = request.args.get("ciudad")
     try:
-        resultados = buscar_propiedades(ciudad=ciudad)
-        return jsonify({"ok": True, "result": resultados})
+        # El listado solo cambia con el catálogo: 304 sin consultar si el cliente lo tiene
+        return respuesta_condicional(
+            calcular_etag("debug/db", ciudad, obtener_version_catalogo()),
+            lambda: jsonify({"ok": True, "result": buscar_propiedades.invoke({"ciudad": ciudad})}),
+        )
     except Exception as e:
         tb = traceback.format_exc()
-        print(tb)
+        logger.exception("Error en /debug/db: %s", e)
         return jsonify({"ok": False, "error": str(e), "trace": tb}), 500
 
 
+@app.route("/ready", methods=["GET"])
+def ready():
+    """
+    Readiness: indica si Ollama responde y los modelos están disponibles.
+
+    Usa el último chequeo en segundo plano, no llama a Ollama en la petición.
+    Devuelve 503 mientras el servicio no esté listo.
+    """
+    estado = {**monitor.estado(), **estado_backends()}
+    return jsonify(estado), (200 if estado["listo"] else 503)
+
+
 @app.route("/health", methods=["GET"])
 def health():
-    """Verifica el estado del servicio"""
-    return jsonify(
-        {
-            "status": "ok",
-            "modelo": Config.MODEL_NAME,
-            "tools_disponibles": len(tools),
-            "version": "1.0.0",
-        }
-    )
+    """Verifica que el proceso esté vivo (liveness); ver /ready para el modelo"""
+    estado = {
+        "status": "ok",
+        "modelo": Config.MODEL_NAME,
+        "tools_disponibles": len(tools),
+        "version": "1.0.0",
+    }
+    return respuesta_condicional(calcular_etag(estado), lambda: jsonify(estado))
 
 
 # ===== EJECUTAR APP =====
@@ -230,4 +510,5 @@ if __name__ == "__main__":
     print(f"🔧 Tools disponibles: {len(tools)}")
     print("=" * 50)
 
+    monitor.iniciar(calentar=Config.MODEL_WARMUP)
     app.run(host=Config.FLASK_HOST, port=Config.FLASK_PORT, debug=Config.FLASK_DEBUG)
@@ -11,10 +11,92 @@ class Config:
     MODEL_NAME = os.getenv("MODEL_NAME", "llama3.2:latest")
     MODEL_TEMPERATURE = float(os.getenv("MODEL_TEMPERATURE", "0.5"))
 
+    # Cascada: modelo por etapa (vacío = MODEL_NAME; charla vacío = el de ruteo)
+    MODEL_RUTEO = os.getenv("MODEL_RUTEO", "")
+    MODEL_RESPUESTA = os.getenv("MODEL_RESPUESTA", "")
+    MODEL_CHARLA = os.getenv("MODEL_CHARLA", "")
+
+    # Ollama
+    OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+    OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+    MODEL_WARMUP = os.getenv("MODEL_WARMUP", "True").lower() == "true"
+    MODEL_WARMUP_TIMEOUT = float(os.getenv("MODEL_WARMUP_TIMEOUT", "300"))
+    READY_CHECK_INTERVAL = float(os.getenv("READY_CHECK_INTERVAL", "15"))
+
+    # Plazos de las llamadas al modelo (segundos)
+    LLM_TIMEOUT_CONEXION = float(os.getenv("LLM_TIMEOUT_CONEXION", "5"))
+    LLM_TIMEOUT_LECTURA = float(os.getenv("LLM_TIMEOUT_LECTURA", "120"))
+    LLM_DEADLINE_RUTEO = float(os.getenv("LLM_DEADLINE_RUTEO", "60"))
+    LLM_DEADLINE_RESPUESTA = float(os.getenv("LLM_DEADLINE_RESPUESTA", "90"))
+    LLM_DEADLINE_ESCALADO = float(os.getenv("LLM_DEADLINE_ESCALADO", "60"))
+    LLM_DEADLINE_CHARLA = float(os.getenv("LLM_DEADLINE_CHARLA", "60"))
+    CHAT_DEADLINE_SEG = float(os.getenv("CHAT_DEADLINE_SEG", "150"))
+
+    # Circuit breaker por backend y hedging hacia un segundo Ollama (opcional)
+    CIRCUITO_MAX_FALLOS = int(os.getenv("CIRCUITO_MAX_FALLOS", "5"))
+    CIRCUITO_ENFRIAMIENTO_SEG = float(os.getenv("CIRCUITO_ENFRIAMIENTO_SEG", "30"))
+    OLLAMA_HEDGE_URL = os.getenv("OLLAMA_HEDGE_URL", "")
+    HEDGE_PERCENTIL = float(os.getenv("HEDGE_PERCENTIL", "95"))
+    HEDGE_MIN_MUESTRAS = int(os.getenv("HEDGE_MIN_MUESTRAS", "20"))
+
     # Flask
     FLASK_HOST = os.getenv("FLASK_HOST", "0.0.0.0")
     FLASK_PORT = int(os.getenv("FLASK_PORT", "5000"))
     FLASK_DEBUG = os.getenv("FLASK_DEBUG", "True").lower() == "true"
 
+    # Límites de /chat: token buckets por IP y por usuario ('memoria', 'sqlite' o 'ninguno')
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memoria")
+    RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL", "")
+    RATE_IP_POR_MIN = float(os.getenv("RATE_IP_POR_MIN", "60"))
+    RATE_IP_RAFAGA = float(os.getenv("RATE_IP_RAFAGA", "20"))
+    RATE_USUARIO_POR_MIN = float(os.getenv("RATE_USUARIO_POR_MIN", "20"))
+    RATE_USUARIO_RAFAGA = float(os.getenv("RATE_USUARIO_RAFAGA", "5"))
+    # Tokens del modelo por usuario y día (0 = sin cuota)
+    CUOTA_TOKENS_DIARIA = int(os.getenv("CUOTA_TOKENS_DIARIA", "0"))
+    CUOTA_CACHE_SEG = float(os.getenv("CUOTA_CACHE_SEG", "30"))
+
+    # Ejecución de tools (utils/ejecutor_tools.py)
+    TOOL_TIMEOUT_SEG = float(os.getenv("TOOL_TIMEOUT_SEG", "10"))
+    TOOL_HILOS = int(os.getenv("TOOL_HILOS", "16"))
+    TOOL_PROCESOS = int(os.getenv("TOOL_PROCESOS", "0"))
+
+    # Chat por lotes (/chat/batch y utils/chat_lote.py)
+    CHAT_LOTE_WORKERS = int(os.getenv("CHAT_LOTE_WORKERS", "4"))
+    CHAT_LOTE_MAX = int(os.getenv("CHAT_LOTE_MAX", "500"))
+
+    # Logging (independiente de FLASK_DEBUG)
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMATO = os.getenv("LOG_FORMATO", "json")
+    LOG_MAX_CARACTERES = int(os.getenv("LOG_MAX_CARACTERES", "200"))
+    LOG_MUESTREO = float(os.getenv("LOG_MUESTREO", "0.1"))
+
     # Base de datos
     DB_PATH = os.getenv("DB_PATH", "propiedades.db")
+
+    # Caché: 'memoria' (por proceso), 'sqlite' (compartida en el host), 'redis' o 'ninguno'
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memoria")
+    CACHE_URL = os.getenv("CACHE_URL", "")
+    CACHE_MAX_ENTRADAS = int(os.getenv("CACHE_MAX_ENTRADAS", "1024"))
+    CACHE_TTL_TOOLS = float(os.getenv("CACHE_TTL_TOOLS", "60"))
+    CACHE_TTL_RESPUESTAS = float(os.getenv("CACHE_TTL_RESPUESTAS", "300"))
+
+    # Caché en memoria de usuarios y mensajes recientes (0 = desactivada)
+    CONVERSACIONES_CACHE_MAX = int(os.getenv("CONVERSACIONES_CACHE_MAX", "1000"))
+    CONVERSACIONES_CACHE_MENSAJES = int(os.getenv("CONVERSACIONES_CACHE_MENSAJES", "20"))
+    USUARIOS_CACHE_MAX = int(os.getenv("USUARIOS_CACHE_MAX", "10000"))
+
+    # Compresión (gzip, o brotli si está instalado) de respuestas JSON grandes
+    COMPRESION = os.getenv("COMPRESION", "True").lower() == "true"
+    COMPRESION_MIN_BYTES = int(os.getenv("COMPRESION_MIN_BYTES", "1024"))
+
+    # Catálogo en memoria (requiere NumPy)
+    CATALOGO_EN_MEMORIA = os.getenv("CATALOGO_EN_MEMORIA", "True").lower() == "true"
+    CATALOGO_REFRESCO_SEG = float(os.getenv("CATALOGO_REFRESCO_SEG", "2"))
+
+    # Búsqueda semántica (requiere NumPy)
+    EMBEDDER = os.getenv("EMBEDDER", "hash")
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
+    INDICE_SEMANTICO_DIR = os.getenv("INDICE_SEMANTICO_DIR", "data/indice_semantico")
+    INDICE_REFRESCO_SEG = float(os.getenv("INDICE_REFRESCO_SEG", "30"))
+    IVF_MIN_FILAS = int(os.getenv("IVF_MIN_FILAS", "50000"))
+    IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
@@ -1,3 +1,3 @@
-from .system_prompts import generar_system_prompt, generar_descripcion_tools
+from .system_prompts import generar_system_prompt, generar_system_prompt_charla, generar_descripcion_tools
 
-__all__ = ["generar_system_prompt", "generar_descripcion_tools"]
+__all__ = ["generar_system_prompt", "generar_system_prompt_charla", "generar_descripcion_tools"]
@@ -0,0 +1,26 @@
+import os
+import shutil
+import sqlite3
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Las pruebas importan los módulos como lo hace app.py, desde la raíz del repo
+sys.path.insert(0, RAIZ)
+
+
+@pytest.fixture
+def base_temporal(tmp_path, monkeypatch):
+    """Copia de data/propiedades.db migrada, para no tocar la base del repo"""
+    from utils import database_helpers, init_db
+
+    ruta = str(tmp_path / "propiedades.db")
+    shutil.copy(os.path.join(RAIZ, "data", "propiedades.db"), ruta)
+    conn = sqlite3.connect(ruta)
+    init_db.migrar_esquema(conn)
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(database_helpers, "DB_PATH", ruta)
+    return ruta
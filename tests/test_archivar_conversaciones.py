@@ -0,0 +1,104 @@
+import sqlite3
+
+import pytest
+
+from utils import cache_conversaciones, database_helpers as db
+from utils.archivar_conversaciones import archivar_conversaciones, establecer_politica_retencion
+
+
+@pytest.fixture
+def archivo(base_temporal, tmp_path, monkeypatch):
+    ruta = str(tmp_path / "archivo.db")
+    monkeypatch.setattr(db, "ARCHIVO_DB_PATH", ruta)
+    monkeypatch.setattr(cache_conversaciones, "_cache", None)
+    return ruta
+
+
+def conversacion(email, dias_inactiva, mensajes=2):
+    usuario_id = db.obtener_o_crear_usuario(email, email)
+    conversacion_id = db.crear_conversacion(usuario_id, "prueba")
+    for i in range(mensajes):
+        db.guardar_mensaje(conversacion_id, "usuario", f"mensaje {i}")
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.execute(
+        "UPDATE conversaciones SET fecha_actualizacion = datetime('now', ?) WHERE id = ?",
+        (f"-{dias_inactiva} days", conversacion_id),
+    )
+    conn.commit()
+    conn.close()
+    # Como otro proceso: la caché de este no sabe del archivado
+    cache_conversaciones.obtener_cache_conversaciones().descartar((db.DB_PATH, conversacion_id))
+    return usuario_id, conversacion_id
+
+
+def archivar(archivo, dias=90):
+    return archivar_conversaciones(dias, db_path=db.DB_PATH, archivo_path=archivo)
+
+
+def test_archiva_segun_politica(archivo):
+    usuario, reciente = conversacion("a@example.com", dias_inactiva=10)
+    establecer_politica_retencion(usuario, dias_inactividad=7, db_path=db.DB_PATH)
+    _, por_defecto = conversacion("b@example.com", dias_inactiva=10)
+
+    archivar(archivo)
+    assert db.obtener_conversacion(reciente) is None
+    assert db.obtener_conversacion(reciente, incluir_archivo=True)["archivada"]
+    assert db.obtener_conversacion(por_defecto) is not None
+
+
+def test_sin_dias_inactividad_nunca_archiva(archivo):
+    usuario, conversacion_id = conversacion("a@example.com", dias_inactiva=1000)
+    establecer_politica_retencion(usuario, dias_inactividad=None, db_path=db.DB_PATH)
+
+    archivar(archivo, dias=1)
+    assert db.obtener_conversacion(conversacion_id) is not None
+
+
+def test_purga_segun_dias_conservacion(archivo):
+    usuario, vieja = conversacion("a@example.com", dias_inactiva=400)
+    establecer_politica_retencion(usuario, 30, dias_conservacion=365, db_path=db.DB_PATH)
+    _, conservada = conversacion("a@example.com", dias_inactiva=100)
+
+    assert archivar(archivo)["conversaciones_purgadas"] == 1
+    assert db.obtener_conversacion(vieja, incluir_archivo=True) is None
+    assert db.contar_mensajes_conversacion(vieja, incluir_archivo=True) == 0
+    assert db.obtener_conversacion(conservada, incluir_archivo=True) is not None
+
+
+def test_lecturas_con_incluir_archivo(archivo):
+    usuario, conversacion_id = conversacion("a@example.com", dias_inactiva=100, mensajes=3)
+    archivar(archivo)
+
+    assert db.contar_mensajes_conversacion(conversacion_id) == 0
+    assert db.contar_mensajes_conversacion(conversacion_id, incluir_archivo=True) == 3
+    assert db.obtener_mensajes_conversacion(conversacion_id) == []
+    mensajes = db.obtener_mensajes_conversacion(conversacion_id, limite=2, incluir_archivo=True)
+    assert [m["contenido"] for m in mensajes] == ["mensaje 1", "mensaje 2"]
+    assert conversacion_id not in [c["id"] for c in db.listar_conversaciones_usuario(usuario)]
+    archivadas = db.listar_conversaciones_usuario(usuario, incluir_archivo=True)
+    assert conversacion_id in [c["id"] for c in archivadas]
+
+
+def test_guardar_mensaje_restaura_la_conversacion(archivo):
+    _, conversacion_id = conversacion("a@example.com", dias_inactiva=100)
+    archivar(archivo)
+
+    db.guardar_mensaje(conversacion_id, "usuario", "vuelvo")
+    assert db.obtener_conversacion(conversacion_id) is not None
+    assert db.contar_mensajes_conversacion(conversacion_id) == 3
+    assert db.contar_mensajes_conversacion(conversacion_id, incluir_archivo=True) == 3
+    conn = sqlite3.connect(archivo)
+    restantes = conn.execute(
+        "SELECT COUNT(*) FROM mensajes WHERE conversacion_id = ?", (conversacion_id,)
+    ).fetchone()[0]
+    conn.close()
+    assert restantes == 0
+
+
+def test_eliminar_borra_tambien_del_archivo(archivo):
+    _, conversacion_id = conversacion("a@example.com", dias_inactiva=100)
+    archivar(archivo)
+
+    db.eliminar_conversacion(conversacion_id)
+    assert db.obtener_conversacion(conversacion_id, incluir_archivo=True) is None
+    assert db.contar_mensajes_conversacion(conversacion_id, incluir_archivo=True) == 0
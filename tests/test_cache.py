@@ -0,0 +1,124 @@
+import time
+
+import pytest
+
+from utils.cache import MemoriaLRU, RedisCache, SQLiteCache
+
+
+class RedisFalso:
+    """Cliente mínimo compatible con lo que usa RedisCache (get/set/incr)"""
+
+    def __init__(self):
+        self.datos = {}
+
+    def _vigente(self, clave):
+        valor, expira = self.datos.get(clave, (None, None))
+        if expira is not None and expira <= time.monotonic():
+            self.datos.pop(clave, None)
+            return None
+        return valor
+
+    def get(self, clave):
+        valor = self._vigente(clave)
+        return None if valor is None else str(valor).encode("utf-8")
+
+    def set(self, clave, valor, ex=None, px=None):
+        if ex is not None and ex <= 0 or px is not None and px <= 0:
+            raise ValueError("invalid expire time in 'set' command")
+        segundos = ex if ex is not None else (px / 1000 if px is not None else None)
+        self.datos[clave] = (valor, time.monotonic() + segundos if segundos else None)
+        return True
+
+    def incr(self, clave):
+        valor = int(self._vigente(clave) or 0) + 1
+        self.datos[clave] = (valor, None)
+        return valor
+
+
+class RedisCaido:
+    def get(self, clave):
+        raise ConnectionError("Redis no responde")
+
+    set = incr = get
+
+
+@pytest.fixture(params=["memoria", "sqlite", "redis"])
+def cache(request, tmp_path):
+    if request.param == "memoria":
+        return MemoriaLRU(max_entradas=10)
+    if request.param == "sqlite":
+        return SQLiteCache(ruta=str(tmp_path / "cache.db"))
+    return RedisCache(cliente=RedisFalso())
+
+
+def test_get_set(cache):
+    assert cache.get("tools", "a") is None
+    cache.set("tools", "a", {"resultado": [1, 2]})
+    assert cache.get("tools", "a") == {"resultado": [1, 2]}
+    stats = cache.estadisticas()["namespaces"]["tools"]
+    assert (stats["aciertos"], stats["fallos"], stats["escrituras"]) == (1, 1, 1)
+
+
+def test_ttl_expira(cache):
+    cache.set("tools", "a", "valor", ttl=0.05)
+    assert cache.get("tools", "a") == "valor"
+    time.sleep(0.1)
+    assert cache.get("tools", "a") is None
+
+
+def test_ttl_cero_no_guarda(cache):
+    cache.set("tools", "a", "valor", ttl=0)
+    assert cache.get("tools", "a") is None
+    assert cache.estadisticas()["namespaces"]["tools"]["escrituras"] == 0
+
+
+def test_invalidar_namespace(cache):
+    cache.set("tools", "a", 1)
+    cache.set("respuestas", "a", 2)
+    cache.invalidar("tools")
+    assert cache.get("tools", "a") is None
+    assert cache.get("respuestas", "a") == 2
+
+
+def test_obtener_o_calcular(cache):
+    llamadas = []
+
+    def calcular():
+        llamadas.append(1)
+        return 42
+
+    assert cache.obtener_o_calcular("cuotas", "1", calcular) == 42
+    assert cache.obtener_o_calcular("cuotas", "1", calcular) == 42
+    assert len(llamadas) == 1
+
+
+def test_memoria_desaloja_lru():
+    cache = MemoriaLRU(max_entradas=2)
+    cache.set("tools", "a", 1)
+    cache.set("tools", "b", 2)
+    cache.get("tools", "a")
+    cache.set("tools", "c", 3)
+    assert cache.get("tools", "b") is None
+    assert cache.get("tools", "a") == 1
+
+
+def test_sqlite_compartida_entre_instancias(tmp_path):
+    ruta = str(tmp_path / "cache.db")
+    SQLiteCache(ruta=ruta).set("tools", "a", "valor")
+    assert SQLiteCache(ruta=ruta).get("tools", "a") == "valor"
+
+
+def test_redis_ttl_menor_a_un_segundo_expira():
+    cliente = RedisFalso()
+    RedisCache(cliente=cliente).set("tools", "a", "valor", ttl=0.5)
+    (_, expira), = [v for k, v in cliente.datos.items() if ":tools:" in k]
+    assert expira is not None
+
+
+def test_backend_caido_no_propaga():
+    cache = RedisCache(cliente=RedisCaido())
+    assert cache.get("tools", "a") is None
+    cache.set("tools", "a", "valor")
+    stats = cache.estadisticas()["namespaces"]["tools"]
+    assert stats["errores"] == 2
+    assert stats["escrituras"] == 0
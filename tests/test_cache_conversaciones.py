@@ -0,0 +1,58 @@
+import sqlite3
+
+from utils import cache_conversaciones, database_helpers as db
+from utils.cache_conversaciones import CacheConversaciones, MensajeReciente
+
+
+def mensaje(id):
+    return MensajeReciente(id, 1, "user", f"mensaje {id}", "2024-01-01 00:00:00")
+
+
+def ids(cache):
+    return [m["id"] for m in cache.mensajes(1)]
+
+
+def test_agregar_ignora_mensaje_ya_cargado():
+    cache = CacheConversaciones()
+    cache.iniciar(1)
+    cache.agregar(1, mensaje(1))
+    cache.agregar(1, mensaje(1))
+    assert ids(cache) == [1]
+
+
+def test_agregar_fuera_de_orden_mantiene_orden_por_id():
+    cache = CacheConversaciones()
+    cache.iniciar(1)
+    for id in (1, 3, 2):
+        cache.agregar(1, mensaje(id))
+    assert ids(cache) == [1, 2, 3]
+
+
+def test_ventana_llena_deja_de_ser_completa():
+    cache = CacheConversaciones(mensajes_por_conversacion=2)
+    cache.iniciar(1)
+    for id in (1, 2, 3):
+        cache.agregar(1, mensaje(id))
+    assert cache.mensajes(1) is None
+    assert [m["id"] for m in cache.mensajes(1, limite=2)] == [2, 3]
+
+
+def test_ventana_descartada_si_otro_worker_escribio(base_temporal, monkeypatch):
+    monkeypatch.setattr(cache_conversaciones, "_cache", None)
+    usuario_id = db.obtener_o_crear_usuario("a@example.com", "a@example.com")
+    conversacion_id = db.crear_conversacion(usuario_id, "prueba")
+    db.guardar_mensaje(conversacion_id, "usuario", "hola")
+    assert len(db.obtener_mensajes_conversacion(conversacion_id)) == 1
+
+    # Otro worker escribe directo en la base, sin pasar por esta caché
+    conn = sqlite3.connect(base_temporal)
+    conn.execute(
+        "INSERT INTO mensajes (conversacion_id, rol, contenido) VALUES (?, 'asistente', 'buenas')",
+        (conversacion_id,),
+    )
+    conn.commit()
+    conn.close()
+
+    contenidos = [m["contenido"] for m in db.obtener_mensajes_conversacion(conversacion_id)]
+    assert contenidos == ["hola", "buenas"]
+    assert [m["contenido"] for m in db.obtener_mensajes_conversacion(conversacion_id, limite=1)] == ["buenas"]
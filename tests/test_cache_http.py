@@ -0,0 +1,63 @@
+import gzip
+import importlib
+import json
+import sys
+
+import pytest
+
+from config import Config
+from utils import cache_http
+from utils.estado_modelo import MonitorModelo
+
+
+@pytest.fixture
+def app_modulo(base_temporal, monkeypatch):
+    monkeypatch.setattr(MonitorModelo, "iniciar", lambda self, calentar=False: None)
+    sys.modules.pop("app", None)
+    try:
+        yield importlib.import_module("app")
+    finally:
+        sys.modules.pop("app", None)
+
+
+@pytest.mark.parametrize("ruta", ["/tools", "/health"])
+def test_get_condicional_sin_last_modified(app_modulo, ruta):
+    cliente = app_modulo.app.test_client()
+    primera = cliente.get(ruta)
+    assert primera.status_code == 200
+    assert primera.headers.get("ETag")
+    assert "Last-Modified" not in primera.headers
+
+    segunda = cliente.get(ruta, headers={"If-None-Match": primera.headers["ETag"]})
+    assert segunda.status_code == 304
+
+
+def test_etag_de_tools_se_calcula_al_importar(app_modulo, monkeypatch):
+    llamadas = []
+    monkeypatch.setattr(app_modulo, "calcular_etag", lambda *partes: llamadas.append(partes))
+    respuesta = app_modulo.app.test_client().get("/tools")
+    assert respuesta.headers["ETag"] == f'W/"{app_modulo.ETAG_TOOLS}"'
+    assert llamadas == []
+
+
+def test_debug_db_se_comprime_con_gzip(app_modulo, monkeypatch):
+    monkeypatch.setattr(Config, "COMPRESION_MIN_BYTES", 256)
+    monkeypatch.setattr(cache_http, "brotli", None)
+    cliente = app_modulo.app.test_client()
+
+    plano = cliente.get("/debug/db")
+    assert len(plano.get_data()) > Config.COMPRESION_MIN_BYTES
+    assert "Content-Encoding" not in plano.headers
+    assert "Accept-Encoding" in plano.headers["Vary"]
+
+    comprimida = cliente.get("/debug/db", headers={"Accept-Encoding": "gzip"})
+    assert comprimida.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in comprimida.headers["Vary"]
+    assert json.loads(gzip.decompress(comprimida.get_data())) == plano.get_json()
+
+
+def test_cuerpo_chico_no_se_comprime(app_modulo):
+    respuesta = app_modulo.app.test_client().get("/health", headers={"Accept-Encoding": "gzip"})
+    assert len(respuesta.get_data()) < Config.COMPRESION_MIN_BYTES
+    assert "Content-Encoding" not in respuesta.headers
+    assert "Accept-Encoding" in respuesta.headers["Vary"]
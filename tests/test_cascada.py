@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+
+import pytest
+
+from config import Config
+from utils import cascada
+from utils.llm import plazo_etapa
+from utils.resiliencia import Deadline
+
+TOOLS = [SimpleNamespace(name="buscar_propiedades", args={"ciudad": {}, "tipo": {}})]
+
+
+@pytest.mark.parametrize(
+    "texto, motivo",
+    [
+        ("", "respuesta_vacia"),
+        ("   \n", "respuesta_vacia"),
+        (None, "respuesta_vacia"),
+        ("[USAR_TOOL buscar_propiedades]", "etiqueta_invalida"),
+        ("[USAR_TOOL:buscar_propiedades ciudad=Sucre", "etiqueta_invalida"),
+        ("[USAR_TOOL:]", "etiqueta_invalida"),
+        ("[USAR_TOOL:buscar_propiedades] [USAR_TOOL:buscar_propiedades tipo=Casa]", "varias_etiquetas"),
+        ("Claro, " + "x" * 100 + " [USAR_TOOL:buscar_propiedades]", "etiqueta_con_texto"),
+        ("[USAR_TOOL:tasar_propiedad]", "tool_desconocida"),
+        ("[USAR_TOOL:buscar_propiedades barrio=Equipetrol]", "parametros_desconocidos"),
+        ("Podría usar buscar_propiedades para eso.", "menciona_tool"),
+    ],
+)
+def test_motivos_de_escalado(texto, motivo):
+    assert cascada.validar_ruteo(texto, TOOLS)[1] == motivo
+
+
+@pytest.mark.parametrize(
+    "texto, nombre",
+    [
+        ("[USAR_TOOL:buscar_propiedades ciudad=Sucre]", "buscar_propiedades"),
+        ("Busco eso. [USAR_TOOL:buscar_propiedades tipo=Casa]", "buscar_propiedades"),
+        ("¡Hola! ¿En qué te ayudo?", None),
+    ],
+)
+def test_ruteo_valido_no_escala(texto, nombre):
+    tool_spec, motivo = cascada.validar_ruteo(texto, TOOLS)
+    assert motivo is None
+    assert cascada.nombre_tool(tool_spec) == nombre
+
+
+@pytest.fixture
+def llamadas(monkeypatch):
+    etapas = []
+    salidas = {"ruteo": "[USAR_TOOL:tasar_propiedad]", "escalado": "[USAR_TOOL:buscar_propiedades]"}
+
+    def invocar(tools, entrada, etapa, deadline):
+        etapas.append(etapa)
+        return SimpleNamespace(content=salidas[etapa], response_metadata={}, usage_metadata={})
+
+    monkeypatch.setattr(cascada, "_invocar", invocar)
+    monkeypatch.setattr(Config, "MODEL_RUTEO", "chico")
+    return etapas
+
+
+def test_escala_al_modelo_de_respuesta(llamadas, monkeypatch):
+    monkeypatch.setattr(Config, "MODEL_RESPUESTA", "grande")
+    ruteo = cascada.rutear(TOOLS, "casas", Deadline(5))
+    assert llamadas == ["ruteo", "escalado"]
+    assert ruteo["escalado"] == "tool_desconocida"
+    assert (ruteo["modelo"], cascada.nombre_tool(ruteo["tool_spec"])) == ("grande", "buscar_propiedades")
+
+
+def test_no_escala_si_ambas_etapas_usan_el_mismo_modelo(llamadas, monkeypatch):
+    monkeypatch.setattr(Config, "MODEL_RESPUESTA", "chico")
+    ruteo = cascada.rutear(TOOLS, "casas", Deadline(5))
+    assert llamadas == ["ruteo"]
+    assert ruteo["escalado"] is None
+
+
+@pytest.mark.parametrize("etapa", ["ruteo", "escalado", "respuesta", "charla"])
+def test_cada_etapa_tiene_su_plazo(etapa):
+    assert plazo_etapa(etapa) == getattr(Config, f"LLM_DEADLINE_{etapa.upper()}")
@@ -0,0 +1,89 @@
+import random
+import sqlite3
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from config import Config
+from tools.database_tools import buscar_propiedades
+from utils import catalogo
+
+CIUDADES = ["La Paz", "Santa Cruz", "Cochabamba", "Sucre"]
+TIPOS = ["Casa", "Departamento", "Terreno"]
+
+
+def talvez(rng, valor):
+    # Columnas opcionales con NULL, que SQL y el snapshot deben excluir igual
+    return None if rng.random() < 0.15 else valor
+
+
+@pytest.fixture
+def catalogo_grande(base_temporal, monkeypatch):
+    rng = random.Random(0)
+    precios = rng.sample(range(20000, 900000, 50), 300)  # sin empates en el orden
+    conn = sqlite3.connect(base_temporal)
+    conn.executemany(
+        """
+        INSERT INTO propiedades (tipo, ciudad, zona, precio, dormitorios, banos, area_m2, descripcion, disponible)
+        VALUES (?, ?, 'Centro', ?, ?, ?, ?, 'Prueba', ?)
+        """,
+        [
+            (
+                rng.choice(TIPOS), rng.choice(CIUDADES), precio,
+                talvez(rng, rng.randint(0, 6)), talvez(rng, rng.randint(1, 4)),
+                talvez(rng, rng.uniform(30, 600)), int(rng.random() > 0.1),
+            )
+            for precio in precios
+        ],
+    )
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(catalogo, "_catalogo", None)
+    catalogo.invalidar_catalogo()
+    return rng
+
+
+def consulta_aleatoria(rng):
+    filtros = {}
+    if rng.random() < 0.5:
+        filtros["ciudad"] = rng.choice(CIUDADES + ["scz", "Atlantida"])
+    if rng.random() < 0.5:
+        filtros["tipo"] = rng.choice(TIPOS + ["depto"])
+    for campo, minimo, maximo, aleatorio in (
+        ("precio", 20000, 900000, rng.uniform),
+        ("dormitorios", 0, 6, rng.randint),
+        ("banos", 1, 4, rng.randint),
+        ("area", 30, 600, rng.uniform),
+    ):
+        if rng.random() < 0.3:
+            filtros[f"{campo}_min"] = aleatorio(minimo, maximo)
+        if rng.random() < 0.3:
+            filtros[f"{campo}_max"] = aleatorio(minimo, maximo)
+    filtros["limite"] = rng.choice([None, 0, 1, 5, 20, 1000])
+    return filtros
+
+
+def test_snapshot_coincide_con_sql(catalogo_grande, monkeypatch):
+    for _ in range(300):
+        filtros = consulta_aleatoria(catalogo_grande)
+        monkeypatch.setattr(Config, "CATALOGO_EN_MEMORIA", True)
+        en_memoria = buscar_propiedades.invoke(filtros)
+        monkeypatch.setattr(Config, "CATALOGO_EN_MEMORIA", False)
+        assert buscar_propiedades.invoke(filtros) == en_memoria, filtros
+
+
+def test_cambio_de_version_reconstruye_el_snapshot(catalogo_grande, base_temporal):
+    anterior = catalogo.obtener_catalogo()
+    assert catalogo.obtener_catalogo() is anterior
+
+    conn = sqlite3.connect(base_temporal)
+    conn.execute("UPDATE propiedades SET disponible = 0 WHERE id = ?", (anterior.filas[0]["id"],))
+    conn.commit()
+    conn.close()
+    catalogo.invalidar_catalogo()
+
+    nuevo = catalogo.obtener_catalogo()
+    assert nuevo is not anterior
+    assert nuevo.version > anterior.version
+    assert len(nuevo) == len(anterior) - 1
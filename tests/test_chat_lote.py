@@ -0,0 +1,43 @@
+import importlib
+import sys
+
+import pytest
+
+from utils.estado_modelo import MonitorModelo
+
+
+@pytest.fixture
+def cliente(base_temporal, monkeypatch):
+    monkeypatch.setattr(MonitorModelo, "iniciar", lambda self, calentar=False: None)
+    sys.modules.pop("app", None)
+    try:
+        app_modulo = importlib.import_module("app")
+        monkeypatch.setattr(
+            app_modulo, "procesar_chat", lambda data, cancelacion=None: ({"response": "ok"}, 200)
+        )
+        yield app_modulo.app.test_client()
+    finally:
+        sys.modules.pop("app", None)
+
+
+@pytest.mark.parametrize("workers", ["muchos", -1, 0, 2.5, True, [2]])
+def test_workers_invalido_es_400(cliente, workers):
+    respuesta = cliente.post("/chat/batch", json={"mensajes": ["hola"], "workers": workers})
+    assert respuesta.status_code == 400
+    assert "workers" in respuesta.get_json()["error"]
+
+
+@pytest.mark.parametrize("workers", [None, 2, "2"])
+def test_workers_valido(cliente, workers):
+    respuesta = cliente.post("/chat/batch", json={"mensajes": ["hola", "chau"], "workers": workers})
+    assert respuesta.status_code == 200
+    assert respuesta.get_data(as_text=True).count('"ok"') == 2
+
+
+def test_cuerpo_que_no_es_objeto_es_400(cliente):
+    assert cliente.post("/chat/batch", json=["hola"]).status_code == 400
+
+
+@pytest.mark.parametrize("cuerpo", [["x"], "hola", {}])
+def test_chat_con_cuerpo_invalido_es_400(cliente, cuerpo):
+    assert cliente.post("/chat", json=cuerpo).status_code == 400
@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+from utils.ejecutor_tools import EjecutorTools, ToolFallo, ToolNoEncontrada, ToolTimeout
+from utils.logs import request_id_actual
+
+
+class ToolFalsa:
+    def __init__(self, name, funcion):
+        self.name = name
+        self.funcion = funcion
+
+    def invoke(self, params):
+        return self.funcion(**params)
+
+
+class Ocupado(RuntimeError):
+    status = 503
+
+
+def fallar():
+    raise ValueError("sin base")
+
+
+def ocupado():
+    raise Ocupado("construyendo")
+
+
+@pytest.fixture
+def ejecutor():
+    ejecutor = EjecutorTools(hilos=2, procesos=0)
+    ejecutor.registrar(ToolFalsa("sumar", lambda a, b: a + b))
+    ejecutor.registrar(ToolFalsa("fallar", fallar))
+    ejecutor.registrar(ToolFalsa("ocupado", ocupado))
+    return ejecutor
+
+
+def test_ejecuta_con_params(ejecutor):
+    assert ejecutor.ejecutar({"name": "sumar", "params": {"a": 1, "b": 2}}) == 3
+
+
+def test_excepcion_de_la_tool_es_tool_fallo(ejecutor):
+    with pytest.raises(ToolFallo) as error:
+        ejecutor.ejecutar("fallar")
+    assert error.value.status == 500
+    assert isinstance(error.value.error, ValueError)
+    assert ejecutor.metricas()["fallar"]["errores"] == 1
+
+
+def test_status_de_la_excepcion_se_respeta(ejecutor):
+    with pytest.raises(ToolFallo) as error:
+        ejecutor.ejecutar("ocupado")
+    assert error.value.status == 503
+
+
+def test_tool_desconocida(ejecutor):
+    with pytest.raises(ToolNoEncontrada):
+        ejecutor.ejecutar("no_existe")
+
+
+def test_timeout(ejecutor):
+    liberar = threading.Event()
+    ejecutor.registrar(ToolFalsa("lenta", lambda: liberar.wait(5)), timeout=0.05)
+    try:
+        with pytest.raises(ToolTimeout):
+            ejecutor.ejecutar("lenta")
+    finally:
+        liberar.set()
+
+
+def test_tool_conserva_el_request_id(ejecutor):
+    ejecutor.registrar(ToolFalsa("request_id", lambda: request_id_actual.get()))
+    token = request_id_actual.set("abc123")
+    try:
+        assert ejecutor.ejecutar("request_id") == "abc123"
+    finally:
+        request_id_actual.reset(token)
@@ -0,0 +1,45 @@
+import importlib
+import sys
+import threading
+
+from utils.estado_modelo import MonitorModelo
+
+
+def test_error_inesperado_no_detiene_el_monitor(monkeypatch):
+    llamadas = []
+    segunda = threading.Event()
+
+    def verificar(self):
+        llamadas.append(1)
+        if len(llamadas) == 1:
+            raise KeyError("respuesta inesperada de Ollama")
+        segunda.set()
+        return self._estado
+
+    monkeypatch.setattr(MonitorModelo, "verificar", verificar)
+    monitor = MonitorModelo(["modelo"], intervalo=0.01)
+    monitor.iniciar()
+    assert segunda.wait(2)
+
+
+def test_importar_app_no_arranca_el_monitor(base_temporal, monkeypatch):
+    iniciados = []
+    monkeypatch.setattr(MonitorModelo, "iniciar", lambda self, calentar=False: iniciados.append(self))
+    sys.modules.pop("app", None)
+    try:
+        importlib.import_module("app")
+    finally:
+        sys.modules.pop("app", None)
+    assert iniciados == []
+
+
+def test_primera_peticion_arranca_el_monitor(base_temporal, monkeypatch):
+    iniciados = []
+    monkeypatch.setattr(MonitorModelo, "iniciar", lambda self, calentar=False: iniciados.append(self))
+    sys.modules.pop("app", None)
+    try:
+        app_modulo = importlib.import_module("app")
+        app_modulo.app.test_client().get("/health")
+    finally:
+        sys.modules.pop("app", None)
+    assert iniciados == [app_modulo.monitor]
@@ -0,0 +1,96 @@
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from config import Config
+from utils.database_helpers import get_db_connection
+from utils.indice_semantico import IndiceNoDisponible, IndiceSemantico
+
+
+def esperar_instantanea(indice, anterior=None, plazo=10.0):
+    fin = time.monotonic() + plazo
+    while time.monotonic() < fin:
+        if indice._instantanea is not None and indice._instantanea is not anterior:
+            return indice._instantanea
+        time.sleep(0.05)
+    raise AssertionError("el refresco no publicó una instantánea")
+
+
+@pytest.fixture
+def indice(base_temporal, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "INDICE_REFRESCO_SEG", 0.0)
+    return IndiceSemantico(directorio=str(tmp_path / "indice"))
+
+
+def test_primera_busqueda_no_construye_el_indice_en_la_peticion(indice):
+    with pytest.raises(IndiceNoDisponible):
+        indice.buscar("casa con jardín")
+    esperar_instantanea(indice)
+    assert indice.buscar("casa con jardín", limite=3)
+
+
+def test_refresco_no_modifica_la_instantanea_publicada(indice):
+    indice.refrescar()
+    anterior = esperar_instantanea(indice)
+    ids_antes = anterior.ids_por_fila.copy()
+    retirada = int(ids_antes[ids_antes >= 0][0])
+
+    conn = get_db_connection()
+    conn.execute("UPDATE propiedades SET disponible = 0 WHERE id = ?", (retirada,))
+    conn.commit()
+    conn.close()
+
+    indice.buscar("casa")  # lanza el refresco y responde con la instantánea anterior
+    nueva = esperar_instantanea(indice, anterior)
+    assert np.array_equal(anterior.ids_por_fila, ids_antes)
+    assert retirada not in nueva.ids_por_fila
+
+
+def test_proceso_nuevo_sirve_el_indice_persistido(indice, tmp_path, monkeypatch):
+    indice.refrescar()
+    esperar_instantanea(indice)
+
+    monkeypatch.setattr(Config, "INDICE_REFRESCO_SEG", 3600.0)
+    otro = IndiceSemantico(directorio=str(tmp_path / "indice"))
+    otro._ultima_verificacion = time.monotonic()
+    assert otro.buscar("departamento", limite=2)
+
+
+@pytest.fixture
+def indice_construido(indice, monkeypatch):
+    indice.refrescar()
+    esperar_instantanea(indice)
+    # Sin más refrescos: las búsquedas siguen con esta instantánea
+    monkeypatch.setattr(Config, "INDICE_REFRESCO_SEG", 3600.0)
+    indice._ultima_verificacion = time.monotonic()
+    return indice
+
+
+def test_no_devuelve_propiedades_retiradas_antes_del_refresco(indice_construido):
+    ids = [r["id"] for r in indice_construido.buscar("casa con piscina", limite=3)]
+    conn = get_db_connection()
+    conn.execute("UPDATE propiedades SET disponible = 0 WHERE id = ?", (ids[0],))
+    conn.commit()
+    conn.close()
+
+    despues = [r["id"] for r in indice_construido.buscar("casa con piscina", limite=3)]
+    assert ids[0] not in despues
+    assert len(despues) == 3
+
+
+def test_descarta_filas_reutilizadas_por_otro_proceso(indice_construido):
+    primera, segunda = indice_construido.buscar("casa con piscina", limite=2)
+    conn = get_db_connection()
+    # Otro proceso liberó la fila de la primera y la asignó a la segunda
+    conn.execute("DELETE FROM embeddings_propiedades WHERE propiedad_id = ?", (segunda["id"],))
+    conn.execute(
+        "UPDATE embeddings_propiedades SET propiedad_id = ? WHERE propiedad_id = ?",
+        (segunda["id"], primera["id"]),
+    )
+    conn.commit()
+    conn.close()
+
+    ids = [r["id"] for r in indice_construido.buscar("casa con piscina", limite=2)]
+    assert primera["id"] not in ids and segunda["id"] not in ids
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from utils.ingestar_propiedades import FilaInvalida, leer_json
+
+
+def escribir(tmp_path, texto):
+    ruta = tmp_path / "propiedades.json"
+    ruta.write_text(texto, encoding="utf-8")
+    return str(ruta)
+
+
+def resumen(registros):
+    return [r.get("external_id") if isinstance(r, dict) else "invalida" for r in registros]
+
+
+@pytest.mark.parametrize("tam_bloque", [4, 16, 1 << 16])
+def test_objeto_mal_formado_no_aborta_la_lectura(tmp_path, tam_bloque):
+    ruta = escribir(
+        tmp_path,
+        '[{"external_id": "a", "nota": "con , y ] y {"},\n'
+        ' {"external_id": "b", precio: 10},\n'
+        ' {"external_id": "c", "extra": {"x": [1, 2]}}]',
+    )
+    registros = list(leer_json(ruta, tam_bloque=tam_bloque))
+    assert resumen(registros) == ["a", "invalida", "c"]
+    assert isinstance(registros[1], FilaInvalida)
+
+
+def test_cadena_sin_cerrar_resincroniza(tmp_path, monkeypatch):
+    import utils.ingestar_propiedades as ingestar
+
+    monkeypatch.setattr(ingestar, "MAX_ELEMENTO_INVALIDO", 64)
+    validos = ",".join(json.dumps({"external_id": str(i), "relleno": "x" * 40}) for i in range(20))
+    ruta = escribir(tmp_path, '[{"external_id": "roto", "nota": "sin cierre}, ' + validos + "]")
+    registros = list(leer_json(ruta, tam_bloque=32))
+    assert isinstance(registros[0], FilaInvalida)
+    assert resumen(registros)[-5:] == ["15", "16", "17", "18", "19"]
+
+
+def test_archivo_truncado(tmp_path):
+    ruta = escribir(tmp_path, '[{"external_id": "a"}, {"external_id": "b", "pre')
+    registros = list(leer_json(ruta, tam_bloque=8))
+    assert resumen(registros) == ["a", "invalida"]
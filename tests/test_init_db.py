@@ -0,0 +1,39 @@
+import sqlite3
+
+import pytest
+
+from utils import init_db
+from utils.helpers import normalizar_valor
+
+
+@pytest.fixture
+def conn(base_temporal):
+    conn = sqlite3.connect(base_temporal)
+    yield conn
+    conn.close()
+
+
+def conteos(conn):
+    return sorted(conn.execute("SELECT * FROM conteo_propiedades").fetchall())
+
+
+@pytest.mark.parametrize("ciudad", ["La Paz", " Cochabámba ", "SANTA CRUZ"])
+def test_escritor_externo_usa_la_misma_clave_que_la_app(conn, ciudad):
+    conn.execute(
+        "INSERT INTO propiedades (tipo, ciudad, zona, precio, disponible) VALUES ('Casa', ?, 'Centro', 1, 1)",
+        (ciudad,),
+    )
+    ciudad_norm, tipo_norm = conn.execute(
+        "SELECT ciudad_norm, tipo_norm FROM propiedades ORDER BY id DESC LIMIT 1"
+    ).fetchone()
+    assert ciudad_norm == normalizar_valor(ciudad)
+    assert tipo_norm == "casa"
+
+    # Los triggers dejaron los conteos igual que un recálculo desde cero
+    antes = conteos(conn)
+    init_db.reconstruir_conteos(conn.cursor())
+    assert conteos(conn) == antes
+
+
+def test_triggers_al_dia_no_se_recrean(conn):
+    assert init_db.actualizar_triggers(conn.cursor()) is False
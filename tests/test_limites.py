@@ -0,0 +1,86 @@
+import sqlite3
+
+import pytest
+
+from config import Config
+from utils import limites
+from utils.limites import BucketsMemoria, BucketsSQLite, LimitadorChat
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def time(self):
+        return self.ahora
+
+    def monotonic(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(limites, "time", reloj)
+    return reloj
+
+
+@pytest.fixture(params=["memoria", "sqlite"])
+def buckets(request, tmp_path, reloj):
+    if request.param == "memoria":
+        return BucketsMemoria()
+    return BucketsSQLite(str(tmp_path / "limites.db"))
+
+
+def test_costo_mayor_que_la_rafaga_queda_en_deuda(buckets, reloj):
+    assert buckets.consumir("ip:1", capacidad=5, por_segundo=1, costo=8) == 0
+    # Debe 3 fichas: necesita 5 + 3 segundos para volver a tener una ráfaga completa
+    assert buckets.consumir("ip:1", capacidad=5, por_segundo=1, costo=5) == pytest.approx(8)
+    reloj.ahora += 8
+    assert buckets.consumir("ip:1", capacidad=5, por_segundo=1, costo=5) == 0
+
+
+def test_sqlite_purga_buckets_llenos(tmp_path, reloj, monkeypatch):
+    monkeypatch.setattr(BucketsSQLite, "INTERVALO_PURGA", 0)
+    ruta = str(tmp_path / "limites.db")
+    buckets = BucketsSQLite(ruta)
+    buckets.consumir("usuario:1", capacidad=5, por_segundo=1)
+    reloj.ahora += 10
+    buckets.consumir("usuario:2", capacidad=5, por_segundo=1)
+
+    claves = [clave for (clave,) in sqlite3.connect(ruta).execute("SELECT clave FROM buckets")]
+    assert claves == ["usuario:2"]
+
+
+def test_lote_cobra_cada_mensaje_a_la_ip_y_a_su_usuario(reloj, monkeypatch):
+    monkeypatch.setattr(Config, "RATE_IP_POR_MIN", 60.0)
+    monkeypatch.setattr(Config, "RATE_IP_RAFAGA", 10.0)
+    monkeypatch.setattr(Config, "RATE_USUARIO_POR_MIN", 60.0)
+    monkeypatch.setattr(Config, "RATE_USUARIO_RAFAGA", 3.0)
+    monkeypatch.setattr(Config, "CUOTA_TOKENS_DIARIA", 0)
+    limitador = LimitadorChat("memoria")
+
+    assert limitador.verificar_lote({1: 3, 2: 2}, "10.0.0.1") is None
+    # El usuario 1 ya gastó su ráfaga en el lote anterior
+    assert limitador.verificar(1, "10.0.0.2") is not None
+    # La IP gastó 5 de 10 fichas: un lote de 6 ya no entra
+    assert limitador.verificar_lote({None: 6}, "10.0.0.1") is not None
+    assert limitador.metricas()["rechazos"] == {"usuario": 1, "ip": 1}
+
+
+def test_memoria_acota_claves_aunque_se_permitan(reloj):
+    buckets = BucketsMemoria(max_claves=10)
+    for usuario in range(1000):
+        assert buckets.consumir(f"usuario:{usuario}", capacidad=5, por_segundo=1) == 0
+    assert len(buckets._buckets) <= 10
+
+
+def test_memoria_purga_cada_bucket_con_su_capacidad(reloj):
+    buckets = BucketsMemoria(max_claves=2)
+    buckets.consumir("ip:1", capacidad=20, por_segundo=1, costo=10)
+    buckets.consumir("usuario:1", capacidad=5, por_segundo=1)
+    reloj.ahora += 2
+    # usuario:1 ya se llenó; la IP tiene 12 de 20, que para capacidad 5 sería lleno
+    buckets.consumir("usuario:2", capacidad=5, por_segundo=1)
+    assert list(buckets._buckets) == ["ip:1", "usuario:2"]
+    assert buckets.consumir("ip:1", capacidad=20, por_segundo=1, costo=20) > 0
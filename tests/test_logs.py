@@ -0,0 +1,100 @@
+import importlib
+import json
+import logging
+import os
+import subprocess
+import sys
+
+import pytest
+
+from config import Config
+from conftest import RAIZ
+from utils.estado_modelo import MonitorModelo
+from utils.logs import FiltroContexto, FormatoJSON, Recortado, request_id_actual
+
+
+def registro(mensaje="Tool ejecutada", *args, extra=None, nivel=logging.INFO):
+    return logging.getLogger("prueba").makeRecord(
+        "prueba", nivel, __file__, 1, mensaje, args, None, extra=extra
+    )
+
+
+def test_formato_json_con_campos_extra():
+    linea = FormatoJSON().format(registro("Tool %s", "buscar", extra={"tool": "buscar", "ms": 12.3}))
+    datos = json.loads(linea)
+    assert datos["nivel"] == "INFO"
+    assert datos["logger"] == "prueba"
+    assert datos["msg"] == "Tool buscar"
+    assert (datos["tool"], datos["ms"]) == ("buscar", 12.3)
+    assert "request_id" not in datos and "args" not in datos
+
+
+def test_filtro_toma_el_request_id_del_contexto():
+    token = request_id_actual.set("abc123")
+    try:
+        record = registro()
+        FiltroContexto().filter(record)
+    finally:
+        request_id_actual.reset(token)
+    assert json.loads(FormatoJSON().format(record))["request_id"] == "abc123"
+
+
+@pytest.mark.parametrize(
+    "limite, esperado",
+    [(200, "hola mundo"), (4, "hola… (+6)"), (0, "<10 caracteres>")],
+)
+def test_recortado(monkeypatch, limite, esperado):
+    monkeypatch.setattr(Config, "LOG_MAX_CARACTERES", limite)
+    assert str(Recortado("hola mundo")) == esperado
+
+
+def test_recortado_se_evalua_al_emitir(monkeypatch):
+    monkeypatch.setattr(Config, "LOG_MAX_CARACTERES", 0)
+    record = registro("Respuesta: %s", Recortado("secreto"))
+    assert "secreto" not in FormatoJSON().format(record)
+
+
+@pytest.fixture
+def cliente(base_temporal, monkeypatch):
+    monkeypatch.setattr(MonitorModelo, "iniciar", lambda self, calentar=False: None)
+    sys.modules.pop("app", None)
+    try:
+        app_modulo = importlib.import_module("app")
+        monkeypatch.setattr(
+            app_modulo,
+            "procesar_chat",
+            lambda data, cancelacion=None: ({"response": request_id_actual.get()}, 200),
+        )
+        yield app_modulo.app.test_client()
+    finally:
+        sys.modules.pop("app", None)
+
+
+def test_request_id_de_la_cabecera_llega_al_contexto(cliente):
+    respuesta = cliente.post("/chat", json={"message": "hola"}, headers={"X-Request-ID": "externo1"})
+    assert respuesta.get_json()["response"] == "externo1"
+    assert respuesta.headers["X-Request-ID"] == "externo1"
+
+
+def test_request_id_generado_si_no_viene(cliente):
+    respuesta = cliente.post("/chat", json={"message": "hola"})
+    request_id = respuesta.get_json()["response"]
+    assert request_id and respuesta.headers["X-Request-ID"] == request_id
+
+
+@pytest.mark.parametrize("debug", ["True", "False"])
+def test_log_level_no_depende_de_flask_debug(debug):
+    entorno = {k: v for k, v in os.environ.items() if k != "LOG_LEVEL"}
+    entorno["FLASK_DEBUG"] = debug
+    salida = subprocess.run(
+        [
+            sys.executable, "-c",
+            "import logging\n"
+            "from config import Config\n"
+            "from utils.logs import configurar_logging\n"
+            "configurar_logging()\n"
+            "print(Config.LOG_LEVEL, logging.getLevelName(logging.getLogger().level))",
+        ],
+        cwd=RAIZ, env=entorno, capture_output=True, text=True, check=True,
+    ).stdout.split()
+    assert salida == ["INFO", "INFO"]
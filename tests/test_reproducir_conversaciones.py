@@ -0,0 +1,26 @@
+import hashlib
+import sys
+
+from config import Config
+from utils import database_helpers, reproducir_conversaciones
+
+
+def huella(ruta):
+    with open(ruta, "rb") as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+
+def test_reproduccion_no_toca_la_base_ni_el_indice(base_temporal, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "INDICE_SEMANTICO_DIR", str(tmp_path / "indice_real"))
+    antes = huella(base_temporal)
+    turnos = [{"message": "cuántas casas hay en la paz"}, {"message": "busco casa en cochabamba"}]
+    try:
+        reporte = reproducir_conversaciones.comparar(turnos, {}, {}, simulado=True)
+    finally:
+        sys.modules.pop("app", None)
+
+    assert reporte["a"]["tools"] == {"contar_propiedades": 1, "buscar_propiedades": 1}
+    assert huella(base_temporal) == antes
+    assert database_helpers.DB_PATH == base_temporal
+    assert Config.INDICE_SEMANTICO_DIR == str(tmp_path / "indice_real")
+    assert not (tmp_path / "indice_real").exists()
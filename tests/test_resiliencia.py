@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+
+from config import Config
+from utils import llm
+from utils.resiliencia import CircuitBreaker, Deadline, DeadlineExcedido
+
+
+def test_semiabierto_deja_pasar_una_sola_prueba():
+    breaker = CircuitBreaker("prueba", max_fallos=1, enfriamiento=0)
+    breaker.registrar_fallo()
+    assert breaker.estado == "semiabierto"
+    assert breaker.reservar() == "prueba"
+    assert breaker.reservar() is None
+    breaker.liberar_prueba()
+    assert breaker.reservar() == "prueba"
+
+
+def test_fallo_de_la_prueba_reabre_el_circuito():
+    breaker = CircuitBreaker("prueba", max_fallos=3, enfriamiento=60)
+    breaker._abierto_desde = 0.0
+    assert breaker.reservar() == "prueba"
+    breaker.registrar_fallo()
+    assert breaker.estado == "abierto"
+    assert breaker.reservar() is None
+
+
+class ChainLenta:
+    def __init__(self, liberar):
+        self.liberar = liberar
+
+    def invoke(self, entrada):
+        self.liberar.wait(5)
+        return "tarde"
+
+
+def test_plazo_vencido_cuenta_como_fallo(monkeypatch):
+    url = "http://ollama-lento.invalid:11434"
+    monkeypatch.setattr(Config, "OLLAMA_BASE_URL", url)
+    monkeypatch.setattr(Config, "OLLAMA_HEDGE_URL", "")
+    liberar = threading.Event()
+    monkeypatch.setattr(llm, "obtener_chain", lambda *args, **kwargs: ChainLenta(liberar))
+    try:
+        with pytest.raises(DeadlineExcedido):
+            llm.invocar_chain([], {}, "ruteo", deadline=Deadline(0.1))
+        assert llm.circuito(url).resumen()["fallos_seguidos"] == 1
+    finally:
+        liberar.set()
@@ -0,0 +1,36 @@
+import sqlite3
+
+import pytest
+
+from config import Config
+from utils.database_helpers import normalizar_filtro
+
+
+@pytest.fixture(autouse=True)
+def sin_espera(base_temporal, monkeypatch):
+    monkeypatch.setattr(Config, "CATALOGO_REFRESCO_SEG", 0.0)
+
+
+@pytest.mark.parametrize(
+    "campo, valor, esperado",
+    [
+        ("ciudad", "La Paz", "la_paz"),
+        ("ciudad", "SCZ", "santa_cruz"),
+        ("ciudad", "Santa", "santa_cruz"),
+        ("ciudad", "cruz", "santa_cruz"),
+        ("tipo", "Depto", "departamento"),
+        ("ciudad", "Tarija", "tarija"),
+        ("ciudad", "", None),
+    ],
+)
+def test_normalizar_filtro(campo, valor, esperado):
+    assert normalizar_filtro(campo, valor) == esperado
+
+
+def test_sinonimo_nuevo_se_ve_sin_reiniciar(base_temporal):
+    assert normalizar_filtro("ciudad", "chuquiago") == "chuquiago"
+    conn = sqlite3.connect(base_temporal)
+    conn.execute("INSERT INTO sinonimos_busqueda VALUES ('ciudad', 'chuquiago', 'la_paz')")
+    conn.commit()
+    conn.close()
+    assert normalizar_filtro("ciudad", "chuquiago") == "la_paz"
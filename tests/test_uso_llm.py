@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+import pytest
+
+from utils import cascada
+from utils.database_helpers import (
+    crear_conversacion,
+    get_db_connection,
+    guardar_mensaje,
+    obtener_o_crear_usuario,
+    registrar_uso_llm,
+)
+from utils.resiliencia import Deadline, DeadlineExcedido
+
+
+def respuesta(texto):
+    return SimpleNamespace(content=texto, response_metadata={"eval_count": 7}, usage_metadata={})
+
+
+def filas_uso(conversacion_id):
+    conn = get_db_connection()
+    filas = conn.execute(
+        "SELECT etapa, mensaje_id, tokens_generados FROM uso_llm WHERE conversacion_id = ? ORDER BY id",
+        (conversacion_id,),
+    ).fetchall()
+    conn.close()
+    return [tuple(fila) for fila in filas]
+
+
+@pytest.fixture
+def conversacion(base_temporal):
+    return crear_conversacion(obtener_o_crear_usuario())
+
+
+def test_uso_se_liga_al_mensaje_del_asistente(conversacion):
+    ids = registrar_uso_llm(conversacion, [{"etapa": "ruteo", "tokens_generados": 3}])
+    mensaje_id = guardar_mensaje(conversacion, "asistente", "hola", uso_ids=ids)
+    assert filas_uso(conversacion) == [("ruteo", mensaje_id, 3)]
+
+
+def test_uso_del_ruteo_queda_aunque_el_escalado_venza(conversacion, monkeypatch):
+    llamadas = iter([respuesta("[USAR_TOOL:inexistente]"), DeadlineExcedido("sin tiempo")])
+
+    def invocar(tools, entrada, etapa, deadline):
+        salida = next(llamadas)
+        if isinstance(salida, Exception):
+            raise salida
+        return salida
+
+    monkeypatch.setattr(cascada, "_invocar", invocar)
+    monkeypatch.setattr(cascada, "modelo_etapa", lambda etapa: etapa)
+
+    def registrar(uso):
+        registrar_uso_llm(conversacion, [uso])
+
+    with pytest.raises(DeadlineExcedido):
+        cascada.rutear([], "hola", Deadline(5), registrar)
+    assert filas_uso(conversacion) == [("ruteo", None, 7)]
@@ -1,9 +1,11 @@
 from .rekaliber_tools import obtener_info_rekaliber, obtener_info_kristof
 from .database_tools import buscar_propiedades, contar_propiedades
+from .busqueda_semantica import buscar_propiedades_semantica
 
 __all__ = [
     "obtener_info_rekaliber",
     "obtener_info_kristof",
     "buscar_propiedades",
     "contar_propiedades",
+    "buscar_propiedades_semantica",
 ]
@@ -0,0 +1,43 @@
+from langchain_core.tools import tool
+from typing import Optional, List, Dict, Any
+
+from utils.indice_semantico import obtener_indice
+
+
+@tool
+def buscar_propiedades_semantica(
+    consulta: str,
+    ciudad: Optional[str] = None,
+    tipo: Optional[str] = None,
+    precio_max: Optional[float] = None,
+    limite: Optional[int] = 5,
+) -> List[Dict[str, Any]]:
+    """
+    Busca propiedades por significado a partir de una descripción libre.
+
+    Usa esta herramienta cuando el usuario describa lo que busca con sus
+    propias palabras y no solo con filtros, por ejemplo:
+    - "Casa amplia con jardín cerca del centro"
+    - "Departamento moderno amoblado"
+    - "Algo con piscina o vista panorámica"
+
+    Args:
+        consulta: Descripción de lo que busca el usuario
+        ciudad: Ciudad (La Paz, Santa Cruz, Cochabamba), opcional
+        tipo: Tipo de propiedad (Casa, Departamento, Terreno), opcional
+        precio_max: Precio máximo en dólares, opcional
+        limite: Máximo de resultados
+
+    Returns:
+        Lista de propiedades ordenadas por similitud con la consulta
+    """
+    indice = obtener_indice()
+    if indice is None:
+        raise RuntimeError("La búsqueda semántica requiere numpy instalado")
+    return indice.buscar(
+        consulta,
+        ciudad=ciudad,
+        tipo=tipo,
+        precio_max=precio_max,
+        limite=limite or 5,
+    )
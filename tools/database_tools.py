@@ -1,9 +1,11 @@
 from langchain_core.tools import tool
-import sqlite3
+import logging
 from typing import Optional, List, Dict, Any
 
-# Ruta a la base de datos
-DB_PATH = "data/propiedades.db"
+from utils.catalogo import obtener_catalogo
+from utils.database_helpers import get_db_connection, normalizar_filtro
+
+logger = logging.getLogger(__name__)
 
 
 @tool
@@ -11,6 +13,14 @@ def buscar_propiedades(
     tipo: Optional[str] = None,
     ciudad: Optional[str] = None,
     precio_max: Optional[float] = None,
+    precio_min: Optional[float] = None,
+    dormitorios_min: Optional[int] = None,
+    dormitorios_max: Optional[int] = None,
+    banos_min: Optional[int] = None,
+    banos_max: Optional[int] = None,
+    area_min: Optional[float] = None,
+    area_max: Optional[float] = None,
+    limite: Optional[int] = 20,
 ) -> List[Dict[str, Any]]:
     """
     Busca propiedades en la base de datos según criterios.
@@ -20,57 +30,107 @@ def buscar_propiedades(
     - Casas, departamentos o terrenos
     - Propiedades en una ciudad específica
     - Propiedades dentro de un presupuesto
+    - Propiedades con cierta cantidad de dormitorios, baños o superficie
 
     Args:
         tipo: Tipo de propiedad (Casa, Departamento, Terreno)
         ciudad: Ciudad (La Paz, Santa Cruz, Cochabamba)
         precio_max: Precio máximo en dólares
+        precio_min: Precio mínimo en dólares
+        dormitorios_min: Mínimo de dormitorios
+        dormitorios_max: Máximo de dormitorios
+        banos_min: Mínimo de baños
+        banos_max: Máximo de baños
+        area_min: Superficie mínima en m2
+        area_max: Superficie máxima en m2
+        limite: Máximo de resultados (los más baratos primero)
 
     Returns:
         Lista de propiedades que cumplen los criterios
     """
+    # Normalizar una sola vez: acentos, mayúsculas y sinónimos ("depto", "SCZ")
+    tipo = normalizar_filtro("tipo", tipo)
+    ciudad = normalizar_filtro("ciudad", ciudad)
+
+    filtros = {
+        "tipo": tipo,
+        "ciudad": ciudad,
+        "precio_min": precio_min,
+        "precio_max": precio_max,
+        "dormitorios_min": dormitorios_min,
+        "dormitorios_max": dormitorios_max,
+        "banos_min": banos_min,
+        "banos_max": banos_max,
+        "area_min": area_min,
+        "area_max": area_max,
+        "limite": limite,
+    }
+
+    # Camino rápido: snapshot columnar en memoria
+    try:
+        catalogo = obtener_catalogo()
+    except Exception as e:
+        logger.warning("Catálogo en memoria no disponible: %s", e)
+        catalogo = None
+    if catalogo is not None:
+        return catalogo.buscar(**filtros)
+
+    # Misma conexión que el resto de la app (database_helpers.DB_PATH)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    query = "SELECT * FROM propiedades WHERE disponible = 1"
+    params = []
+
+    if tipo:
+        query += " AND tipo_norm = ?"
+        params.append(tipo)
+
+    if ciudad:
+        query += " AND ciudad_norm = ?"
+        params.append(ciudad)
+
+    rangos = (
+        ("precio", precio_min, precio_max),
+        ("dormitorios", dormitorios_min, dormitorios_max),
+        ("banos", banos_min, banos_max),
+        ("area_m2", area_min, area_max),
+    )
+    for columna, minimo, maximo in rangos:
+        if minimo is not None:
+            query += f" AND {columna} >= ?"
+            params.append(minimo)
+        if maximo is not None:
+            query += f" AND {columna} <= ?"
+            params.append(maximo)
+
+    query += " ORDER BY precio ASC"
+    if limite:
+        query += " LIMIT ?"
+        params.append(limite)
+
+    # Los errores de SQLite se propagan: EjecutorTools los reporta como ToolFallo
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        query = "SELECT * FROM propiedades WHERE disponible = 1"
-        params = []
-
-        if tipo:
-            query += " AND tipo LIKE ?"
-            params.append(f"%{tipo}%")
-
-        if ciudad:
-            query += " AND ciudad LIKE ?"
-            params.append(f"%{ciudad}%")
-
-        if precio_max:
-            query += " AND precio <= ?"
-            params.append(precio_max)
-
         cursor.execute(query, params)
         resultados = cursor.fetchall()
+    finally:
         conn.close()
 
-        propiedades = []
-        for row in resultados:
-            propiedades.append(
-                {
-                    "id": row["id"],
-                    "tipo": row["tipo"],
-                    "ciudad": row["ciudad"],
-                    "zona": row["zona"],
-                    "precio": row["precio"],
-                    "dormitorios": row["dormitorios"],
-                    "descripcion": row["descripcion"],
-                }
-            )
-
-        return propiedades if propiedades else []
+    propiedades = []
+    for row in resultados:
+        propiedades.append(
+            {
+                "id": row["id"],
+                "tipo": row["tipo"],
+                "ciudad": row["ciudad"],
+                "zona": row["zona"],
+                "precio": row["precio"],
+                "dormitorios": row["dormitorios"],
+                "descripcion": row["descripcion"],
+            }
+        )
 
-    except Exception as e:
-        return [{"error": str(e)}]
+    return propiedades if propiedades else []
 
 
 @tool
@@ -89,42 +149,43 @@ def contar_propiedades(ciudad: Optional[str] = None) -> Dict[str, Any]:
     Returns:
         Diccionario con el conteo total y por tipo
     """
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+    conn = get_db_connection()
+    cursor = conn.cursor()
 
+    # Los conteos se leen de la tabla materializada conteo_propiedades,
+    # que mantienen los triggers de `propiedades` (ver utils/init_db.py)
+    try:
         if ciudad:
             cursor.execute(
                 """
-                SELECT tipo, COUNT(*) as cantidad 
-                FROM propiedades 
-                WHERE disponible = 1 AND ciudad LIKE ?
+                SELECT tipo, SUM(cantidad) as cantidad
+                FROM conteo_propiedades
+                WHERE ciudad_norm = ? AND disponible = 1
                 GROUP BY tipo
             """,
-                (f"%{ciudad}%",),
+                (normalizar_filtro("ciudad", ciudad),),
             )
+            resultados = cursor.fetchall()
         else:
             cursor.execute(
                 """
-                SELECT tipo, COUNT(*) as cantidad 
-                FROM propiedades 
+                SELECT tipo, SUM(cantidad) as cantidad
+                FROM conteo_propiedades
                 WHERE disponible = 1
                 GROUP BY tipo
             """
             )
-
-        resultados = cursor.fetchall()
+            resultados = cursor.fetchall()
+    finally:
         conn.close()
 
-        conteo = {"total": 0, "por_tipo": {}}
-        for tipo, cantidad in resultados:
-            conteo["por_tipo"][tipo] = cantidad
-            conteo["total"] += cantidad
+    conteo = {"total": 0, "por_tipo": {}}
+    for tipo, cantidad in resultados:
+        conteo["por_tipo"][tipo] = cantidad
+        conteo["total"] += cantidad
 
-        if ciudad:
-            conteo["ciudad"] = ciudad
+    if ciudad:
+        conteo["ciudad"] = ciudad
 
-        return conteo
+    return conteo
 
-    except Exception as e:
-        return {"error": str(e)}
@@ -0,0 +1,255 @@
+"""
+Archivado de conversaciones inactivas.
+
+Mueve las conversaciones sin actividad (y sus mensajes) de la base principal
+a una base de archivo separada, para que la base principal quede con los
+datos calientes. Las conversaciones archivadas siguen siendo consultables con
+los helpers de utils/database_helpers.py usando `incluir_archivo=True`, y si
+reciben un mensaje nuevo `guardar_mensaje` las devuelve a la base principal.
+
+Cada usuario puede tener su propia política en `politicas_retencion`:
+    dias_inactividad   días sin actividad antes de archivar (NULL = nunca)
+    dias_conservacion  días que se conserva en el archivo (NULL = siempre)
+
+Uso:
+    python -m utils.archivar_conversaciones --dias 90
+    python -m utils.archivar_conversaciones --politica 7 30 365
+"""
+
+import argparse
+import os
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+from utils.database_helpers import (
+    ARCHIVO_DB_PATH,
+    COLUMNAS_CONVERSACIONES,
+    COLUMNAS_MENSAJES,
+    DB_PATH,
+    adjuntar_base_archivo,
+)
+
+
+def _tamano_db(cursor, esquema: str = "main") -> int:
+    cursor.execute(f"PRAGMA {esquema}.page_count")
+    paginas = cursor.fetchone()[0]
+    cursor.execute(f"PRAGMA {esquema}.page_size")
+    return paginas * cursor.fetchone()[0]
+
+
+def _activar_vacuum_incremental(cursor) -> bool:
+    """
+    Activa auto_vacuum=INCREMENTAL. Cambiar el modo exige un VACUUM completo,
+    que solo se hace la primera vez.
+
+    Returns:
+        True si hubo que hacer el VACUUM completo
+    """
+    cursor.execute("PRAGMA auto_vacuum")
+    if cursor.fetchone()[0] == 2:
+        return False
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    cursor.execute("VACUUM")
+    return True
+
+
+def establecer_politica_retencion(
+    usuario_id: int,
+    dias_inactividad: Optional[int],
+    dias_conservacion: Optional[int] = None,
+    db_path: str = DB_PATH,
+):
+    """
+    Define la política de retención de un usuario.
+
+    Args:
+        usuario_id: ID del usuario
+        dias_inactividad: Días sin actividad antes de archivar (None = nunca)
+        dias_conservacion: Días que se conserva en el archivo (None = siempre)
+    """
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        """
+        INSERT INTO politicas_retencion (usuario_id, dias_inactividad, dias_conservacion)
+        VALUES (?, ?, ?)
+        ON CONFLICT(usuario_id) DO UPDATE SET
+            dias_inactividad = excluded.dias_inactividad,
+            dias_conservacion = excluded.dias_conservacion
+        """,
+        (usuario_id, dias_inactividad, dias_conservacion),
+    )
+    conn.commit()
+    conn.close()
+
+
+def archivar_conversaciones(
+    dias_inactividad: int = 90,
+    db_path: str = DB_PATH,
+    archivo_path: str = ARCHIVO_DB_PATH,
+    paginas_vacuum: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Archiva las conversaciones inactivas y recupera el espacio liberado.
+
+    Args:
+        dias_inactividad: Días sin actividad por defecto (usuarios sin política)
+        db_path: Base de datos principal
+        archivo_path: Base de datos de archivo (se crea si no existe)
+        paginas_vacuum: Máximo de páginas a liberar con incremental_vacuum
+            (None = todas las páginas libres)
+
+    Returns:
+        Diccionario con conversaciones/mensajes archivados, purgados y bytes recuperados
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    cursor = conn.cursor()
+
+    stats: Dict[str, Any] = {"bytes_antes": _tamano_db(cursor)}
+    stats["vacuum_completo"] = _activar_vacuum_incremental(cursor)
+
+    os.makedirs(os.path.dirname(archivo_path) or ".", exist_ok=True)
+    adjuntar_base_archivo(conn, archivo_path)
+
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+
+        cursor.execute("DROP TABLE IF EXISTS temp.a_archivar")
+        cursor.execute(
+            """
+            CREATE TEMP TABLE a_archivar AS
+            SELECT c.id
+            FROM main.conversaciones c
+            LEFT JOIN main.politicas_retencion p ON p.usuario_id = c.usuario_id
+            WHERE NOT (p.usuario_id IS NOT NULL AND p.dias_inactividad IS NULL)
+              AND c.fecha_actualizacion < datetime(
+                  'now', printf('-%d days', COALESCE(p.dias_inactividad, ?))
+              )
+            """,
+            (dias_inactividad,),
+        )
+
+        cursor.execute(
+            f"""
+            INSERT OR REPLACE INTO archivo.conversaciones ({COLUMNAS_CONVERSACIONES})
+            SELECT {COLUMNAS_CONVERSACIONES} FROM main.conversaciones
+            WHERE id IN (SELECT id FROM temp.a_archivar)
+            """
+        )
+        stats["conversaciones_archivadas"] = cursor.rowcount
+        cursor.execute(
+            f"""
+            INSERT OR REPLACE INTO archivo.mensajes ({COLUMNAS_MENSAJES})
+            SELECT {COLUMNAS_MENSAJES} FROM main.mensajes
+            WHERE conversacion_id IN (SELECT id FROM temp.a_archivar)
+            """
+        )
+        stats["mensajes_archivados"] = cursor.rowcount
+
+        cursor.execute(
+            "DELETE FROM main.mensajes WHERE conversacion_id IN (SELECT id FROM temp.a_archivar)"
+        )
+        cursor.execute(
+            "DELETE FROM main.conversaciones WHERE id IN (SELECT id FROM temp.a_archivar)"
+        )
+
+        # Purga del archivo según dias_conservacion de cada usuario
+        cursor.execute("DROP TABLE IF EXISTS temp.a_purgar")
+        cursor.execute(
+            """
+            CREATE TEMP TABLE a_purgar AS
+            SELECT c.id
+            FROM archivo.conversaciones c
+            JOIN main.politicas_retencion p ON p.usuario_id = c.usuario_id
+            WHERE p.dias_conservacion IS NOT NULL
+              AND c.fecha_actualizacion < datetime('now', printf('-%d days', p.dias_conservacion))
+            """
+        )
+        cursor.execute(
+            "DELETE FROM archivo.mensajes WHERE conversacion_id IN (SELECT id FROM temp.a_purgar)"
+        )
+        cursor.execute(
+            "DELETE FROM archivo.conversaciones WHERE id IN (SELECT id FROM temp.a_purgar)"
+        )
+        stats["conversaciones_purgadas"] = cursor.rowcount
+
+        cursor.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        conn.close()
+        raise
+
+    # Devolver al sistema de archivos las páginas liberadas
+    cursor.execute("PRAGMA main.freelist_count")
+    stats["paginas_libres"] = cursor.fetchone()[0]
+    # executescript avanza el PRAGMA hasta el final; execute() solo liberaría una página
+    paginas = stats["paginas_libres"] if paginas_vacuum is None else int(paginas_vacuum)
+    conn.executescript(f"PRAGMA main.incremental_vacuum({paginas});")
+
+    stats["bytes_despues"] = _tamano_db(cursor)
+    stats["bytes_recuperados"] = stats["bytes_antes"] - stats["bytes_despues"]
+    stats["bytes_archivo"] = _tamano_db(cursor, "archivo")
+    conn.close()
+
+    return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Archiva conversaciones inactivas en una base de datos separada"
+    )
+    parser.add_argument(
+        "--dias",
+        type=int,
+        default=90,
+        help="Días de inactividad antes de archivar (usuarios sin política propia)",
+    )
+    parser.add_argument("--db", default=DB_PATH, help=f"Base principal (por defecto {DB_PATH})")
+    parser.add_argument(
+        "--archivo",
+        default=ARCHIVO_DB_PATH,
+        help=f"Base de archivo (por defecto {ARCHIVO_DB_PATH})",
+    )
+    parser.add_argument(
+        "--paginas",
+        type=int,
+        help="Máximo de páginas a liberar con incremental_vacuum (por defecto todas)",
+    )
+    parser.add_argument(
+        "--politica",
+        nargs=3,
+        metavar=("USUARIO_ID", "DIAS_INACTIVIDAD", "DIAS_CONSERVACION"),
+        help="Define la política de un usuario en lugar de archivar ('-' = sin límite)",
+    )
+    args = parser.parse_args(argv)
+
+    if args.politica:
+        usuario_id, inactividad, conservacion = (
+            None if valor == "-" else int(valor) for valor in args.politica
+        )
+        establecer_politica_retencion(usuario_id, inactividad, conservacion, db_path=args.db)
+        print(f"✅ Política guardada para el usuario {usuario_id}")
+        return
+
+    print(f"🗄️  Archivando conversaciones inactivas de {args.db} en {args.archivo}...")
+    stats = archivar_conversaciones(
+        dias_inactividad=args.dias,
+        db_path=args.db,
+        archivo_path=args.archivo,
+        paginas_vacuum=args.paginas,
+    )
+
+    if stats["vacuum_completo"]:
+        print("   - VACUUM completo para activar auto_vacuum incremental")
+    print(f"✅ Conversaciones archivadas: {stats['conversaciones_archivadas']}")
+    print(f"   - Mensajes archivados: {stats['mensajes_archivados']}")
+    print(f"   - Conversaciones purgadas del archivo: {stats['conversaciones_purgadas']}")
+    print(
+        f"   - Tamaño: {stats['bytes_antes']} -> {stats['bytes_despues']} bytes "
+        f"({stats['bytes_recuperados']} recuperados)"
+    )
+    print(f"   - Tamaño del archivo: {stats['bytes_archivo']} bytes")
+
+
+if __name__ == "__main__":
+    main()
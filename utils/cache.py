@@ -0,0 +1,307 @@
+"""
+Caché con backends intercambiables.
+
+    MemoriaLRU   LRU en memoria del proceso (un worker)
+    SQLiteCache  archivo SQLite compartido por todos los workers del host
+    RedisCache   servidor Redis (o cualquier cliente compatible, p. ej. fakeredis)
+
+Todos comparten la misma interfaz: get/set con TTL, invalidación por espacio
+de nombres y estadísticas de aciertos. Los valores se guardan como JSON, así
+que deben ser serializables.
+
+La caché nunca tumba una petición: si el backend falla (Redis caído, SQLite
+bloqueado) la lectura cuenta como fallo, la escritura se omite y se registra
+el error.
+
+El backend se elige con Config.CACHE_BACKEND ('memoria', 'sqlite', 'redis'
+o 'ninguno') y se obtiene con `obtener_cache()`.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from config import Config
+
+
+logger = logging.getLogger(__name__)
+
+class CacheBackend:
+    """Interfaz común y contadores de estadísticas"""
+
+    nombre = "base"
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._stats_lock = threading.Lock()
+
+    def _contar(self, namespace: str, evento: str):
+        with self._stats_lock:
+            contadores = self._stats.setdefault(
+                namespace, {"aciertos": 0, "fallos": 0, "escrituras": 0, "errores": 0}
+            )
+            contadores[evento] += 1
+
+    # ----- A implementar por cada backend -----
+
+    def _get(self, namespace: str, clave: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def _set(self, namespace: str, clave: str, valor: str, ttl: Optional[float]):
+        """ttl es None (sin expiración) o mayor que 0"""
+        raise NotImplementedError
+
+    def invalidar(self, namespace: str):
+        """Descarta todas las entradas de un espacio de nombres"""
+        raise NotImplementedError
+
+    # ----- API pública -----
+
+    def get(self, namespace: str, clave: str) -> Any:
+        """Devuelve el valor cacheado o None si no existe, expiró o el backend falló"""
+        try:
+            crudo = self._get(namespace, clave)
+        except Exception as e:
+            logger.warning("Caché %s: error al leer de '%s': %s", self.nombre, namespace, e)
+            self._contar(namespace, "errores")
+            crudo = None
+        self._contar(namespace, "fallos" if crudo is None else "aciertos")
+        return None if crudo is None else json.loads(crudo)
+
+    def set(self, namespace: str, clave: str, valor: Any, ttl: Optional[float] = None):
+        """
+        Guarda un valor (no None).
+
+        ttl en segundos: None = sin expiración, 0 o negativo = no se guarda.
+        """
+        if valor is None or (ttl is not None and ttl <= 0):
+            return
+        try:
+            self._set(namespace, clave, json.dumps(valor, ensure_ascii=False), ttl)
+        except Exception as e:
+            logger.warning("Caché %s: error al escribir en '%s': %s", self.nombre, namespace, e)
+            self._contar(namespace, "errores")
+            return
+        self._contar(namespace, "escrituras")
+
+    def obtener_o_calcular(
+        self, namespace: str, clave: str, funcion: Callable[[], Any], ttl: Optional[float] = None
+    ) -> Any:
+        """Devuelve el valor cacheado o lo calcula y lo guarda"""
+        valor = self.get(namespace, clave)
+        if valor is None:
+            valor = funcion()
+            self.set(namespace, clave, valor, ttl)
+        return valor
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Aciertos, fallos, escrituras y tasa de aciertos por espacio de nombres"""
+        with self._stats_lock:
+            por_namespace = {}
+            for namespace, c in self._stats.items():
+                consultas = c["aciertos"] + c["fallos"]
+                por_namespace[namespace] = {
+                    **c,
+                    "tasa_aciertos": round(c["aciertos"] / consultas, 4) if consultas else None,
+                }
+        return {"backend": self.nombre, "pid": os.getpid(), "namespaces": por_namespace}
+
+
+class SinCache(CacheBackend):
+    """Backend nulo: nunca guarda nada"""
+
+    nombre = "ninguno"
+
+    def _get(self, namespace, clave):
+        return None
+
+    def _set(self, namespace, clave, valor, ttl):
+        pass
+
+    def set(self, namespace, clave, valor, ttl=None):
+        pass
+
+    def invalidar(self, namespace):
+        pass
+
+
+class MemoriaLRU(CacheBackend):
+    """LRU acotado en memoria del proceso"""
+
+    nombre = "memoria"
+
+    def __init__(self, max_entradas: int = 1024):
+        super().__init__()
+        self.max_entradas = max_entradas
+        self._datos: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._generaciones: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _clave(self, namespace, clave):
+        return (namespace, self._generaciones.get(namespace, 0), clave)
+
+    def _get(self, namespace, clave):
+        with self._lock:
+            k = self._clave(namespace, clave)
+            entrada = self._datos.get(k)
+            if entrada is None:
+                return None
+            expira, valor = entrada
+            if expira is not None and expira < time.monotonic():
+                del self._datos[k]
+                return None
+            self._datos.move_to_end(k)
+            return valor
+
+    def _set(self, namespace, clave, valor, ttl):
+        with self._lock:
+            k = self._clave(namespace, clave)
+            expira = time.monotonic() + ttl if ttl is not None else None
+            self._datos[k] = (expira, valor)
+            self._datos.move_to_end(k)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, namespace):
+        # Las entradas de la generación anterior quedan inalcanzables y el LRU las desaloja
+        with self._lock:
+            self._generaciones[namespace] = self._generaciones.get(namespace, 0) + 1
+
+
+class ConexionPorHilo:
+    """
+    Conexión SQLite en autocommit, una por hilo. WAL permite lectores
+    concurrentes entre procesos que comparten el archivo.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+
+    def __call__(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+class SQLiteCache(CacheBackend):
+    """Caché en un archivo SQLite compartido entre procesos del mismo host"""
+
+    nombre = "sqlite"
+
+    def __init__(self, ruta: str = "data/cache.db", purgar_cada: int = 500):
+        super().__init__()
+        self.ruta = ruta
+        self.purgar_cada = purgar_cada
+        self._escrituras = 0
+        self._conexion = ConexionPorHilo(ruta)
+        conn = self._conexion()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                clave TEXT NOT NULL,
+                valor TEXT NOT NULL,
+                expira REAL,
+                PRIMARY KEY (namespace, clave)
+            ) WITHOUT ROWID
+        """
+        )
+
+    def _get(self, namespace, clave):
+        fila = self._conexion().execute(
+            "SELECT valor, expira FROM cache WHERE namespace = ? AND clave = ?",
+            (namespace, clave),
+        ).fetchone()
+        if fila is None or (fila[1] is not None and fila[1] < time.time()):
+            return None
+        return fila[0]
+
+    def _set(self, namespace, clave, valor, ttl):
+        conn = self._conexion()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (namespace, clave, valor, expira) VALUES (?, ?, ?, ?)",
+            (namespace, clave, valor, time.time() + ttl if ttl is not None else None),
+        )
+        self._escrituras += 1
+        if self._escrituras % self.purgar_cada == 0:
+            conn.execute("DELETE FROM cache WHERE expira IS NOT NULL AND expira < ?", (time.time(),))
+
+    def invalidar(self, namespace):
+        self._conexion().execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+
+
+class RedisCache(CacheBackend):
+    """Caché en Redis; acepta un cliente ya creado (útil con fakeredis en pruebas)"""
+
+    nombre = "redis"
+
+    def __init__(self, url: Optional[str] = None, cliente=None, prefijo: str = "chatbot"):
+        super().__init__()
+        if cliente is None:
+            import redis
+
+            cliente = redis.Redis.from_url(url or "redis://localhost:6379/0")
+        self.cliente = cliente
+        self.prefijo = prefijo
+
+    def _generacion(self, namespace) -> int:
+        valor = self.cliente.get(f"{self.prefijo}:gen:{namespace}")
+        return int(valor) if valor is not None else 0
+
+    def _clave(self, namespace, clave):
+        return f"{self.prefijo}:{namespace}:{self._generacion(namespace)}:{clave}"
+
+    def _get(self, namespace, clave):
+        valor = self.cliente.get(self._clave(namespace, clave))
+        if isinstance(valor, bytes):
+            valor = valor.decode("utf-8")
+        return valor
+
+    def _set(self, namespace, clave, valor, ttl):
+        # En milisegundos: con segundos enteros un TTL menor que 1 s sería "sin expiración"
+        px = max(1, int(ttl * 1000)) if ttl is not None else None
+        self.cliente.set(self._clave(namespace, clave), valor, px=px)
+
+    def invalidar(self, namespace):
+        # Subir la generación deja huérfanas las claves viejas; expiran por su TTL
+        self.cliente.incr(f"{self.prefijo}:gen:{namespace}")
+
+
+# ===== CACHÉ DEL PROCESO =====
+
+_cache: Optional[CacheBackend] = None
+_cache_lock = threading.Lock()
+
+
+def crear_cache(backend: Optional[str] = None) -> CacheBackend:
+    """Crea el backend indicado (por defecto Config.CACHE_BACKEND)"""
+    backend = (backend or Config.CACHE_BACKEND).lower()
+    if backend == "memoria":
+        return MemoriaLRU(max_entradas=Config.CACHE_MAX_ENTRADAS)
+    if backend == "sqlite":
+        return SQLiteCache(ruta=Config.CACHE_URL or "data/cache.db")
+    if backend == "redis":
+        return RedisCache(url=Config.CACHE_URL)
+    if backend == "ninguno":
+        return SinCache()
+    raise ValueError(f"Backend de caché desconocido: '{backend}'")
+
+
+def obtener_cache() -> CacheBackend:
+    """Devuelve la caché compartida del proceso"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = crear_cache()
+        return _cache
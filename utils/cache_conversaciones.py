@@ -0,0 +1,214 @@
+"""
+Caché en memoria de usuarios y conversaciones activas.
+
+Evita volver a la base en cada turno de /chat:
+    - ID de usuario por email (`obtener_o_crear_usuario`)
+    - ventana con los últimos mensajes de cada conversación activa
+      (`obtener_mensajes_conversacion`)
+
+Es write-through: `guardar_mensaje`, `crear_conversacion` y
+`eliminar_conversacion` actualizan la caché después de escribir en la base.
+Ambos LRU están acotados (Config.CONVERSACIONES_CACHE_*) y cada mensaje se
+guarda como un objeto con __slots__, sin el dict por instancia.
+
+Es por proceso: con varios workers cada uno tiene la suya y solo ve lo que
+el propio proceso leyó o escribió. Por eso `obtener_mensajes_conversacion`
+compara la ventana con COUNT y MAX(id) de la base antes de servirla (una
+consulta sobre el índice, sin leer los mensajes) y la descarta si otro worker
+escribió en la conversación.
+
+El archivador (utils/archivar_conversaciones.py) borra filas de la base
+principal sin pasar por aquí; la misma comprobación descarta la ventana de una
+conversación archivada. Si recibe un mensaje, `guardar_mensaje` la restaura
+del archivo y descarta la ventana.
+"""
+
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Dict, Hashable, List, Optional
+
+from config import Config
+
+
+class MensajeReciente:
+    """Fila de `mensajes` en forma compacta"""
+
+    __slots__ = ("id", "conversacion_id", "rol", "contenido", "fecha_creacion")
+
+    def __init__(self, id, conversacion_id, rol, contenido, fecha_creacion):
+        self.id = id
+        self.conversacion_id = conversacion_id
+        self.rol = rol
+        self.contenido = contenido
+        self.fecha_creacion = fecha_creacion
+
+    @classmethod
+    def desde_fila(cls, fila) -> "MensajeReciente":
+        return cls(
+            fila["id"], fila["conversacion_id"], fila["rol"], fila["contenido"], fila["fecha_creacion"]
+        )
+
+    def como_dict(self) -> Dict[str, Any]:
+        return {campo: getattr(self, campo) for campo in self.__slots__}
+
+
+class _Ventana:
+    # completa: la ventana contiene la conversación entera, no solo su final
+    __slots__ = ("mensajes", "completa")
+
+    def __init__(self, tamano: int, completa: bool):
+        self.mensajes: deque = deque(maxlen=tamano)
+        self.completa = completa
+
+
+class CacheConversaciones:
+    """LRU de IDs de usuario y de ventanas de mensajes recientes"""
+
+    def __init__(
+        self,
+        max_conversaciones: int = 1000,
+        mensajes_por_conversacion: int = 20,
+        max_usuarios: int = 10000,
+    ):
+        self.max_conversaciones = max_conversaciones
+        self.mensajes_por_conversacion = mensajes_por_conversacion
+        self.max_usuarios = max_usuarios
+        self._usuarios: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._ventanas: "OrderedDict[Hashable, _Ventana]" = OrderedDict()
+        self._contadores = {
+            "usuarios_aciertos": 0, "usuarios_fallos": 0,
+            "mensajes_aciertos": 0, "mensajes_fallos": 0,
+        }
+        self._lock = threading.Lock()
+
+    # ----- Usuarios -----
+
+    def usuario(self, clave: Hashable) -> Optional[int]:
+        with self._lock:
+            usuario_id = self._usuarios.get(clave)
+            if usuario_id is None:
+                self._contadores["usuarios_fallos"] += 1
+                return None
+            self._usuarios.move_to_end(clave)
+            self._contadores["usuarios_aciertos"] += 1
+            return usuario_id
+
+    def guardar_usuario(self, clave: Hashable, usuario_id: int):
+        if self.max_usuarios <= 0:
+            return
+        with self._lock:
+            self._usuarios[clave] = usuario_id
+            self._usuarios.move_to_end(clave)
+            while len(self._usuarios) > self.max_usuarios:
+                self._usuarios.popitem(last=False)
+
+    # ----- Mensajes -----
+
+    def _ventana(self, clave: Hashable, completa: bool) -> _Ventana:
+        ventana = _Ventana(self.mensajes_por_conversacion, completa)
+        self._ventanas[clave] = ventana
+        while len(self._ventanas) > self.max_conversaciones:
+            self._ventanas.popitem(last=False)
+        return ventana
+
+    def mensajes(self, clave: Hashable, limite: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Últimos `limite` mensajes en orden cronológico (todos si limite es None).
+
+        Returns:
+            None si la ventana no alcanza para responder y hay que ir a la base
+        """
+        with self._lock:
+            ventana = self._ventanas.get(clave)
+            disponibles = 0 if ventana is None else len(ventana.mensajes)
+            if ventana is None or not (ventana.completa or (limite and limite <= disponibles)):
+                self._contadores["mensajes_fallos"] += 1
+                return None
+            self._ventanas.move_to_end(clave)
+            self._contadores["mensajes_aciertos"] += 1
+            seleccion = list(ventana.mensajes)
+        if limite:
+            seleccion = seleccion[-limite:]
+        return [mensaje.como_dict() for mensaje in seleccion]
+
+    def cargar(self, clave: Hashable, filas: List[Any], completa: bool):
+        """
+        Guarda los mensajes leídos de la base (en orden cronológico).
+
+        Args:
+            completa: Las filas son la conversación entera
+        """
+        if self.max_conversaciones <= 0 or self.mensajes_por_conversacion <= 0:
+            return
+        with self._lock:
+            mensajes = [MensajeReciente.desde_fila(fila) for fila in filas]
+            anterior = self._ventanas.get(clave)
+            if anterior is not None:
+                # Lo escrito mientras se leía la base no está en las filas: conservarlo
+                leidos = {mensaje.id for mensaje in mensajes}
+                mensajes.extend(m for m in anterior.mensajes if m.id not in leidos)
+                mensajes.sort(key=lambda m: m.id)
+            ventana = self._ventana(clave, completa and len(mensajes) <= self.mensajes_por_conversacion)
+            # La deque conserva solo los últimos mensajes_por_conversacion
+            ventana.mensajes.extend(mensajes)
+
+    def agregar(self, clave: Hashable, mensaje: MensajeReciente):
+        """Agrega un mensaje recién guardado"""
+        if self.max_conversaciones <= 0 or self.mensajes_por_conversacion <= 0:
+            return
+        with self._lock:
+            ventana = self._ventanas.get(clave)
+            if ventana is None:
+                # Sin ventana no se sabe qué hay antes: queda como ventana parcial
+                ventana = self._ventana(clave, False)
+            else:
+                self._ventanas.move_to_end(clave)
+                # Un lector concurrente pudo cargarlo ya desde la base
+                if any(m.id == mensaje.id for m in ventana.mensajes):
+                    return
+            if len(ventana.mensajes) == ventana.mensajes.maxlen:
+                ventana.completa = False
+            if ventana.mensajes and mensaje.id < ventana.mensajes[-1].id:
+                # Dos escritores que confirmaron en otro orden: se mantiene el orden por id
+                ordenados = sorted([*ventana.mensajes, mensaje], key=lambda m: m.id)
+                ventana.mensajes.clear()
+                ventana.mensajes.extend(ordenados)
+            else:
+                ventana.mensajes.append(mensaje)
+
+    def iniciar(self, clave: Hashable):
+        """Registra una conversación recién creada (sin mensajes)"""
+        if self.max_conversaciones <= 0 or self.mensajes_por_conversacion <= 0:
+            return
+        with self._lock:
+            self._ventana(clave, True)
+
+    def descartar(self, clave: Hashable):
+        with self._lock:
+            self._ventanas.pop(clave, None)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._contadores,
+                "usuarios": len(self._usuarios),
+                "conversaciones": len(self._ventanas),
+                "mensajes": sum(len(v.mensajes) for v in self._ventanas.values()),
+            }
+
+
+_cache: Optional[CacheConversaciones] = None
+_cache_lock = threading.Lock()
+
+
+def obtener_cache_conversaciones() -> CacheConversaciones:
+    """Devuelve la caché de conversaciones del proceso"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CacheConversaciones(
+                max_conversaciones=Config.CONVERSACIONES_CACHE_MAX,
+                mensajes_por_conversacion=Config.CONVERSACIONES_CACHE_MENSAJES,
+                max_usuarios=Config.USUARIOS_CACHE_MAX,
+            )
+        return _cache
@@ -0,0 +1,92 @@
+"""
+GET condicional y compresión de respuestas.
+
+Los endpoints de solo lectura calculan un ETag barato (versión del catálogo,
+registro de tools) antes de armar el cuerpo; si coincide con If-None-Match
+se responde 304 sin consultar la base ni serializar nada. No se envía
+Last-Modified: ninguna vista tiene una fecha estable de su contenido.
+
+Las respuestas JSON grandes se comprimen con brotli (si está instalado y el
+cliente lo acepta) o gzip. Los ETag son débiles (W/"...") porque identifican
+el contenido, no la codificación.
+
+    COMPRESION            activar la compresión
+    COMPRESION_MIN_BYTES  tamaño mínimo del cuerpo para comprimir
+"""
+
+import gzip
+import hashlib
+import json
+from typing import Any, Callable
+
+from flask import Response, make_response, request
+
+from config import Config
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependencia opcional
+    brotli = None
+
+def calcular_etag(*partes: Any) -> str:
+    """Hash estable de los valores de los que depende la respuesta"""
+    datos = json.dumps(partes, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(datos.encode("utf-8")).hexdigest()[:20]
+
+
+def respuesta_condicional(etag: str, generar: Callable[[], Any]):
+    """
+    Devuelve 304 si el cliente ya tiene esta versión; si no, la genera.
+
+    Args:
+        etag: Identificador de la versión (ver `calcular_etag`)
+        generar: Función que arma la respuesta (lo que devolvería la vista);
+            no se llama si la respuesta es 304
+    """
+    if request.if_none_match.contains_weak(etag):
+        respuesta = Response(status=304)
+    else:
+        respuesta = make_response(generar())
+        if respuesta.status_code != 200:
+            return respuesta
+
+    respuesta.set_etag(etag, weak=True)
+    # El navegador puede guardarla, pero debe revalidar en cada uso
+    respuesta.cache_control.no_cache = True
+    return respuesta
+
+
+def comprimir(respuesta: Response) -> Response:
+    """
+    Comprime el cuerpo JSON si es grande y el cliente lo acepta (after_request).
+
+    No toca respuestas en streaming (p. ej. /chat/batch) ni ya codificadas.
+    """
+    if (
+        not Config.COMPRESION
+        or respuesta.status_code < 200
+        or respuesta.status_code in (204, 304)
+        or respuesta.direct_passthrough
+        or respuesta.is_streamed
+        or respuesta.mimetype != "application/json"
+        or "Content-Encoding" in respuesta.headers
+    ):
+        return respuesta
+
+    respuesta.vary.add("Accept-Encoding")
+    cuerpo = respuesta.get_data()
+    if len(cuerpo) < Config.COMPRESION_MIN_BYTES:
+        return respuesta
+
+    aceptadas = request.accept_encodings
+    if brotli is not None and aceptadas["br"]:
+        # Calidad 5: buena relación entre tamaño y CPU para respuestas dinámicas
+        comprimido, codificacion = brotli.compress(cuerpo, quality=5), "br"
+    elif aceptadas["gzip"]:
+        comprimido, codificacion = gzip.compress(cuerpo, compresslevel=6), "gzip"
+    else:
+        return respuesta
+
+    respuesta.set_data(comprimido)
+    respuesta.headers["Content-Encoding"] = codificacion
+    return respuesta
@@ -0,0 +1,207 @@
+"""
+Cascada de modelos por etapa.
+
+    ruteo      MODEL_RUTEO decide la tool (o responde directamente)
+    respuesta  MODEL_RESPUESTA redacta la respuesta final con el resultado de la tool
+    charla     MODEL_CHARLA responde lo que no necesita tools
+
+La etapa de ruteo solo tiene que emitir una etiqueta [USAR_TOOL:...], así que
+puede usar un modelo chico. Si su salida no es válida (vacía, etiqueta mal
+formada, tool o parámetros desconocidos) o es de baja confianza, se repite en
+MODEL_RESPUESTA: es el "escalado". Ollama no expone probabilidades por token,
+así que la confianza se estima con señales del texto: varias etiquetas, una
+etiqueta rodeada de prosa o una tool mencionada sin etiqueta.
+
+La charla usa un prompt sin instrucciones de tools. Si su modelo es el que ya
+respondió el ruteo (por defecto) se reutiliza ese texto sin otra llamada.
+Las etapas sin modelo propio usan MODEL_NAME.
+"""
+
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import Config
+from utils.helpers import detectar_tool_en_respuesta, resolver_tool
+from utils.llm import extraer_uso, invocar_chain, latencias
+from utils.resiliencia import Deadline
+
+
+ETAPAS = ("ruteo", "escalado", "respuesta", "charla")
+
+# Caracteres de texto tolerados junto a una etiqueta antes de dudar del ruteo
+MAX_TEXTO_JUNTO_A_ETIQUETA = 80
+
+_lock = threading.Lock()
+_llamadas: Counter = Counter()
+_motivos_escalado: Counter = Counter()
+_charlas_descartadas = 0
+
+
+def modelo_etapa(etapa: str) -> str:
+    """Modelo configurado para una etapa (el escalado usa el de respuesta)"""
+    if etapa == "escalado":
+        etapa = "respuesta"
+    if etapa == "charla":
+        return Config.MODEL_CHARLA or modelo_etapa("ruteo")
+    return getattr(Config, f"MODEL_{etapa.upper()}", None) or Config.MODEL_NAME
+
+
+def modelos_configurados() -> List[str]:
+    """Modelos distintos que usa la cascada"""
+    return list(dict.fromkeys(modelo_etapa(etapa) for etapa in ETAPAS))
+
+
+def validar_ruteo(texto: Optional[str], tools) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Valida la salida de la etapa de ruteo.
+
+    Returns:
+        (tool_spec o None, motivo para escalar o None si la salida es válida
+        y de confianza)
+    """
+    if not texto or not texto.strip():
+        return None, "respuesta_vacia"
+
+    tool_spec = detectar_tool_en_respuesta(texto)
+    if tool_spec is None:
+        if "[USAR_TOOL" in texto:
+            return None, "etiqueta_invalida"
+        minusculas = texto.lower()
+        if any(tool_obj.name.lower() in minusculas for tool_obj in tools):
+            # Consideró una tool pero no la pidió
+            return None, "menciona_tool"
+        return None, None
+
+    if texto.count("[USAR_TOOL") > 1:
+        return tool_spec, "varias_etiquetas"
+    inicio = texto.find("[USAR_TOOL")
+    fin = texto.find("]", inicio)
+    if len(texto[:inicio].strip()) + len(texto[fin + 1:].strip()) > MAX_TEXTO_JUNTO_A_ETIQUETA:
+        return tool_spec, "etiqueta_con_texto"
+
+    tool_obj = resolver_tool(tool_spec["name"], tools)
+    if tool_obj is None:
+        return tool_spec, "tool_desconocida"
+
+    argumentos = getattr(tool_obj, "args", None)
+    if argumentos is not None and set(tool_spec["params"]) - set(argumentos):
+        return tool_spec, "parametros_desconocidos"
+
+    return tool_spec, None
+
+
+def nombre_tool(tool_spec) -> Optional[str]:
+    """Nombre de la tool pedida en una etiqueta (None si no hay etiqueta)"""
+    if not tool_spec:
+        return None
+    return tool_spec.get("name") if isinstance(tool_spec, dict) else str(tool_spec)
+
+
+def _anotar_uso(respuesta, etapa: str, tool: Optional[str], registrar_uso) -> Dict[str, Any]:
+    # Se registra apenas vuelve la llamada: el turno aún puede fallar después
+    uso = extraer_uso(respuesta, etapa, tool)
+    if registrar_uso is not None:
+        registrar_uso(uso)
+    return uso
+
+
+def _invocar(tools, entrada: str, etapa: str, deadline: Deadline):
+    with _lock:
+        _llamadas[etapa] += 1
+    return invocar_chain(tools, {"input": entrada}, etapa, deadline, modelo=modelo_etapa(etapa))
+
+
+def rutear(
+    tools,
+    user_message: str,
+    deadline: Deadline,
+    registrar_uso: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Etapa de ruteo con escalado al modelo grande si la salida no es válida.
+
+    Args:
+        registrar_uso: Se llama con el consumo de cada llamada en cuanto vuelve
+
+    Returns:
+        {"texto", "tool_spec", "modelo", "escalado" (motivo o None), "uso"}
+    """
+    respuesta = _invocar(tools, user_message, "ruteo", deadline)
+    texto = getattr(respuesta, "content", None)
+    tool_spec, motivo = validar_ruteo(texto, tools)
+    uso = [_anotar_uso(respuesta, "ruteo", nombre_tool(tool_spec), registrar_uso)]
+    modelo = modelo_etapa("ruteo")
+
+    if motivo and modelo_etapa("escalado") != modelo:
+        with _lock:
+            _motivos_escalado[motivo] += 1
+        respuesta = _invocar(tools, user_message, "escalado", deadline)
+        texto = getattr(respuesta, "content", None)
+        tool_spec, _ = validar_ruteo(texto, tools)
+        uso.append(_anotar_uso(respuesta, "escalado", nombre_tool(tool_spec), registrar_uso))
+        modelo = modelo_etapa("escalado")
+    else:
+        motivo = None
+
+    return {"texto": texto, "tool_spec": tool_spec, "modelo": modelo, "escalado": motivo, "uso": uso}
+
+
+def responder_final(
+    tools, context_prompt: str, tool_name: str, deadline: Deadline, registrar_uso=None
+):
+    """Etapa de respuesta: redacta con el resultado de la tool"""
+    respuesta = _invocar(tools, context_prompt, "respuesta", deadline)
+    return respuesta, _anotar_uso(respuesta, "respuesta", tool_name, registrar_uso)
+
+
+def responder_charla(
+    tools, user_message: str, ruteo: Dict[str, Any], deadline: Deadline, registrar_uso=None
+):
+    """
+    Etapa de charla: si el modelo de charla es el que respondió el ruteo (o el
+    ruteo ya escaló al modelo grande) se reutiliza su texto; si no, se pide la
+    respuesta al modelo de charla con el prompt sin tools.
+
+    Returns:
+        (texto, uso de la llamada o None si no hubo llamada)
+    """
+    if ruteo["escalado"] or modelo_etapa("charla") == ruteo["modelo"]:
+        return ruteo["texto"], None
+    respuesta = _invocar(tools, user_message, "charla", deadline)
+    uso = _anotar_uso(respuesta, "charla", None, registrar_uso)
+    texto = getattr(respuesta, "content", None)
+    if texto and "[USAR_TOOL" in texto:
+        # Nunca mostrar una etiqueta al usuario: queda la respuesta directa del ruteo
+        global _charlas_descartadas
+        with _lock:
+            _charlas_descartadas += 1
+        texto = ruteo["texto"]
+    return texto, uso
+
+
+def resumen_cascada() -> Dict[str, Any]:
+    """Modelo, llamadas, percentiles de latencia y tasa de escalado por etapa"""
+    with _lock:
+        llamadas = dict(_llamadas)
+        motivos = dict(_motivos_escalado)
+        descartadas = _charlas_descartadas
+
+    etapas = {}
+    for etapa in ETAPAS:
+        ventana = latencias(etapa)
+        etapas[etapa] = {
+            "modelo": modelo_etapa(etapa),
+            "llamadas": llamadas.get(etapa, 0),
+            "p50_seg": ventana.percentil(50),
+            "p95_seg": ventana.percentil(95),
+        }
+
+    rutas = llamadas.get("ruteo", 0)
+    return {
+        "etapas": etapas,
+        "escalados": llamadas.get("escalado", 0),
+        "tasa_escalado": round(llamadas.get("escalado", 0) / rutas, 4) if rutas else None,
+        "motivos_escalado": motivos,
+        "charlas_con_etiqueta": descartadas,
+    }
@@ -0,0 +1,203 @@
+"""
+Snapshot columnar en memoria del catálogo de propiedades disponibles.
+
+Mantiene cada columna numérica como un arreglo de NumPy y resuelve las
+búsquedas multi-criterio con máscaras booleanas vectorizadas, sin ir a
+SQLite. El snapshot se reconstruye cuando cambia la versión del catálogo
+(`catalogo_meta.version`) y se reemplaza de forma atómica.
+
+NumPy es opcional: si no está instalado, `obtener_catalogo()` devuelve None
+y las tools usan la consulta SQL.
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dependencia opcional
+    np = None
+
+from config import Config
+from utils.database_helpers import get_db_connection, obtener_version_catalogo
+from utils.helpers import normalizar_valor
+
+
+CAMPOS_RESULTADO = ("id", "tipo", "ciudad", "zona", "precio", "dormitorios", "descripcion")
+
+
+class CatalogoColumnar:
+    """Snapshot inmutable de las propiedades disponibles en formato columnar"""
+
+    def __init__(self, version: int, filas: List[Dict[str, Any]]):
+        self.version = version
+        self.filas = [{campo: fila[campo] for campo in CAMPOS_RESULTADO} for fila in filas]
+
+        def columna(nombre):
+            # NULL -> NaN: cualquier comparación con NaN es falsa, igual que en SQL
+            return np.array(
+                [np.nan if fila[nombre] is None else fila[nombre] for fila in filas],
+                dtype=np.float64,
+            )
+
+        self.precio = columna("precio")
+        self.dormitorios = columna("dormitorios")
+        self.banos = columna("banos")
+        self.area_m2 = columna("area_m2")
+
+        # Índices precalculados por ciudad y tipo (claves normalizadas) y la
+        # columna de códigos equivalente para combinar ambos criterios
+        self.por_ciudad, self.codigo_ciudad = self._indexar([fila["ciudad_norm"] for fila in filas])
+        self.por_tipo, self.codigo_tipo = self._indexar([fila["tipo_norm"] for fila in filas])
+
+    def __len__(self):
+        return len(self.filas)
+
+    @staticmethod
+    def _indexar(valores: List[str]):
+        """Devuelve {clave: (código, filas)} y la columna de códigos por fila"""
+        claves: Dict[str, int] = {}
+        codigos = np.empty(len(valores), dtype=np.int32)
+        for i, valor in enumerate(valores):
+            codigos[i] = claves.setdefault(valor or "", len(claves))
+        indice = {
+            clave: (codigo, np.flatnonzero(codigos == codigo))
+            for clave, codigo in claves.items()
+        }
+        return indice, codigos
+
+    @classmethod
+    def desde_db(cls, version: int) -> "CatalogoColumnar":
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT id, tipo, ciudad, zona, precio, dormitorios, banos, area_m2, descripcion,
+                       ciudad_norm, tipo_norm
+                FROM propiedades
+                WHERE disponible = 1
+                ORDER BY id
+                """
+            )
+            filas = cursor.fetchall()
+        finally:
+            conn.close()
+        return cls(version, filas)
+
+    def buscar(
+        self,
+        tipo: Optional[str] = None,
+        ciudad: Optional[str] = None,
+        precio_min: Optional[float] = None,
+        precio_max: Optional[float] = None,
+        dormitorios_min: Optional[int] = None,
+        dormitorios_max: Optional[int] = None,
+        banos_min: Optional[int] = None,
+        banos_max: Optional[int] = None,
+        area_min: Optional[float] = None,
+        area_max: Optional[float] = None,
+        limite: Optional[int] = 20,
+    ) -> List[Dict[str, Any]]:
+        """
+        Filtra el snapshot y devuelve las propiedades más baratas que cumplen
+        todos los criterios (hasta `limite`).
+
+        `tipo` y `ciudad` se comparan por igualdad con las claves normalizadas
+        (ver `normalizar_filtro` en utils/database_helpers.py).
+        """
+        categoricos = []
+        for valor, indice, codigos in (
+            (ciudad, self.por_ciudad, self.codigo_ciudad),
+            (tipo, self.por_tipo, self.codigo_tipo),
+        ):
+            if valor:
+                entrada = indice.get(normalizar_valor(valor))
+                if entrada is None:
+                    return []
+                categoricos.append((entrada, codigos))
+
+        # El criterio categórico más selectivo define los candidatos; el resto
+        # se aplica como máscara sobre la columna de códigos
+        if categoricos:
+            categoricos.sort(key=lambda c: len(c[0][1]))
+            candidatos = categoricos[0][0][1]
+        else:
+            candidatos = np.arange(len(self.filas))
+
+        mascara = np.ones(len(candidatos), dtype=bool)
+        for (codigo, _), codigos in categoricos[1:]:
+            mascara &= codigos[candidatos] == codigo
+
+        rangos = (
+            (self.precio, precio_min, precio_max),
+            (self.dormitorios, dormitorios_min, dormitorios_max),
+            (self.banos, banos_min, banos_max),
+            (self.area_m2, area_min, area_max),
+        )
+        for columna, minimo, maximo in rangos:
+            if minimo is None and maximo is None:
+                continue
+            valores = columna[candidatos]
+            if minimo is not None:
+                mascara &= valores >= minimo
+            if maximo is not None:
+                mascara &= valores <= maximo
+
+        candidatos = candidatos[mascara]
+        precios = self.precio[candidatos]
+
+        # Top-k por precio: argpartition O(n) y luego ordenar solo los k elegidos
+        if limite and 0 < limite < len(candidatos):
+            parcial = np.argpartition(precios, limite - 1)[:limite]
+            candidatos = candidatos[parcial]
+            precios = precios[parcial]
+        candidatos = candidatos[np.argsort(precios, kind="stable")]
+
+        return [dict(self.filas[i]) for i in candidatos]
+
+
+# ===== SNAPSHOT COMPARTIDO DEL PROCESO =====
+
+_catalogo: Optional[CatalogoColumnar] = None
+_ultima_verificacion = 0.0
+_lock = threading.Lock()
+
+
+def obtener_catalogo() -> Optional[CatalogoColumnar]:
+    """
+    Devuelve el snapshot vigente, reconstruyéndolo si cambió la versión del
+    catálogo. La versión se consulta como mucho una vez cada
+    `Config.CATALOGO_REFRESCO_SEG` segundos.
+
+    Returns:
+        El snapshot, o None si NumPy no está disponible o está desactivado
+    """
+    global _catalogo, _ultima_verificacion
+
+    if np is None or not Config.CATALOGO_EN_MEMORIA:
+        return None
+
+    actual = _catalogo
+    if actual is not None and time.monotonic() - _ultima_verificacion < Config.CATALOGO_REFRESCO_SEG:
+        return actual
+
+    # Un solo hilo reconstruye; el resto sigue usando el snapshot anterior
+    if not _lock.acquire(blocking=actual is None):
+        return actual
+    try:
+        version = obtener_version_catalogo()
+        if _catalogo is None or _catalogo.version != version:
+            # Reemplazo atómico: los lectores ven el snapshot viejo o el nuevo
+            _catalogo = CatalogoColumnar.desde_db(version)
+        _ultima_verificacion = time.monotonic()
+        return _catalogo
+    finally:
+        _lock.release()
+
+
+def invalidar_catalogo():
+    """Fuerza la verificación de versión en la próxima búsqueda"""
+    global _ultima_verificacion
+    _ultima_verificacion = 0.0
@@ -0,0 +1,158 @@
+"""
+Chat por lotes: responde muchas preguntas con un pool de workers acotado.
+
+Los resultados se emiten a medida que terminan, uno por línea (NDJSON), con
+el índice del mensaje en la entrada. Las preguntas idénticas dentro del lote
+(mismo texto normalizado, usuario y conversación) se procesan una sola vez.
+
+Uso:
+    python -m utils.chat_lote preguntas.ndjson --workers 4 > respuestas.ndjson
+
+Cada línea de la entrada puede ser un objeto {"message", "usuario_id",
+"conversacion_id"}, una cadena JSON o texto plano.
+"""
+
+import argparse
+import contextvars
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def normalizar_items(mensajes: Iterable[Any], usuario_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Convierte cadenas u objetos en payloads de chat; aplica el usuario por defecto"""
+    items = []
+    for mensaje in mensajes:
+        item = dict(mensaje) if isinstance(mensaje, dict) else {"message": mensaje}
+        if usuario_id is not None:
+            item.setdefault("usuario_id", usuario_id)
+        items.append(item)
+    return items
+
+
+def _clave(item: Dict[str, Any]) -> str:
+    mensaje = item.get("message")
+    if isinstance(mensaje, str):
+        mensaje = " ".join(mensaje.lower().split())
+    return json.dumps(
+        [mensaje, item.get("usuario_id"), item.get("conversacion_id")],
+        ensure_ascii=False,
+        default=str,
+    )
+
+
+def _procesar_seguro(procesar, item, cancelacion) -> Tuple[Dict[str, Any], int]:
+    try:
+        return procesar(item, cancelacion)
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+
+def procesar_lote(
+    items: List[Dict[str, Any]],
+    procesar: Callable[[Dict[str, Any], threading.Event], Tuple[Dict[str, Any], int]],
+    workers: int = 4,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Procesa los items en paralelo y emite cada resultado al terminar.
+
+    Args:
+        items: Payloads de chat (ver `normalizar_items`)
+        procesar: Función que procesa un payload y devuelve (respuesta, status);
+            recibe además un evento que se activa si se abandona el lote
+        workers: Máximo de mensajes en proceso a la vez
+
+    Yields:
+        {"indice", "status", "resultado"} por cada item (los duplicados
+        reciben el mismo resultado, con "duplicado_de"), y al final
+        {"resumen": {...}}
+    """
+    grupos: Dict[str, List[int]] = {}
+    for indice, item in enumerate(items):
+        grupos.setdefault(_clave(item), []).append(indice)
+
+    inicio = time.monotonic()
+    errores = 0
+    cancelacion = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="lote")
+    try:
+        futuros = {
+            # copy_context: los logs de cada mensaje conservan el request_id del lote
+            executor.submit(
+                contextvars.copy_context().run, _procesar_seguro, procesar, items[indices[0]], cancelacion
+            ): indices
+            for indices in grupos.values()
+        }
+        for futuro in as_completed(futuros):
+            resultado, status = futuro.result()
+            indices = futuros[futuro]
+            if status >= 400:
+                errores += len(indices)
+            for indice in indices:
+                linea = {"indice": indice, "status": status, "resultado": resultado}
+                if indice != indices[0]:
+                    linea["duplicado_de"] = indices[0]
+                yield linea
+    finally:
+        # Si el cliente se desconecta, no empezar los mensajes pendientes y
+        # cancelar las tools en curso
+        cancelacion.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    yield {
+        "resumen": {
+            "mensajes": len(items),
+            "unicos": len(grupos),
+            "errores": errores,
+            "segundos": round(time.monotonic() - inicio, 3),
+        }
+    }
+
+
+def _leer_entrada(lineas: Iterable[str]) -> List[Any]:
+    mensajes = []
+    for linea in lineas:
+        linea = linea.strip()
+        if not linea:
+            continue
+        try:
+            mensajes.append(json.loads(linea))
+        except ValueError:
+            mensajes.append(linea)
+    return mensajes
+
+
+def main(argv: Optional[List[str]] = None):
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Responde un lote de preguntas con el chatbot")
+    parser.add_argument("archivo", help="NDJSON o texto plano, una pregunta por línea ('-' = stdin)")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=Config.CHAT_LOTE_WORKERS,
+        help=f"Mensajes en paralelo (por defecto {Config.CHAT_LOTE_WORKERS})",
+    )
+    parser.add_argument("--usuario", type=int, help="usuario_id para los mensajes que no lo indiquen")
+    args = parser.parse_args(argv)
+
+    if args.archivo == "-":
+        mensajes = _leer_entrada(sys.stdin)
+    else:
+        with open(args.archivo, encoding="utf-8") as f:
+            mensajes = _leer_entrada(f)
+
+    # Importar app carga las tools y migra el esquema (el monitor no arranca)
+    from app import procesar_chat
+
+    items = normalizar_items(mensajes, args.usuario)
+    for linea in procesar_lote(items, procesar_chat, args.workers):
+        sys.stdout.write(json.dumps(linea, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,183 @@
+import os
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timezone
 from typing import Optional, List, Dict, Any
 
+from config import Config
+from utils.cache_conversaciones import MensajeReciente, obtener_cache_conversaciones
+from utils.helpers import normalizar_valor
+
 
 DB_PATH = "data/propiedades.db"
 
+# Base de datos con las conversaciones inactivas (ver utils/archivar_conversaciones.py)
+ARCHIVO_DB_PATH = "data/archivo.db"
+
+COLUMNAS_CONVERSACIONES = "id, usuario_id, titulo, fecha_creacion, fecha_actualizacion"
+COLUMNAS_MENSAJES = "id, conversacion_id, rol, contenido, fecha_creacion"
+
+CAMPOS_USO = (
+    "etapa", "modelo", "tool", "tokens_prompt", "tokens_generados",
+    "ms_carga", "ms_prompt", "ms_generacion", "ms_total",
+)
+COLUMNAS_USO = ", ".join(CAMPOS_USO)
+
+
+def get_db_connection(adjuntar_archivo: bool = False):
+    """
+    Obtiene una conexión a la base de datos.
 
-def get_db_connection():
-    """Obtiene una conexión a la base de datos"""
+    Args:
+        adjuntar_archivo: Si True, adjunta la base de archivo como esquema `archivo`
+    """
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row  # Para obtener resultados como diccionarios
+    if adjuntar_archivo:
+        adjuntar_base_archivo(conn)
     return conn
 
 
+def adjuntar_base_archivo(conn, ruta: Optional[str] = None):
+    """Adjunta la base de archivo como `archivo` y crea sus tablas si no existen"""
+    conn.execute("ATTACH DATABASE ? AS archivo", (ruta or ARCHIVO_DB_PATH,))
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS archivo.conversaciones (
+            id INTEGER PRIMARY KEY,
+            usuario_id INTEGER NOT NULL,
+            titulo TEXT,
+            fecha_creacion TIMESTAMP,
+            fecha_actualizacion TIMESTAMP
+        )
+    """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS archivo.mensajes (
+            id INTEGER PRIMARY KEY,
+            conversacion_id INTEGER NOT NULL,
+            rol TEXT NOT NULL,
+            contenido TEXT NOT NULL,
+            fecha_creacion TIMESTAMP
+        )
+    """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS archivo.idx_conversaciones_usuario ON conversaciones(usuario_id)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS archivo.idx_mensajes_conversacion ON mensajes(conversacion_id)"
+    )
+
+
+def obtener_version_catalogo() -> int:
+    """
+    Devuelve la versión actual del catálogo de propiedades.
+
+    La versión la incrementan los triggers de `propiedades` en cada escritura,
+    así que sirve para invalidar snapshots y cachés derivados del catálogo.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        result = conn.execute("SELECT version FROM catalogo_meta WHERE id = 1").fetchone()
+    finally:
+        conn.close()
+    return result[0] if result else 0
+
+
+# ===== SINÓNIMOS DE BÚSQUEDA =====
+
+# Sinónimos y valores existentes de ciudad/tipo, ligados a (base, versión del
+# catálogo). La versión se consulta como mucho cada Config.CATALOGO_REFRESCO_SEG;
+# los triggers de `sinonimos_busqueda` también la incrementan.
+_claves: Optional[Dict[str, Any]] = None
+_claves_verificadas = 0.0
+_claves_lock = threading.Lock()
+
+
+def recargar_sinonimos():
+    """Descarta los sinónimos en memoria; se vuelven a leer en el próximo uso"""
+    global _claves
+    with _claves_lock:
+        _claves = None
+
+
+def _leer_claves(origen) -> Dict[str, Any]:
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        sinonimos = conn.execute("SELECT campo, alias, canonico FROM sinonimos_busqueda").fetchall()
+        valores = {
+            campo: {
+                valor
+                for (valor,) in conn.execute(
+                    f"SELECT DISTINCT {campo}_norm FROM propiedades WHERE disponible = 1"
+                )
+                if valor
+            }
+            for campo in ("ciudad", "tipo")
+        }
+    except sqlite3.OperationalError:
+        sinonimos, valores = [], {"ciudad": set(), "tipo": set()}  # esquema sin migrar
+    finally:
+        conn.close()
+    return {
+        "origen": origen,
+        "sinonimos": {(campo, alias): canonico for campo, alias, canonico in sinonimos},
+        "valores": valores,
+    }
+
+
+def _cargar_claves() -> Dict[str, Any]:
+    global _claves, _claves_verificadas
+    with _claves_lock:
+        ahora = time.monotonic()
+        if (
+            _claves is None
+            or _claves["origen"][0] != DB_PATH
+            or ahora - _claves_verificadas >= Config.CATALOGO_REFRESCO_SEG
+        ):
+            try:
+                origen = (DB_PATH, obtener_version_catalogo())
+            except sqlite3.OperationalError:
+                origen = (DB_PATH, None)
+            _claves_verificadas = ahora
+            if _claves is None or _claves["origen"] != origen:
+                _claves = _leer_claves(origen)
+        return _claves
+
+
+def _coincide_por_palabras(clave: str, valor: str) -> bool:
+    return f"_{valor}_".find(f"_{clave}_") >= 0
+
+
+def normalizar_filtro(campo: str, valor: Optional[str]) -> Optional[str]:
+    """
+    Normaliza un filtro de búsqueda ('ciudad' o 'tipo') a su clave canónica.
+
+    Aplica la misma normalización que `ciudad_norm`/`tipo_norm` y luego la
+    tabla de sinónimos, p. ej. 'Depto' -> 'departamento', 'SCZ' -> 'santa_cruz'.
+    Si la clave no existe en el catálogo pero son palabras completas de un
+    único valor existente, se usa ese valor ('Santa' -> 'santa_cruz'); si
+    coincide con varios, no se adivina y la búsqueda no devuelve nada.
+
+    Returns:
+        La clave normalizada, o None si el valor está vacío
+    """
+    clave = normalizar_valor(valor)
+    if not clave:
+        return None
+    claves = _cargar_claves()
+    clave = claves["sinonimos"].get((campo, clave), clave)
+    existentes = claves["valores"].get(campo, set())
+    if clave not in existentes:
+        candidatos = [v for v in existentes if _coincide_por_palabras(clave, v)]
+        if len(candidatos) == 1:
+            return candidatos[0]
+    return clave
+
+
 # ===== FUNCIONES DE USUARIOS =====
 
 
@@ -27,6 +192,12 @@ def obtener_o_crear_usuario(nombre: str = "Usuario Demo", email: str = "demo@exa
     Returns:
         ID del usuario
     """
+    # Las claves de la caché incluyen la ruta de la base (el replay usa una copia)
+    cache = obtener_cache_conversaciones()
+    usuario_id = cache.usuario((DB_PATH, email))
+    if usuario_id is not None:
+        return usuario_id
+
     conn = get_db_connection()
     cursor = conn.cursor()
 
@@ -46,6 +217,7 @@ def obtener_o_crear_usuario(nombre: str = "Usuario Demo", email: str = "demo@exa
         conn.commit()
 
     conn.close()
+    cache.guardar_usuario((DB_PATH, email), usuario_id)
     return usuario_id
 
 
@@ -89,46 +261,84 @@ def crear_conversacion(usuario_id: int, titulo: Optional[str] = None) -> int:
     conn.commit()
     conn.close()
 
+    obtener_cache_conversaciones().iniciar((DB_PATH, conversacion_id))
     return conversacion_id
 
 
-def obtener_conversacion(conversacion_id: int) -> Optional[Dict[str, Any]]:
-    """Obtiene información de una conversación por ID"""
-    conn = get_db_connection()
+def obtener_conversacion(
+    conversacion_id: int,
+    incluir_archivo: bool = False
+) -> Optional[Dict[str, Any]]:
+    """
+    Obtiene información de una conversación por ID.
+
+    Si incluir_archivo es True y no está en la base principal, la busca en el
+    archivo; en ese caso el resultado incluye "archivada": True.
+    """
+    conn = get_db_connection(adjuntar_archivo=incluir_archivo)
     cursor = conn.cursor()
 
-    cursor.execute("SELECT * FROM conversaciones WHERE id = ?", (conversacion_id,))
+    cursor.execute("SELECT * FROM main.conversaciones WHERE id = ?", (conversacion_id,))
     result = cursor.fetchone()
+    archivada = False
+
+    if result is None and incluir_archivo:
+        cursor.execute("SELECT * FROM archivo.conversaciones WHERE id = ?", (conversacion_id,))
+        result = cursor.fetchone()
+        archivada = result is not None
+
     conn.close()
 
     if result:
-        return dict(result)
+        conversacion = dict(result)
+        if archivada:
+            conversacion["archivada"] = True
+        return conversacion
     return None
 
 
-def listar_conversaciones_usuario(usuario_id: int, limite: int = 50) -> List[Dict[str, Any]]:
+def listar_conversaciones_usuario(
+    usuario_id: int,
+    limite: int = 50,
+    incluir_archivo: bool = False
+) -> List[Dict[str, Any]]:
     """
     Lista las conversaciones de un usuario ordenadas por fecha de actualización.
 
     Args:
         usuario_id: ID del usuario
         limite: Número máximo de conversaciones a devolver
+        incluir_archivo: Si True, incluye también las conversaciones archivadas
 
     Returns:
         Lista de conversaciones
     """
-    conn = get_db_connection()
+    conn = get_db_connection(adjuntar_archivo=incluir_archivo)
     cursor = conn.cursor()
 
-    cursor.execute(
-        """
-        SELECT * FROM conversaciones
-        WHERE usuario_id = ?
-        ORDER BY fecha_actualizacion DESC
-        LIMIT ?
-        """,
-        (usuario_id, limite)
-    )
+    if incluir_archivo:
+        cursor.execute(
+            f"""
+            SELECT {COLUMNAS_CONVERSACIONES}, 0 AS archivada FROM main.conversaciones
+            WHERE usuario_id = ?
+            UNION ALL
+            SELECT {COLUMNAS_CONVERSACIONES}, 1 AS archivada FROM archivo.conversaciones
+            WHERE usuario_id = ?
+            ORDER BY fecha_actualizacion DESC
+            LIMIT ?
+            """,
+            (usuario_id, usuario_id, limite)
+        )
+    else:
+        cursor.execute(
+            """
+            SELECT * FROM conversaciones
+            WHERE usuario_id = ?
+            ORDER BY fecha_actualizacion DESC
+            LIMIT ?
+            """,
+            (usuario_id, limite)
+        )
     results = cursor.fetchall()
     conn.close()
 
@@ -166,11 +376,83 @@ def actualizar_titulo_conversacion(conversacion_id: int, titulo: str):
 # ===== FUNCIONES DE MENSAJES =====
 
 
+def restaurar_conversacion_archivada(conn, conversacion_id: int) -> bool:
+    """
+    Devuelve una conversación archivada (con sus mensajes) a la base principal.
+
+    Una conversación vive completa en una sola base: antes de agregarle un
+    mensaje hay que traerla de vuelta del archivo. No hace commit; se confirma
+    junto con la escritura que lo motivó.
+
+    Returns:
+        True si estaba archivada y se restauró
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM main.conversaciones WHERE id = ?", (conversacion_id,))
+    if cursor.fetchone() or not os.path.exists(ARCHIVO_DB_PATH):
+        return False
+
+    adjuntar_base_archivo(conn)
+    cursor.execute(
+        f"""
+        INSERT INTO main.conversaciones ({COLUMNAS_CONVERSACIONES})
+        SELECT {COLUMNAS_CONVERSACIONES} FROM archivo.conversaciones WHERE id = ?
+        """,
+        (conversacion_id,)
+    )
+    if cursor.rowcount == 0:
+        return False
+    cursor.execute(
+        f"""
+        INSERT INTO main.mensajes ({COLUMNAS_MENSAJES})
+        SELECT {COLUMNAS_MENSAJES} FROM archivo.mensajes WHERE conversacion_id = ?
+        """,
+        (conversacion_id,)
+    )
+    cursor.execute("DELETE FROM archivo.mensajes WHERE conversacion_id = ?", (conversacion_id,))
+    cursor.execute("DELETE FROM archivo.conversaciones WHERE id = ?", (conversacion_id,))
+    return True
+
+
+def registrar_uso_llm(conversacion_id: int, uso: List[Dict[str, Any]]) -> List[int]:
+    """
+    Guarda en `uso_llm` el consumo de llamadas al modelo, sin mensaje asociado.
+
+    Se llama en cuanto vuelve cada llamada, así el consumo queda registrado
+    aunque el turno termine sin respuesta (tool fallida, plazo agotado...).
+    `guardar_mensaje(..., uso_ids=...)` lo liga después al mensaje.
+
+    Args:
+        conversacion_id: ID de la conversación
+        uso: Registros de `extraer_uso` (utils/llm.py)
+
+    Returns:
+        IDs de las filas creadas
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    ids = []
+    for u in uso:
+        cursor.execute(
+            f"""
+            INSERT INTO uso_llm (conversacion_id, usuario_id, {COLUMNAS_USO})
+            VALUES (?, (SELECT usuario_id FROM conversaciones WHERE id = ?),
+                    {", ".join("?" for _ in CAMPOS_USO)})
+            """,
+            (conversacion_id, conversacion_id, *(u.get(c) for c in CAMPOS_USO))
+        )
+        ids.append(cursor.lastrowid)
+    conn.commit()
+    conn.close()
+    return ids
+
+
 def guardar_mensaje(
     conversacion_id: int,
     rol: str,
     contenido: str,
-    actualizar_conversacion: bool = True
+    actualizar_conversacion: bool = True,
+    uso_ids: Optional[List[int]] = None
 ) -> int:
     """
     Guarda un mensaje en la base de datos.
@@ -180,6 +462,8 @@ def guardar_mensaje(
         rol: Rol del mensaje ('usuario', 'asistente', 'sistema')
         contenido: Contenido del mensaje
         actualizar_conversacion: Si True, actualiza la fecha de la conversación
+        uso_ids: Filas de `uso_llm` (ver `registrar_uso_llm`) de las llamadas
+            al modelo que produjeron el mensaje; se ligan a él
 
     Returns:
         ID del mensaje creado
@@ -187,15 +471,28 @@ def guardar_mensaje(
     if rol not in ['usuario', 'asistente', 'sistema']:
         raise ValueError(f"Rol inválido: {rol}. Debe ser 'usuario', 'asistente' o 'sistema'")
 
+    # Mismo formato que CURRENT_TIMESTAMP; se fija aquí para que la caché y la base coincidan
+    fecha_creacion = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
     conn = get_db_connection()
     cursor = conn.cursor()
 
+    if restaurar_conversacion_archivada(conn, conversacion_id):
+        # La ventana en caché (si la hay) no incluye el historial restaurado
+        obtener_cache_conversaciones().descartar((DB_PATH, conversacion_id))
+
     cursor.execute(
-        "INSERT INTO mensajes (conversacion_id, rol, contenido) VALUES (?, ?, ?)",
-        (conversacion_id, rol, contenido)
+        "INSERT INTO main.mensajes (conversacion_id, rol, contenido, fecha_creacion) VALUES (?, ?, ?, ?)",
+        (conversacion_id, rol, contenido, fecha_creacion)
     )
     mensaje_id = cursor.lastrowid
 
+    if uso_ids:
+        cursor.executemany(
+            "UPDATE uso_llm SET mensaje_id = ? WHERE id = ?",
+            [(mensaje_id, uso_id) for uso_id in uso_ids]
+        )
+
     if actualizar_conversacion:
         cursor.execute(
             "UPDATE conversaciones SET fecha_actualizacion = CURRENT_TIMESTAMP WHERE id = ?",
@@ -205,12 +502,17 @@ def guardar_mensaje(
     conn.commit()
     conn.close()
 
+    obtener_cache_conversaciones().agregar(
+        (DB_PATH, conversacion_id),
+        MensajeReciente(mensaje_id, conversacion_id, rol, contenido, fecha_creacion)
+    )
     return mensaje_id
 
 
 def obtener_mensajes_conversacion(
     conversacion_id: int,
-    limite: Optional[int] = None
+    limite: Optional[int] = None,
+    incluir_archivo: bool = False
 ) -> List[Dict[str, Any]]:
     """
     Obtiene todos los mensajes de una conversación ordenados por fecha.
@@ -218,51 +520,153 @@ def obtener_mensajes_conversacion(
     Args:
         conversacion_id: ID de la conversación
         limite: Límite opcional de mensajes a devolver (los más recientes)
+        incluir_archivo: Si True y la conversación no tiene mensajes en la base
+            principal, los busca en el archivo
 
     Returns:
         Lista de mensajes
     """
-    conn = get_db_connection()
+    # Las conversaciones activas suelen estar en la caché (solo la base principal)
+    cache = obtener_cache_conversaciones()
+    cacheados = cache.mensajes((DB_PATH, conversacion_id), limite)
+
+    conn = get_db_connection(adjuntar_archivo=incluir_archivo)
     cursor = conn.cursor()
 
-    if limite:
+    if cacheados is not None:
+        # Otro worker pudo escribir en la conversación: la ventana sirve si
+        # termina en el último mensaje y, si se da por completa, los tiene todos
         cursor.execute(
-            """
-            SELECT * FROM mensajes
-            WHERE conversacion_id = ?
-            ORDER BY fecha_creacion DESC
-            LIMIT ?
-            """,
-            (conversacion_id, limite)
-        )
-        # Invertir para tener orden cronológico
-        results = cursor.fetchall()[::-1]
-    else:
-        cursor.execute(
-            """
-            SELECT * FROM mensajes
-            WHERE conversacion_id = ?
-            ORDER BY fecha_creacion ASC
-            """,
+            "SELECT COUNT(*), MAX(id) FROM main.mensajes WHERE conversacion_id = ?",
             (conversacion_id,)
         )
-        results = cursor.fetchall()
+        total, ultimo = cursor.fetchone()
+        ultimo_cacheado = cacheados[-1]["id"] if cacheados else None
+        completa = not limite or len(cacheados) < limite
+        if ultimo == ultimo_cacheado and (not completa or total == len(cacheados)):
+            conn.close()
+            return cacheados
+        cache.descartar((DB_PATH, conversacion_id))
+
+    # Una conversación vive completa en la base principal o en el archivo
+    esquemas = ["main", "archivo"] if incluir_archivo else ["main"]
+    results = []
+    for esquema in esquemas:
+        if limite:
+            cursor.execute(
+                f"""
+                SELECT * FROM {esquema}.mensajes
+                WHERE conversacion_id = ?
+                ORDER BY fecha_creacion DESC, id DESC
+                LIMIT ?
+                """,
+                (conversacion_id, limite)
+            )
+            # Invertir para tener orden cronológico
+            results = cursor.fetchall()[::-1]
+        else:
+            cursor.execute(
+                f"""
+                SELECT * FROM {esquema}.mensajes
+                WHERE conversacion_id = ?
+                ORDER BY fecha_creacion ASC, id ASC
+                """,
+                (conversacion_id,)
+            )
+            results = cursor.fetchall()
+        if results:
+            if esquema == "main":
+                cache.cargar(
+                    (DB_PATH, conversacion_id),
+                    results,
+                    completa=not limite or len(results) < limite
+                )
+            break
 
     conn.close()
 
     return [dict(row) for row in results]
 
 
-def contar_mensajes_conversacion(conversacion_id: int) -> int:
-    """Cuenta el número de mensajes en una conversación"""
+# ===== FUNCIONES DE USO DEL MODELO =====
+
+
+def resumen_uso_llm(
+    usuario_id: Optional[int] = None,
+    dias: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Agrega el consumo registrado en `uso_llm`.
+
+    Args:
+        usuario_id: Limitar a un usuario (None = todos)
+        dias: Limitar a los últimos N días (None = todo el historial)
+
+    Returns:
+        Totales, y desgloses por usuario, por tool y por etapa, ordenados de
+        mayor a menor tiempo total
+    """
+    condiciones, params = [], []
+    if usuario_id is not None:
+        condiciones.append("usuario_id = ?")
+        params.append(usuario_id)
+    if dias is not None:
+        condiciones.append("fecha_creacion >= datetime('now', ?)")
+        params.append(f"-{int(dias)} days")
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+
+    agregados = """
+        COUNT(*) AS llamadas,
+        COUNT(DISTINCT mensaje_id) AS mensajes,
+        COALESCE(SUM(tokens_prompt), 0) AS tokens_prompt,
+        COALESCE(SUM(tokens_generados), 0) AS tokens_generados,
+        ROUND(COALESCE(SUM(ms_prompt), 0), 1) AS ms_prompt,
+        ROUND(COALESCE(SUM(ms_generacion), 0), 1) AS ms_generacion,
+        ROUND(COALESCE(SUM(ms_total), 0), 1) AS ms_total
+    """
+
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    cursor.execute(
-        "SELECT COUNT(*) FROM mensajes WHERE conversacion_id = ?",
-        (conversacion_id,)
-    )
-    count = cursor.fetchone()[0]
+    cursor.execute(f"SELECT {agregados} FROM uso_llm {where}", params)
+    resumen: Dict[str, Any] = {"total": dict(cursor.fetchone())}
+
+    for clave, columna in (("por_usuario", "usuario_id"), ("por_tool", "tool"), ("por_etapa", "etapa")):
+        cursor.execute(
+            f"""
+            SELECT {columna}, {agregados} FROM uso_llm {where}
+            GROUP BY {columna}
+            ORDER BY ms_total DESC
+            """,
+            params
+        )
+        resumen[clave] = [dict(row) for row in cursor.fetchall()]
+
+    conn.close()
+
+    return resumen
+
+
+def contar_mensajes_conversacion(conversacion_id: int, incluir_archivo: bool = False) -> int:
+    """
+    Cuenta el número de mensajes en una conversación.
+
+    Args:
+        incluir_archivo: Si True y no tiene mensajes en la base principal, los
+            cuenta en el archivo
+    """
+    conn = get_db_connection(adjuntar_archivo=incluir_archivo)
+    cursor = conn.cursor()
+
+    count = 0
+    for esquema in ["main", "archivo"] if incluir_archivo else ["main"]:
+        cursor.execute(
+            f"SELECT COUNT(*) FROM {esquema}.mensajes WHERE conversacion_id = ?",
+            (conversacion_id,)
+        )
+        count = cursor.fetchone()[0]
+        if count:
+            break
     conn.close()
 
     return count
@@ -270,12 +674,19 @@ def contar_mensajes_conversacion(conversacion_id: int) -> int:
 
 def eliminar_conversacion(conversacion_id: int):
     """
-    Elimina una conversación y todos sus mensajes (CASCADE).
+    Elimina una conversación y todos sus mensajes, también si está archivada.
     """
-    conn = get_db_connection()
+    archivada = os.path.exists(ARCHIVO_DB_PATH)
+    conn = get_db_connection(adjuntar_archivo=archivada)
     cursor = conn.cursor()
 
-    cursor.execute("DELETE FROM conversaciones WHERE id = ?", (conversacion_id,))
+    # Sin PRAGMA foreign_keys el CASCADE no se aplica: se borran explícitamente
+    esquemas = ["main", "archivo"] if archivada else ["main"]
+    for esquema in esquemas:
+        cursor.execute(f"DELETE FROM {esquema}.mensajes WHERE conversacion_id = ?", (conversacion_id,))
+        cursor.execute(f"DELETE FROM {esquema}.conversaciones WHERE id = ?", (conversacion_id,))
 
     conn.commit()
     conn.close()
+
+    obtener_cache_conversaciones().descartar((DB_PATH, conversacion_id))
@@ -0,0 +1,232 @@
+"""
+Motor de ejecución de tools fuera del hilo de la petición.
+
+Cada tool se registra con sus límites:
+    timeout          segundos máximos por llamada (acotado por el deadline de la petición)
+    max_concurrencia llamadas simultáneas de esa tool en el proceso
+    en_proceso       ejecutar en el pool de procesos (tools de CPU intensivo);
+                     si Config.TOOL_PROCESOS es 0 se usa el pool de hilos
+
+Las tools lanzan excepciones en vez de devolver {"error": ...}; el motor las
+reporta con excepciones tipadas (subclases de ToolError) y lleva métricas por
+tool. Una excepción con atributo `status` (p. ej. IndiceNoDisponible) fija el
+código HTTP de su ToolFallo.
+
+El pool de procesos usa el contexto "spawn": cuando se crea ya corren hilos
+(logging, monitor del modelo) y hacer fork con hilos activos puede dejar locks
+tomados en el proceso hijo.
+"""
+
+import contextvars
+import importlib
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FuturoTimeout
+from typing import Any, Dict, List, Optional
+
+from config import Config
+from utils.helpers import resolver_tool
+from utils.resiliencia import Deadline, VentanaLatencias
+
+
+class ToolError(Exception):
+    """Error al ejecutar una tool"""
+
+    status = 500
+
+    def __init__(self, tool: str, mensaje: str):
+        super().__init__(f"Tool '{tool}': {mensaje}")
+        self.tool = tool
+        self.mensaje = mensaje
+
+
+class ToolNoEncontrada(ToolError):
+    """El nombre no corresponde a ninguna tool registrada"""
+
+
+class ToolTimeout(ToolError):
+    """La tool no terminó dentro de su timeout o del deadline de la petición"""
+
+    status = 504
+
+
+class ToolSaturada(ToolError):
+    """La tool alcanzó su límite de concurrencia"""
+
+    status = 503
+
+
+class ToolCancelada(ToolError):
+    """La petición se canceló (p. ej. el cliente se desconectó)"""
+
+    status = 499
+
+
+class ToolFallo(ToolError):
+    """La tool lanzó una excepción"""
+
+    def __init__(self, tool: str, error: BaseException):
+        super().__init__(tool, f"{type(error).__name__}: {error}")
+        self.error = error
+        self.status = getattr(error, "status", ToolError.status)
+
+
+def _invocar_en_proceso(modulo: str, nombre: str, params: Dict[str, Any]):
+    # Los objetos tool no siempre se pueden serializar: se importan en el proceso hijo
+    return getattr(importlib.import_module(modulo), nombre).invoke(params)
+
+
+class _Registro:
+    __slots__ = ("tool", "timeout", "semaforo", "en_proceso", "latencias", "contadores")
+
+    def __init__(self, tool, timeout, max_concurrencia, en_proceso):
+        self.tool = tool
+        self.timeout = timeout
+        self.semaforo = threading.BoundedSemaphore(max_concurrencia) if max_concurrencia else None
+        self.en_proceso = en_proceso
+        self.latencias = VentanaLatencias()
+        self.contadores = {"llamadas": 0, "errores": 0, "timeouts": 0, "rechazadas": 0, "canceladas": 0}
+
+
+class EjecutorTools:
+    """Registro de tools con sus límites y ejecución en pools de hilos/procesos"""
+
+    # Cada cuánto se revisa la señal de cancelación mientras corre una tool
+    INTERVALO_CANCELACION = 0.05
+
+    def __init__(self, hilos: Optional[int] = None, procesos: Optional[int] = None):
+        self._registros: Dict[str, _Registro] = {}
+        self._lock = threading.Lock()
+        self._hilos = ThreadPoolExecutor(
+            max_workers=hilos or Config.TOOL_HILOS, thread_name_prefix="tool"
+        )
+        procesos = Config.TOOL_PROCESOS if procesos is None else procesos
+        self._procesos = (
+            ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context("spawn"))
+            if procesos
+            else None
+        )
+
+    @property
+    def tools(self):
+        return [registro.tool for registro in self._registros.values()]
+
+    def registrar(
+        self,
+        tool,
+        timeout: Optional[float] = None,
+        max_concurrencia: Optional[int] = None,
+        en_proceso: bool = False,
+    ):
+        """
+        Registra una tool con sus límites.
+
+        Args:
+            tool: Tool de LangChain (o cualquier objeto con `name` e `invoke`)
+            timeout: Segundos máximos por llamada (por defecto Config.TOOL_TIMEOUT_SEG)
+            max_concurrencia: Llamadas simultáneas permitidas (None = sin límite)
+            en_proceso: Ejecutar en el pool de procesos si está habilitado
+        """
+        self._registros[tool.name] = _Registro(
+            tool, timeout or Config.TOOL_TIMEOUT_SEG, max_concurrencia, en_proceso
+        )
+        return tool
+
+    def _contar(self, registro: _Registro, evento: str):
+        with self._lock:
+            registro.contadores[evento] += 1
+
+    def _enviar(self, registro: _Registro, params: Dict[str, Any]):
+        tool = registro.tool
+        if registro.en_proceso and self._procesos is not None:
+            # El módulo donde se definió la función decorada con @tool
+            modulo = getattr(getattr(tool, "func", None), "__module__", None) or tool.__module__
+            return self._procesos.submit(_invocar_en_proceso, modulo, tool.name, params)
+        # copy_context: los logs de la tool conservan el request_id de la petición
+        return self._hilos.submit(contextvars.copy_context().run, tool.invoke, params)
+
+    def ejecutar(
+        self,
+        tool_spec,
+        deadline: Optional[Deadline] = None,
+        cancelacion: Optional[threading.Event] = None,
+        tools: Optional[List[Any]] = None,
+    ):
+        """
+        Ejecuta una tool por nombre o spec {'name', 'params'}.
+
+        Args:
+            tool_spec: Nombre o spec devuelto por detectar_tool_en_respuesta
+            deadline: Plazo de la petición; acota el timeout de la tool
+            cancelacion: Evento que, al activarse, cancela la espera
+            tools: Restringe la búsqueda a estas tools (por defecto, todas las registradas)
+
+        Raises:
+            ToolNoEncontrada, ToolSaturada, ToolTimeout, ToolCancelada, ToolFallo
+        """
+        if isinstance(tool_spec, dict):
+            nombre, params = tool_spec.get("name"), tool_spec.get("params") or {}
+        else:
+            nombre, params = tool_spec, {}
+
+        tool = resolver_tool(nombre, self.tools if tools is None else tools)
+        if tool is None or tool.name not in self._registros:
+            raise ToolNoEncontrada(str(nombre), "no encontrada")
+        registro = self._registros[tool.name]
+        self._contar(registro, "llamadas")
+
+        plazo = registro.timeout if deadline is None else deadline.limitar(registro.timeout)
+        fin = time.monotonic() + plazo
+
+        if registro.semaforo is not None and not registro.semaforo.acquire(timeout=max(0.0, plazo)):
+            self._contar(registro, "rechazadas")
+            raise ToolSaturada(tool.name, "límite de concurrencia alcanzado")
+
+        inicio = time.monotonic()
+        try:
+            futuro = self._enviar(registro, params)
+        except Exception:
+            if registro.semaforo is not None:
+                registro.semaforo.release()
+            raise
+        if registro.semaforo is not None:
+            # El cupo se libera cuando la tarea termina de verdad, no cuando se deja de esperar
+            futuro.add_done_callback(lambda _: registro.semaforo.release())
+
+        while True:
+            restante = fin - time.monotonic()
+            if cancelacion is not None and cancelacion.is_set():
+                futuro.cancel()
+                self._contar(registro, "canceladas")
+                raise ToolCancelada(tool.name, "petición cancelada")
+            if restante <= 0:
+                futuro.cancel()
+                self._contar(registro, "timeouts")
+                raise ToolTimeout(tool.name, f"no terminó en {plazo:.1f} s")
+            espera = restante if cancelacion is None else min(restante, self.INTERVALO_CANCELACION)
+            try:
+                resultado = futuro.result(timeout=espera)
+                break
+            except FuturoTimeout:
+                continue
+            except Exception as e:
+                self._contar(registro, "errores")
+                raise ToolFallo(tool.name, e) from e
+
+        registro.latencias.registrar(time.monotonic() - inicio)
+        return resultado
+
+    def metricas(self) -> Dict[str, Any]:
+        """Llamadas, errores por tipo y latencia p50/p95 por tool"""
+        with self._lock:
+            return {
+                nombre: {
+                    **registro.contadores,
+                    "timeout_seg": registro.timeout,
+                    "p50_seg": registro.latencias.percentil(50),
+                    "p95_seg": registro.latencias.percentil(95),
+                }
+                for nombre, registro in self._registros.items()
+            }
+
@@ -0,0 +1,99 @@
+"""
+Embedders locales para la búsqueda semántica de propiedades.
+
+Un embedder es cualquier objeto con:
+    nombre: str                      identificador persistido junto al índice
+    embed(textos) -> np.ndarray      matriz (len(textos), dim) en float32, filas L2-normalizadas
+
+Se registran por nombre en EMBEDDERS y se eligen con Config.EMBEDDER.
+"""
+
+import re
+import zlib
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from config import Config
+from utils.helpers import normalizar_valor
+
+
+# Palabras vacías frecuentes en las consultas; no aportan al significado
+PALABRAS_VACIAS = {
+    "a", "al", "con", "de", "del", "el", "en", "la", "las", "los", "para",
+    "por", "que", "se", "un", "una", "unos", "unas", "y", "o", "muy",
+}
+
+
+def _normalizar_filas(matriz: np.ndarray) -> np.ndarray:
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return (matriz / normas).astype(np.float32, copy=False)
+
+
+class EmbedderHash:
+    """
+    Embedder sin modelo: hashing de palabras y trigramas de caracteres.
+
+    No capta sinónimos, pero sí variantes morfológicas ("jardín", "jardines")
+    y palabras parecidas ("centro", "céntrico"). Es determinista entre procesos.
+    """
+
+    nombre = "hash"
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _rasgos(self, texto: str):
+        for palabra in re.split(r"[_\W]+", normalizar_valor(texto)):
+            if not palabra or palabra in PALABRAS_VACIAS:
+                continue
+            yield palabra, 1.0
+            marcada = f"<{palabra}>"
+            for i in range(len(marcada) - 2):
+                yield marcada[i:i + 3], 0.5
+
+    def embed(self, textos: List[str]) -> np.ndarray:
+        matriz = np.zeros((len(textos), self.dim), dtype=np.float32)
+        for fila, texto in enumerate(textos):
+            for rasgo, peso in self._rasgos(texto or ""):
+                h = zlib.crc32(rasgo.encode("utf-8"))
+                signo = 1.0 if h & 0x80000000 else -1.0
+                matriz[fila, h % self.dim] += signo * peso
+        return _normalizar_filas(matriz)
+
+
+class EmbedderOllama:
+    """Embeddings de un modelo local servido por Ollama (p. ej. nomic-embed-text)"""
+
+    def __init__(self, modelo: str = None):
+        from langchain_ollama import OllamaEmbeddings
+
+        self.modelo = modelo or Config.EMBEDDING_MODEL
+        self.nombre = f"ollama:{self.modelo}"
+        self._cliente = OllamaEmbeddings(model=self.modelo)
+
+    def embed(self, textos: List[str]) -> np.ndarray:
+        vectores = self._cliente.embed_documents(list(textos))
+        return _normalizar_filas(np.asarray(vectores, dtype=np.float32))
+
+
+EMBEDDERS: Dict[str, Callable[[], object]] = {
+    "hash": EmbedderHash,
+    "ollama": EmbedderOllama,
+}
+
+
+def registrar_embedder(nombre: str, fabrica: Callable[[], object]):
+    """Registra un embedder adicional seleccionable con Config.EMBEDDER"""
+    EMBEDDERS[nombre] = fabrica
+
+
+def crear_embedder(nombre: str = None):
+    """Crea el embedder configurado (por defecto Config.EMBEDDER)"""
+    nombre = nombre or Config.EMBEDDER
+    if nombre not in EMBEDDERS:
+        raise ValueError(
+            f"Embedder desconocido: '{nombre}'. Disponibles: {', '.join(sorted(EMBEDDERS))}"
+        )
+    return EMBEDDERS[nombre]()
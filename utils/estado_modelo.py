@@ -0,0 +1,124 @@
+"""
+Estado del backend de Ollama para el probe de readiness.
+
+Un hilo en segundo plano consulta periódicamente Ollama (/api/tags y /api/ps)
+y guarda el resultado, así `/ready` responde al instante sin tocar la red.
+Opcionalmente, al arrancar, precarga el modelo con `keep_alive` para que el
+primer usuario no pague la carga en frío.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from config import Config
+
+
+# Referencia para medir el tiempo hasta estar listo
+INICIO_PROCESO = time.monotonic()
+
+logger = logging.getLogger(__name__)
+
+
+class MonitorModelo:
+    """Verifica en segundo plano que Ollama esté arriba y los modelos cargados"""
+
+    def __init__(
+        self,
+        modelos: List[str],
+        base_url: Optional[str] = None,
+        intervalo: Optional[float] = None,
+    ):
+        self.modelos = list(dict.fromkeys(modelos))
+        self.base_url = (base_url or Config.OLLAMA_BASE_URL).rstrip("/")
+        self.intervalo = intervalo or Config.READY_CHECK_INTERVAL
+        self._estado: Dict[str, Any] = {
+            "listo": False,
+            "backend": "desconocido",
+            "modelos": {},
+            "ultimo_chequeo": None,
+            "tiempo_hasta_listo_seg": None,
+        }
+        self._lock = threading.Lock()
+        self._hilo: Optional[threading.Thread] = None
+
+    def _base_modelo(self, nombre: str) -> str:
+        return nombre if ":" in nombre else f"{nombre}:latest"
+
+    def verificar(self) -> Dict[str, Any]:
+        """Consulta a Ollama y actualiza el estado cacheado"""
+        estado: Dict[str, Any] = {"modelos": {}, "error": None}
+        try:
+            tags = requests.get(f"{self.base_url}/api/tags", timeout=2).json()
+            cargados = requests.get(f"{self.base_url}/api/ps", timeout=2).json()
+            disponibles = {m.get("name") for m in tags.get("models", [])}
+            en_memoria = {m.get("name") for m in cargados.get("models", [])}
+            estado["backend"] = "ok"
+            for modelo in self.modelos:
+                nombre = self._base_modelo(modelo)
+                estado["modelos"][modelo] = {
+                    "disponible": nombre in disponibles,
+                    "cargado": nombre in en_memoria,
+                }
+        except (requests.RequestException, ValueError) as e:
+            estado["backend"] = "caido"
+            estado["error"] = str(e)
+
+        estado["listo"] = estado["backend"] == "ok" and all(
+            m["disponible"] for m in estado["modelos"].values()
+        )
+        estado["ultimo_chequeo"] = datetime.now().isoformat(timespec="seconds")
+
+        with self._lock:
+            estado["tiempo_hasta_listo_seg"] = self._estado["tiempo_hasta_listo_seg"]
+            if estado["listo"] and estado["tiempo_hasta_listo_seg"] is None:
+                estado["tiempo_hasta_listo_seg"] = round(time.monotonic() - INICIO_PROCESO, 3)
+                logger.info("Modelo listo en %s s desde el arranque", estado["tiempo_hasta_listo_seg"])
+            self._estado = estado
+        return estado
+
+    def calentar(self):
+        """Carga los modelos en memoria de Ollama (prompt vacío + keep_alive)"""
+        for modelo in self.modelos:
+            inicio = time.monotonic()
+            try:
+                requests.post(
+                    f"{self.base_url}/api/generate",
+                    json={"model": modelo, "prompt": "", "keep_alive": Config.OLLAMA_KEEP_ALIVE},
+                    timeout=Config.MODEL_WARMUP_TIMEOUT,
+                ).raise_for_status()
+                logger.info("Modelo %s precargado en %.2f s", modelo, time.monotonic() - inicio)
+            except requests.RequestException as e:
+                logger.warning("No se pudo precargar el modelo %s: %s", modelo, e)
+
+    def _bucle(self, calentar: bool):
+        while True:
+            # Cualquier error inesperado se registra; el hilo no debe morir en silencio
+            try:
+                self.verificar()
+                if calentar and self._estado["backend"] == "ok":
+                    calentar = False
+                    self.calentar()
+                    self.verificar()
+            except Exception:
+                logger.exception("Error en el monitor del modelo")
+            time.sleep(self.intervalo)
+
+    def iniciar(self, calentar: bool = False):
+        """Arranca el hilo de verificación (una sola vez)"""
+        with self._lock:
+            if self._hilo is not None:
+                return
+            self._hilo = threading.Thread(
+                target=self._bucle, args=(calentar,), name="monitor-modelo", daemon=True
+            )
+        self._hilo.start()
+
+    def estado(self) -> Dict[str, Any]:
+        """Último estado conocido (no hace llamadas de red)"""
+        with self._lock:
+            return dict(self._estado)
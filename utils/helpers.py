@@ -1,5 +1,6 @@
 import unicodedata
 import re
+import shlex
 
 
 def _normalize_name(s: str) -> str:
@@ -17,6 +18,47 @@ def _normalize_name(s: str) -> str:
     return s
 
 
+def normalizar_valor(s) -> str:
+    """Normaliza un valor de búsqueda (ciudad, tipo) igual que los nombres de tools.
+
+    Ejemplo: ' Cochabámba ' -> 'cochabamba', 'La Paz' -> 'la_paz'
+    """
+    if not s:
+        return ""
+    return _normalize_name(str(s).strip())
+
+
+# Alias comunes (sin acentos / espacios) de nombres de tools
+ALIAS_TOOLS = {
+    "busqueda_propiedades": "buscar_propiedades",
+    "busqueda-de-propiedades": "buscar_propiedades",
+    "buscar_propiedades": "buscar_propiedades",
+    "contar_propiedades": "contar_propiedades",
+}
+
+
+def resolver_tool(raw_name, tools):
+    """Busca una tool por nombre con coincidencia flexible (normalizado y alias).
+
+    Devuelve el objeto de la tool o None si no existe.
+    """
+    norm_target = _normalize_name(raw_name)
+    objetivos = [norm_target]
+    if norm_target in ALIAS_TOOLS:
+        objetivos.append(_normalize_name(ALIAS_TOOLS[norm_target]))
+
+    for objetivo in objetivos:
+        for tool_obj in tools:
+            candidate = (
+                getattr(tool_obj, "name", None)
+                or getattr(tool_obj, "__name__", None)
+                or ""
+            )
+            if _normalize_name(candidate) == objetivo:
+                return tool_obj
+    return None
+
+
 def ejecutar_tool(tool_spec, tools):
     """Ejecuta una tool por su nombre o spec con coincidencia flexible.
 
@@ -34,54 +76,21 @@ def ejecutar_tool(tool_spec, tools):
         raw_name = tool_spec
         params = {}
 
-    norm_target = _normalize_name(raw_name)
-
-    # Buscar coincidencia directa entre nombres registrados
-    for tool_obj in tools:
-        candidate = (
-            getattr(tool_obj, "name", None) or getattr(tool_obj, "__name__", None) or ""
-        )
-        if _normalize_name(candidate) == norm_target:
-            try:
-                if hasattr(tool_obj, "invoke"):
-                    return tool_obj.invoke(params or {})
-                # intentar llamar como función con kwargs
-                try:
-                    return tool_obj(**(params or {}))
-                except TypeError:
-                    return tool_obj()
-            except Exception as e:
-                return {"error": str(e)}
-
-    # Intentar algunos alias comunes (sin acentos / espacios)
-    aliases = {
-        "busqueda_propiedades": "buscar_propiedades",
-        "busqueda-de-propiedades": "buscar_propiedades",
-        "buscar_propiedades": "buscar_propiedades",
-        "contar_propiedades": "contar_propiedades",
-    }
-
-    if norm_target in aliases:
-        target_norm = _normalize_name(aliases[norm_target])
-        for tool_obj in tools:
-            candidate = (
-                getattr(tool_obj, "name", None)
-                or getattr(tool_obj, "__name__", None)
-                or ""
-            )
-            if _normalize_name(candidate) == target_norm:
-                try:
-                    if hasattr(tool_obj, "invoke"):
-                        return tool_obj.invoke(params or {})
-                    try:
-                        return tool_obj(**(params or {}))
-                    except TypeError:
-                        return tool_obj()
-                except Exception as e:
-                    return {"error": str(e)}
-
+    tool_obj = resolver_tool(raw_name, tools)
     # Si no encontró coincidencias, devolver None (el caller decide 500)
-    return None
+    if tool_obj is None:
+        return None
+
+    try:
+        if hasattr(tool_obj, "invoke"):
+            return tool_obj.invoke(params or {})
+        # intentar llamar como función con kwargs
+        try:
+            return tool_obj(**(params or {}))
+        except TypeError:
+            return tool_obj()
+    except Exception as e:
+        return {"error": str(e)}
 
 
 def detectar_tool_en_respuesta(response_text: str):
@@ -94,7 +103,12 @@ def detectar_tool_en_respuesta(response_text: str):
             raw = response_text[start:end].strip()
             # raw puede contener nombre y parámetros, por ejemplo:
             # buscar_propiedades tipo=Casa ciudad=Cochabamba precio_max=5000
-            parts = raw.split()
+            # buscar_propiedades_semantica consulta="casa con jardín"
+            try:
+                parts = shlex.split(raw)
+            except ValueError:
+                # comillas sin cerrar: separar solo por espacios
+                parts = raw.split()
             if len(parts) == 0:
                 return None
             name = parts[0]
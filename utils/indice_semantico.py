@@ -0,0 +1,559 @@
+"""
+Índice semántico de las descripciones de propiedades.
+
+Archivos en Config.INDICE_SEMANTICO_DIR:
+    vectores.npy    matriz (capacidad, dim) float32, abierta con memmap
+    centroides.npy  centroides IVF (solo con catálogos grandes)
+    meta.json       embedder, dimensión, filas usadas y versión del catálogo
+
+La correspondencia propiedad -> fila de la matriz vive en la tabla
+`embeddings_propiedades`, así los filtros estructurados (ciudad, tipo,
+precio) se aplican con SQL antes de puntuar. El índice se actualiza de forma
+incremental: solo se vuelven a embeber las propiedades cuyo texto cambió.
+
+Las búsquedas no esperan a la actualización: leen la última instantánea
+publicada (matriz, asignaciones y centroides) y, como mucho cada
+Config.INDICE_REFRESCO_SEG, lanzan la sincronización en un hilo aparte. La
+sincronización arma arrays nuevos y los publica de una vez, así una búsqueda
+en curso nunca ve un estado a medio escribir. Una fila liberada no se reutiliza
+en la misma sincronización en que se libera, sino en la siguiente; como otro
+proceso puede seguir con una instantánea anterior, el detalle de cada resultado
+comprueba en `embeddings_propiedades` que la fila siga siendo de esa propiedad
+y que esta siga disponible.
+"""
+
+import hashlib
+import json
+import os
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, NamedTuple, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dependencia opcional
+    np = None
+
+from config import Config
+from utils.database_helpers import get_db_connection, normalizar_filtro, obtener_version_catalogo
+
+
+logger = logging.getLogger(__name__)
+
+TAM_LOTE_EMBEDDING = 256
+MAX_MUESTRA_IVF = 20000
+
+
+class IndiceNoDisponible(RuntimeError):
+    """El índice todavía se está construyendo y no hay instantánea que servir"""
+
+    status = 503
+
+
+class _Instantanea(NamedTuple):
+    """Estado del índice que ven las búsquedas; nunca se modifica en el lugar"""
+
+    vectores: Any
+    ids_por_fila: Any
+    lista_por_fila: Any
+    centroides: Any
+
+
+def texto_propiedad(tipo: Optional[str], zona: Optional[str], descripcion: Optional[str]) -> str:
+    """Texto que se embebe por cada propiedad"""
+    return ". ".join(parte for parte in (tipo, zona, descripcion) if parte)
+
+
+def _huella(texto: str) -> str:
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()[:16]
+
+
+@contextmanager
+def _bloqueo_archivo(ruta: str):
+    """Exclusión mutua entre procesos (workers) que comparten el índice"""
+    if fcntl is None:
+        yield
+        return
+    with open(ruta, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _kmeans(datos: "np.ndarray", k: int, iteraciones: int = 10, semilla: int = 0) -> "np.ndarray":
+    """K-means esférico (similitud coseno) sobre vectores normalizados"""
+    rng = np.random.default_rng(semilla)
+    centroides = datos[rng.choice(len(datos), k, replace=False)].copy()
+    for _ in range(iteraciones):
+        asignacion = np.argmax(datos @ centroides.T, axis=1)
+        sumas = np.zeros_like(centroides)
+        np.add.at(sumas, asignacion, datos)
+        normas = np.linalg.norm(sumas, axis=1)
+        vacios = normas == 0
+        sumas[~vacios] /= normas[~vacios, None]
+        sumas[vacios] = centroides[vacios]
+        centroides = sumas
+    return centroides.astype(np.float32)
+
+
+class IndiceSemantico:
+    """Matriz de embeddings persistida con búsqueda por fuerza bruta o IVF"""
+
+    def __init__(self, directorio: Optional[str] = None, embedder=None):
+        from utils.embeddings import crear_embedder
+
+        self.directorio = directorio or Config.INDICE_SEMANTICO_DIR
+        self.embedder = embedder or crear_embedder()
+        self.vectores = None
+        self.ids_por_fila = np.empty(0, dtype=np.int64)  # -1 = fila libre
+        self.lista_por_fila = np.empty(0, dtype=np.int32)  # -1 = sin lista IVF
+        self.centroides = None
+        self.meta: Dict[str, Any] = {}
+        self._generacion = None
+        self._lock = threading.Lock()
+        self._instantanea: Optional[_Instantanea] = None
+        self._ultima_verificacion = float("-inf")
+        self._refrescando = False
+        self._refresco_lock = threading.Lock()
+        os.makedirs(self.directorio, exist_ok=True)
+
+    # ===== PERSISTENCIA =====
+
+    def _ruta(self, nombre: str) -> str:
+        return os.path.join(self.directorio, nombre)
+
+    def _leer_meta(self) -> Dict[str, Any]:
+        try:
+            with open(self._ruta("meta.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _escribir_meta(self):
+        tmp = self._ruta("meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self._ruta("meta.json"))
+
+    def _abrir(self, conn):
+        """Carga la matriz y las asignaciones persistidas, o reinicia el índice"""
+        meta = self._leer_meta()
+        ruta = self._ruta("vectores.npy")
+
+        if meta.get("embedder") == self.embedder.nombre and os.path.exists(ruta):
+            self.vectores = np.load(ruta, mmap_mode="r+")
+        else:
+            # Otro embedder o archivos perdidos: se reconstruye desde cero
+            conn.execute("DELETE FROM embeddings_propiedades")
+            for nombre in ("vectores.npy", "centroides.npy"):
+                if os.path.exists(self._ruta(nombre)):
+                    os.remove(self._ruta(nombre))
+            meta = {
+                "embedder": self.embedder.nombre,
+                "dim": None,
+                "filas": 0,
+                "version_catalogo": None,
+                "generacion": meta.get("generacion", 0) + 1,
+                "ivf_entrenado_con": 0,
+            }
+            self.vectores = None
+
+        capacidad = 0 if self.vectores is None else self.vectores.shape[0]
+        self.ids_por_fila = np.full(capacidad, -1, dtype=np.int64)
+        self.lista_por_fila = np.full(capacidad, -1, dtype=np.int32)
+        for propiedad_id, fila, lista in conn.execute(
+            "SELECT propiedad_id, fila, lista FROM embeddings_propiedades"
+        ):
+            self.ids_por_fila[fila] = propiedad_id
+            self.lista_por_fila[fila] = -1 if lista is None else lista
+
+        ruta_centroides = self._ruta("centroides.npy")
+        self.centroides = np.load(ruta_centroides) if os.path.exists(ruta_centroides) else None
+        self.meta = meta
+        self._generacion = meta["generacion"]
+
+    def _asegurar_capacidad(self, necesarias: int, dim: int):
+        """Agranda la matriz (duplicando capacidad) copiándola a un archivo nuevo"""
+        actual = 0 if self.vectores is None else self.vectores.shape[0]
+        if necesarias <= actual:
+            return
+
+        capacidad = max(necesarias, actual * 2, 1024)
+        ruta = self._ruta("vectores.npy")
+        tmp = ruta + ".tmp"
+        nueva = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(capacidad, dim))
+        if actual:
+            nueva[:actual] = self.vectores
+        nueva.flush()
+        del nueva
+        os.replace(tmp, ruta)
+
+        self.vectores = np.load(ruta, mmap_mode="r+")
+        self.meta["dim"] = dim
+        relleno = capacidad - actual
+        self.ids_por_fila = np.concatenate([self.ids_por_fila, np.full(relleno, -1, np.int64)])
+        self.lista_por_fila = np.concatenate([self.lista_por_fila, np.full(relleno, -1, np.int32)])
+
+    def _publicar(self):
+        """Expone el estado actual a las búsquedas (asignación atómica)"""
+        self._instantanea = _Instantanea(
+            self.vectores, self.ids_por_fila, self.lista_por_fila, self.centroides
+        )
+
+    # ===== ACTUALIZACIÓN INCREMENTAL =====
+
+    def actualizar(self) -> Dict[str, int]:
+        """
+        Sincroniza el índice con el catálogo si cambió su versión.
+
+        Es síncrono y puede tardar (embebe lo que cambió); las búsquedas lo
+        lanzan en segundo plano con `refrescar`.
+
+        Returns:
+            Conteo de filas liberadas y embebidas (vacío si ya estaba al día)
+        """
+        version = obtener_version_catalogo()
+        meta = self._leer_meta()
+        if (
+            self._generacion is not None
+            and meta.get("generacion") == self._generacion
+            and meta.get("version_catalogo") == version
+        ):
+            return {}
+
+        with self._lock, _bloqueo_archivo(self._ruta(".lock")):
+            conn = get_db_connection()
+            try:
+                # Otro proceso pudo haber actualizado el índice mientras esperábamos
+                if (
+                    self._generacion is None
+                    or self._leer_meta().get("generacion") != self._generacion
+                ):
+                    self._abrir(conn)
+                if self.meta.get("version_catalogo") == version:
+                    self._publicar()
+                    return {}
+
+                stats = self._sincronizar(conn.cursor())
+                conn.commit()
+                if self.vectores is not None:
+                    self.vectores.flush()
+                self.meta["version_catalogo"] = version
+                self.meta["generacion"] += 1
+                self._generacion = self.meta["generacion"]
+                self._escribir_meta()
+                self._publicar()
+                return stats
+            finally:
+                conn.close()
+
+    def _sincronizar(self, cursor) -> Dict[str, int]:
+        # Copias: la instantánea publicada sigue apuntando a los arrays anteriores
+        self.ids_por_fila = self.ids_por_fila.copy()
+        self.lista_por_fila = self.lista_por_fila.copy()
+        # Solo se reutilizan filas que ya estaban libres en la instantánea publicada
+        libres = np.flatnonzero(self.ids_por_fila[: self.meta["filas"]] < 0).tolist()
+
+        # Propiedades eliminadas o no disponibles: liberar sus filas
+        cursor.execute(
+            """
+            SELECT e.propiedad_id, e.fila
+            FROM embeddings_propiedades e
+            LEFT JOIN propiedades p ON p.id = e.propiedad_id AND p.disponible = 1
+            WHERE p.id IS NULL
+            """
+        )
+        liberadas = cursor.fetchall()
+        if liberadas:
+            cursor.executemany(
+                "DELETE FROM embeddings_propiedades WHERE propiedad_id = ?",
+                [(propiedad_id,) for propiedad_id, _ in liberadas],
+            )
+            filas = np.array([fila for _, fila in liberadas], dtype=np.int64)
+            self.ids_por_fila[filas] = -1
+            self.lista_por_fila[filas] = -1
+
+        # Propiedades nuevas o con texto modificado
+        cursor.execute(
+            """
+            SELECT p.id, p.tipo, p.zona, p.descripcion, e.fila, e.huella
+            FROM propiedades p
+            LEFT JOIN embeddings_propiedades e ON e.propiedad_id = p.id
+            WHERE p.disponible = 1
+            """
+        )
+        pendientes = []
+        for propiedad_id, tipo, zona, descripcion, fila, huella in cursor.fetchall():
+            texto = texto_propiedad(tipo, zona, descripcion)
+            nueva_huella = _huella(texto)
+            if nueva_huella != huella:
+                pendientes.append((propiedad_id, fila, texto, nueva_huella))
+
+        for inicio in range(0, len(pendientes), TAM_LOTE_EMBEDDING):
+            lote = pendientes[inicio:inicio + TAM_LOTE_EMBEDDING]
+            vectores = self.embedder.embed([texto for _, _, texto, _ in lote])
+
+            filas = []
+            for _, fila, _, _ in lote:
+                if fila is None:
+                    if libres:
+                        fila = libres.pop()
+                    else:
+                        fila = self.meta["filas"]
+                        self.meta["filas"] += 1
+                filas.append(fila)
+
+            self._asegurar_capacidad(max(filas) + 1, vectores.shape[1])
+            filas = np.array(filas, dtype=np.int64)
+            listas = self._asignar_listas(vectores)
+            self.vectores[filas] = vectores
+            self.ids_por_fila[filas] = [propiedad_id for propiedad_id, _, _, _ in lote]
+            self.lista_por_fila[filas] = listas
+
+            cursor.executemany(
+                """
+                INSERT INTO embeddings_propiedades (propiedad_id, fila, huella, lista)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(propiedad_id) DO UPDATE SET
+                    huella = excluded.huella, lista = excluded.lista
+                """,
+                [
+                    (propiedad_id, int(fila), huella, None if lista < 0 else int(lista))
+                    for (propiedad_id, _, _, huella), fila, lista in zip(lote, filas, listas)
+                ],
+            )
+
+        self._entrenar_ivf_si_corresponde(cursor)
+        return {"liberadas": len(liberadas), "embebidas": len(pendientes)}
+
+    # ===== IVF =====
+
+    def _asignar_listas(self, vectores: "np.ndarray") -> "np.ndarray":
+        if self.centroides is None:
+            return np.full(len(vectores), -1, dtype=np.int32)
+        return np.argmax(vectores @ self.centroides.T, axis=1).astype(np.int32)
+
+    def _entrenar_ivf_si_corresponde(self, cursor):
+        """
+        Particiona el índice en listas IVF cuando el catálogo supera
+        Config.IVF_MIN_FILAS. Se reentrena cuando el índice duplica su tamaño.
+        """
+        usadas = np.flatnonzero(self.ids_por_fila >= 0)
+        ruta = self._ruta("centroides.npy")
+
+        if len(usadas) < Config.IVF_MIN_FILAS:
+            if self.centroides is not None:
+                self.centroides = None
+                self.lista_por_fila[:] = -1
+                cursor.execute("UPDATE embeddings_propiedades SET lista = NULL")
+                os.remove(ruta)
+                self.meta["ivf_entrenado_con"] = 0
+            return
+
+        if self.centroides is not None and len(usadas) <= 2 * self.meta.get("ivf_entrenado_con", 0):
+            return
+
+        rng = np.random.default_rng(0)
+        muestra = usadas
+        if len(usadas) > MAX_MUESTRA_IVF:
+            muestra = np.sort(rng.choice(usadas, MAX_MUESTRA_IVF, replace=False))
+        listas = max(1, int(np.sqrt(len(usadas))))
+        self.centroides = _kmeans(np.asarray(self.vectores[muestra]), listas)
+
+        for inicio in range(0, len(usadas), 8192):
+            filas = usadas[inicio:inicio + 8192]
+            self.lista_por_fila[filas] = self._asignar_listas(np.asarray(self.vectores[filas]))
+        cursor.executemany(
+            "UPDATE embeddings_propiedades SET lista = ? WHERE fila = ?",
+            [(int(self.lista_por_fila[fila]), int(fila)) for fila in usadas],
+        )
+        np.save(ruta, self.centroides)
+        self.meta["ivf_entrenado_con"] = len(usadas)
+
+    # ===== REFRESCO EN SEGUNDO PLANO =====
+
+    def refrescar(self):
+        """
+        Lanza `actualizar` en un hilo aparte si pasaron Config.INDICE_REFRESCO_SEG
+        desde la última verificación y no hay otra en curso.
+        """
+        with self._refresco_lock:
+            ahora = time.monotonic()
+            if self._refrescando or ahora - self._ultima_verificacion < Config.INDICE_REFRESCO_SEG:
+                return
+            self._refrescando = True
+            self._ultima_verificacion = ahora
+        threading.Thread(target=self._refrescar, name="indice-semantico", daemon=True).start()
+
+    def _refrescar(self):
+        try:
+            stats = self.actualizar()
+            if stats:
+                logger.info("Índice semántico actualizado: %s", stats)
+        except Exception:
+            logger.exception("Error al actualizar el índice semántico")
+        finally:
+            with self._refresco_lock:
+                self._refrescando = False
+
+    def _cargar_persistido(self) -> Optional[_Instantanea]:
+        """
+        Primera búsqueda del proceso: publica el índice ya guardado en disco,
+        aunque esté desactualizado, mientras el refresco lo pone al día.
+        """
+        meta = self._leer_meta()
+        if meta.get("embedder") != self.embedder.nombre or not os.path.exists(self._ruta("vectores.npy")):
+            return None
+        # Si el refresco tiene el lock está construyendo; no se le espera
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            if self._instantanea is None:
+                with _bloqueo_archivo(self._ruta(".lock")):
+                    conn = get_db_connection()
+                    try:
+                        self._abrir(conn)
+                    finally:
+                        conn.close()
+                self._publicar()
+            return self._instantanea
+        finally:
+            self._lock.release()
+
+    # ===== BÚSQUEDA =====
+
+    def buscar(
+        self,
+        consulta: str,
+        ciudad: Optional[str] = None,
+        tipo: Optional[str] = None,
+        precio_min: Optional[float] = None,
+        precio_max: Optional[float] = None,
+        limite: int = 5,
+    ) -> List[Dict[str, Any]]:
+        """
+        Devuelve las propiedades disponibles más parecidas a la consulta.
+
+        Los filtros estructurados reducen los candidatos antes de puntuar; si
+        quedan muchos candidatos y hay listas IVF, solo se puntúan las
+        Config.IVF_NPROBE listas más cercanas a la consulta.
+
+        Raises:
+            IndiceNoDisponible: si el índice aún no se construyó nunca
+        """
+        self.refrescar()
+
+        instantanea = self._instantanea or self._cargar_persistido()
+        if instantanea is None:
+            raise IndiceNoDisponible(
+                "El índice semántico se está construyendo; intenta de nuevo en unos minutos"
+            )
+        vectores, ids_por_fila, lista_por_fila, centroides = instantanea
+        if vectores is None:
+            return []
+
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            condiciones, params = [], []
+            if ciudad:
+                condiciones.append("p.ciudad_norm = ?")
+                params.append(normalizar_filtro("ciudad", ciudad))
+            if tipo:
+                condiciones.append("p.tipo_norm = ?")
+                params.append(normalizar_filtro("tipo", tipo))
+            if precio_min is not None:
+                condiciones.append("p.precio >= ?")
+                params.append(precio_min)
+            if precio_max is not None:
+                condiciones.append("p.precio <= ?")
+                params.append(precio_max)
+
+            if condiciones:
+                cursor.execute(
+                    f"""
+                    SELECT e.fila FROM embeddings_propiedades e
+                    JOIN propiedades p ON p.id = e.propiedad_id
+                    WHERE p.disponible = 1 AND {" AND ".join(condiciones)}
+                    """,
+                    params,
+                )
+                filas = np.fromiter((fila for (fila,) in cursor), dtype=np.int64)
+                filas = filas[filas < len(ids_por_fila)]
+            else:
+                filas = np.flatnonzero(ids_por_fila >= 0)
+
+            if len(filas) == 0:
+                return []
+
+            q = self.embedder.embed([consulta])[0]
+
+            if centroides is not None and len(filas) >= Config.IVF_MIN_FILAS:
+                sondas = np.argsort(centroides @ q)[::-1][: Config.IVF_NPROBE]
+                filas = filas[np.isin(lista_por_fila[filas], sondas)]
+
+            if len(filas) > len(ids_por_fila) // 4:
+                # Muchos candidatos: producto contiguo sobre la matriz completa
+                puntajes = (vectores[: len(ids_por_fila)] @ q)[filas]
+            else:
+                puntajes = np.asarray(vectores[filas]) @ q
+
+            # Se piden de más: el detalle descarta las que dejaron de estar disponibles
+            k = 2 * limite
+            if 0 < k < len(filas):
+                mejores = np.argpartition(-puntajes, k - 1)[:k]
+            else:
+                mejores = np.arange(len(filas))
+            mejores = mejores[np.argsort(-puntajes[mejores], kind="stable")]
+
+            similitud = {int(filas[i]): float(puntajes[i]) for i in mejores}
+            marcadores = ", ".join("?" for _ in similitud)
+            # La fila tiene que seguir asignada a la misma propiedad que en la
+            # instantánea: otro proceso pudo reutilizarla para otra propiedad
+            cursor.execute(
+                f"""
+                SELECT e.fila, p.id, p.tipo, p.ciudad, p.zona, p.precio, p.dormitorios, p.descripcion
+                FROM embeddings_propiedades e
+                JOIN propiedades p ON p.id = e.propiedad_id
+                WHERE p.disponible = 1 AND e.fila IN ({marcadores})
+                """,
+                list(similitud),
+            )
+            detalles = {}
+            for row in cursor.fetchall():
+                if row["id"] == ids_por_fila[row["fila"]]:
+                    detalles[row["fila"]] = {campo: row[campo] for campo in row.keys() if campo != "fila"}
+        finally:
+            conn.close()
+
+        resultados = []
+        for fila, puntaje in similitud.items():
+            if fila in detalles:
+                resultados.append({**detalles[fila], "similitud": round(puntaje, 4)})
+        return resultados[:limite] if limite > 0 else resultados
+
+
+# ===== ÍNDICE COMPARTIDO DEL PROCESO =====
+
+_indice: Optional[IndiceSemantico] = None
+_indice_lock = threading.Lock()
+
+
+def obtener_indice() -> Optional[IndiceSemantico]:
+    """Devuelve el índice semántico del proceso, o None si NumPy no está instalado"""
+    global _indice
+    if np is None:
+        return None
+    with _indice_lock:
+        if _indice is None:
+            _indice = IndiceSemantico()
+        return _indice
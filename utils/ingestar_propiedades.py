@@ -0,0 +1,438 @@
+"""
+Ingesta masiva de propiedades desde CSV, JSON o NDJSON.
+
+Lee el archivo en streaming, valida cada fila y hace upsert por
+`external_id`, de modo que volver a ejecutar la misma carga no duplica
+propiedades.
+
+Uso:
+    python -m utils.ingestar_propiedades catalogo.ndjson
+    python -m utils.ingestar_propiedades catalogo.csv --lote 20000
+    python -m utils.ingestar_propiedades catalogo.json --db data/propiedades.db
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from utils.database_helpers import DB_PATH
+from utils.helpers import normalizar_valor
+from utils.init_db import (
+    crear_triggers,
+    eliminar_triggers,
+    incrementar_version_catalogo,
+    migrar_esquema,
+    reconstruir_conteos,
+)
+
+
+# Índices que deben existir durante la carga (el upsert depende de ellos)
+INDICES_REQUERIDOS = {"idx_propiedades_external_id"}
+
+SQL_UPSERT = """
+    INSERT INTO propiedades
+    (external_id, tipo, ciudad, zona, precio, dormitorios, banos, area_m2, descripcion, disponible,
+     ciudad_norm, tipo_norm)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(external_id) DO UPDATE SET
+        tipo = excluded.tipo,
+        ciudad = excluded.ciudad,
+        ciudad_norm = excluded.ciudad_norm,
+        tipo_norm = excluded.tipo_norm,
+        zona = excluded.zona,
+        precio = excluded.precio,
+        dormitorios = excluded.dormitorios,
+        banos = excluded.banos,
+        area_m2 = excluded.area_m2,
+        descripcion = excluded.descripcion,
+        disponible = excluded.disponible
+    WHERE propiedades.tipo IS NOT excluded.tipo
+       OR propiedades.ciudad IS NOT excluded.ciudad
+       OR propiedades.zona IS NOT excluded.zona
+       OR propiedades.precio IS NOT excluded.precio
+       OR propiedades.dormitorios IS NOT excluded.dormitorios
+       OR propiedades.banos IS NOT excluded.banos
+       OR propiedades.area_m2 IS NOT excluded.area_m2
+       OR propiedades.descripcion IS NOT excluded.descripcion
+       OR propiedades.disponible IS NOT excluded.disponible
+       OR propiedades.ciudad_norm IS NOT excluded.ciudad_norm
+       OR propiedades.tipo_norm IS NOT excluded.tipo_norm
+"""
+
+
+class FilaInvalida(ValueError):
+    """Error de validación de una fila del catálogo"""
+
+
+# ===== LECTORES EN STREAMING =====
+
+
+def leer_csv(ruta: str) -> Iterator[Dict[str, Any]]:
+    """Lee un CSV con encabezados fila por fila"""
+    with open(ruta, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+def leer_ndjson(ruta: str) -> Iterator[Dict[str, Any]]:
+    """Lee un archivo NDJSON (un objeto JSON por línea)"""
+    with open(ruta, encoding="utf-8") as f:
+        for numero, linea in enumerate(f, start=1):
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                yield json.loads(linea)
+            except json.JSONDecodeError as e:
+                # Se entrega como fila inválida para que cuente en el reporte
+                yield FilaInvalida(f"línea {numero}: JSON inválido ({e.msg})")
+
+
+# Tamaño máximo de un elemento mal formado antes de resincronizar a ciegas
+MAX_ELEMENTO_INVALIDO = 1 << 20
+
+# Límite entre objetos del arreglo: "}" "," "{" (solo se usa para resincronizar)
+_LIMITE_OBJETOS = re.compile(r"\}\s*,\s*(?=\{)")
+
+
+def _fin_elemento(buffer: str) -> int:
+    """
+    Posición de la coma o el corchete que cierra el primer elemento del
+    buffer (fuera de cadenas y a profundidad 0), o -1 si no está completo.
+    """
+    profundidad = 0
+    en_cadena = escape = False
+    for i, c in enumerate(buffer):
+        if en_cadena:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                en_cadena = False
+        elif c == '"':
+            en_cadena = True
+        elif c in "{[":
+            profundidad += 1
+        elif c in "}]":
+            if profundidad == 0 and c == "]":
+                return i
+            profundidad = max(0, profundidad - 1)
+        elif c == "," and profundidad == 0:
+            return i
+    return -1
+
+
+def leer_json(ruta: str, tam_bloque: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """
+    Lee un arreglo JSON de objetos sin cargar el archivo completo en memoria.
+
+    Decodifica elemento por elemento sobre un buffer que se rellena por bloques.
+    Un elemento mal formado se entrega como FilaInvalida (cuenta en el reporte,
+    igual que en CSV y NDJSON) y la lectura sigue desde el siguiente elemento.
+    """
+    decoder = json.JSONDecoder()
+    with open(ruta, encoding="utf-8") as f:
+        buffer = f.read(tam_bloque).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError("El archivo JSON debe contener un arreglo de propiedades")
+        buffer = buffer[1:]
+        numero = 0
+        eof = False
+
+        while True:
+            buffer = buffer.lstrip()
+            if buffer.startswith(","):
+                buffer = buffer[1:].lstrip()
+            if buffer.startswith("]"):
+                return
+            if not buffer and eof:
+                yield FilaInvalida(f"elemento {numero + 1}: arreglo JSON sin cerrar")
+                return
+            try:
+                objeto, fin = decoder.raw_decode(buffer)
+            except json.JSONDecodeError as e:
+                # ¿Elemento incompleto (falta leer) o mal formado?
+                corte = _fin_elemento(buffer)
+                if corte < 0 and len(buffer) > MAX_ELEMENTO_INVALIDO:
+                    limite = _LIMITE_OBJETOS.search(buffer)
+                    corte = limite.end() - 1 if limite else -1
+                if corte < 0 and not eof:
+                    bloque = f.read(tam_bloque)
+                    eof = not bloque
+                    buffer += bloque
+                    continue
+
+                numero += 1
+                yield FilaInvalida(f"elemento {numero}: JSON inválido ({e.msg})")
+                if corte < 0:
+                    return  # archivo truncado
+                buffer = buffer[corte:]
+                continue
+            numero += 1
+            yield objeto
+            buffer = buffer[fin:]
+
+
+LECTORES = {
+    "csv": leer_csv,
+    "json": leer_json,
+    "ndjson": leer_ndjson,
+    "jsonl": leer_ndjson,
+}
+
+
+def leer_registros(ruta: str, formato: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Elige el lector según el formato indicado o la extensión del archivo"""
+    formato = (formato or os.path.splitext(ruta)[1].lstrip(".")).lower()
+    if formato not in LECTORES:
+        raise ValueError(
+            f"Formato no soportado: '{formato}'. Usa uno de: {', '.join(sorted(LECTORES))}"
+        )
+    return LECTORES[formato](ruta)
+
+
+# ===== VALIDACIÓN =====
+
+
+def _texto(valor: Any) -> Optional[str]:
+    if valor is None:
+        return None
+    valor = str(valor).strip()
+    return valor or None
+
+
+def _numero(valor: Any, campo: str, tipo=float, requerido: bool = False):
+    if valor is None or (isinstance(valor, str) and not valor.strip()):
+        if requerido:
+            raise FilaInvalida(f"'{campo}' es requerido")
+        return None
+    try:
+        numero = tipo(float(valor)) if tipo is int else tipo(valor)
+    except (TypeError, ValueError):
+        raise FilaInvalida(f"'{campo}' no es numérico: {valor!r}")
+    if numero < 0:
+        raise FilaInvalida(f"'{campo}' no puede ser negativo: {valor!r}")
+    return numero
+
+
+def _booleano(valor: Any) -> int:
+    if valor is None or valor == "":
+        return 1
+    if isinstance(valor, str):
+        valor = valor.strip().lower()
+        if valor in ("1", "true", "si", "sí", "yes"):
+            return 1
+        if valor in ("0", "false", "no"):
+            return 0
+        raise FilaInvalida(f"'disponible' no es booleano: {valor!r}")
+    return 1 if valor else 0
+
+
+def validar_fila(registro: Any) -> Tuple:
+    """
+    Valida un registro del catálogo y lo convierte en la tupla de parámetros
+    que espera SQL_UPSERT.
+
+    Raises:
+        FilaInvalida: si faltan campos requeridos o hay valores inválidos
+    """
+    if isinstance(registro, FilaInvalida):
+        raise registro
+    if not isinstance(registro, dict):
+        raise FilaInvalida("la fila no es un objeto")
+
+    external_id = _texto(registro.get("external_id") or registro.get("id_externo"))
+    if not external_id:
+        raise FilaInvalida("'external_id' es requerido")
+
+    tipo = _texto(registro.get("tipo"))
+    ciudad = _texto(registro.get("ciudad"))
+    if not tipo:
+        raise FilaInvalida("'tipo' es requerido")
+    if not ciudad:
+        raise FilaInvalida("'ciudad' es requerido")
+
+    return (
+        external_id,
+        tipo,
+        ciudad,
+        _texto(registro.get("zona")),
+        _numero(registro.get("precio"), "precio", float, requerido=True),
+        _numero(registro.get("dormitorios"), "dormitorios", int),
+        _numero(registro.get("banos"), "banos", int),
+        _numero(registro.get("area_m2"), "area_m2", float),
+        _texto(registro.get("descripcion")),
+        _booleano(registro.get("disponible")),
+        normalizar_valor(ciudad),
+        normalizar_valor(tipo),
+    )
+
+
+# ===== CARGA =====
+
+
+def _suspender_indices(cursor) -> List[str]:
+    """
+    Elimina los índices secundarios de `propiedades` para no mantenerlos fila a
+    fila durante la carga. Devuelve sus definiciones para recrearlos después.
+    """
+    cursor.execute(
+        """
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'index' AND tbl_name = 'propiedades' AND sql IS NOT NULL
+        """
+    )
+    definiciones = []
+    for nombre, sql in cursor.fetchall():
+        if nombre in INDICES_REQUERIDOS:
+            continue
+        cursor.execute(f"DROP INDEX IF EXISTS {nombre}")
+        definiciones.append(sql)
+    return definiciones
+
+
+def _restaurar_indices(cursor, definiciones: List[str]):
+    """Recrea los índices suspendidos en una sola pasada por tabla"""
+    for sql in definiciones:
+        cursor.execute(sql)
+
+
+def ingestar(
+    ruta: str,
+    db_path: str = DB_PATH,
+    formato: Optional[str] = None,
+    tam_lote: int = 5000,
+    filas_por_transaccion: int = 100000,
+    max_errores_reportados: int = 20,
+) -> Dict[str, Any]:
+    """
+    Carga un catálogo de propiedades haciendo upsert por `external_id`.
+
+    Args:
+        ruta: Archivo CSV, JSON (arreglo) o NDJSON
+        db_path: Ruta a la base de datos SQLite
+        formato: Forzar formato ('csv', 'json', 'ndjson'); por defecto la extensión
+        tam_lote: Filas por llamada a executemany
+        filas_por_transaccion: Filas por transacción antes de hacer COMMIT
+        max_errores_reportados: Cuántos errores de validación conservar en el reporte
+
+    Returns:
+        Diccionario con estadísticas de la carga
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA synchronous = NORMAL")
+    cursor.execute("PRAGMA cache_size = -65536")
+    cursor.execute("PRAGMA temp_store = MEMORY")
+
+    stats = {
+        "leidas": 0,
+        "validas": 0,
+        "invalidas": 0,
+        "escritas": 0,
+        "errores": [],
+    }
+    inicio = time.perf_counter()
+
+    cursor.execute("BEGIN")
+    migrar_esquema(conn)
+    indices = _suspender_indices(cursor)
+    eliminar_triggers(cursor)
+    cursor.execute("COMMIT")
+
+    cambios_iniciales = conn.total_changes
+    lote: List[Tuple] = []
+    en_transaccion = 0
+
+    try:
+        cursor.execute("BEGIN")
+        for registro in leer_registros(ruta, formato):
+            stats["leidas"] += 1
+            try:
+                lote.append(validar_fila(registro))
+            except FilaInvalida as e:
+                stats["invalidas"] += 1
+                if len(stats["errores"]) < max_errores_reportados:
+                    stats["errores"].append(f"fila {stats['leidas']}: {e}")
+                continue
+
+            if len(lote) >= tam_lote:
+                cursor.executemany(SQL_UPSERT, lote)
+                stats["validas"] += len(lote)
+                en_transaccion += len(lote)
+                lote = []
+
+                if en_transaccion >= filas_por_transaccion:
+                    cursor.execute("COMMIT")
+                    cursor.execute("BEGIN")
+                    en_transaccion = 0
+
+        if lote:
+            cursor.executemany(SQL_UPSERT, lote)
+            stats["validas"] += len(lote)
+        cursor.execute("COMMIT")
+        stats["escritas"] = conn.total_changes - cambios_iniciales
+    except Exception:
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        raise
+    finally:
+        # Mantenimiento diferido: índices y triggers se restauran una sola vez
+        cursor.execute("BEGIN")
+        _restaurar_indices(cursor, indices)
+        crear_triggers(cursor)
+        if conn.total_changes != cambios_iniciales:
+            reconstruir_conteos(cursor)
+            incrementar_version_catalogo(cursor)
+        cursor.execute("COMMIT")
+        cursor.execute("PRAGMA optimize")
+        conn.close()
+
+    stats["segundos"] = round(time.perf_counter() - inicio, 3)
+    stats["filas_por_segundo"] = (
+        round(stats["leidas"] / stats["segundos"]) if stats["segundos"] > 0 else 0
+    )
+    return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Carga masiva de propiedades (CSV, JSON o NDJSON) con upsert por external_id"
+    )
+    parser.add_argument("archivo", help="Archivo del catálogo")
+    parser.add_argument("--db", default=DB_PATH, help=f"Base de datos (por defecto {DB_PATH})")
+    parser.add_argument("--formato", choices=sorted(LECTORES), help="Forzar formato de entrada")
+    parser.add_argument("--lote", type=int, default=5000, help="Filas por executemany")
+    parser.add_argument(
+        "--filas-por-transaccion",
+        type=int,
+        default=100000,
+        help="Filas por transacción",
+    )
+    args = parser.parse_args(argv)
+
+    print(f"📥 Ingestando {args.archivo} en {args.db}...")
+    stats = ingestar(
+        args.archivo,
+        db_path=args.db,
+        formato=args.formato,
+        tam_lote=args.lote,
+        filas_por_transaccion=args.filas_por_transaccion,
+    )
+
+    print(f"✅ Filas leídas: {stats['leidas']}")
+    print(f"   - Válidas: {stats['validas']}")
+    print(f"   - Inválidas: {stats['invalidas']}")
+    print(f"   - Escritas (insertadas o modificadas): {stats['escritas']}")
+    print(f"   - Tiempo: {stats['segundos']} s ({stats['filas_por_segundo']} filas/s)")
+    for error in stats["errores"]:
+        print(f"   ⚠️  {error}")
+
+
+if __name__ == "__main__":
+    main()
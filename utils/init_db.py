@@ -1,9 +1,354 @@
 import sqlite3
 import os
 
+try:
+    from utils.helpers import normalizar_valor
+except ImportError:  # ejecutado como script desde utils/
+    from helpers import normalizar_valor
+
 DB_PATH = "../data/propiedades.db"
 
 
+def _columnas(cursor, tabla):
+    """Devuelve el conjunto de columnas de una tabla"""
+    cursor.execute(f"PRAGMA table_info({tabla})")
+    return {row[1] for row in cursor.fetchall()}
+
+
+# Letras acentuadas que normalizar_valor() reduce a su base; lower() de SQLite
+# solo convierte ASCII, así que se listan también las mayúsculas
+_ACENTOS = (("á", "a"), ("é", "e"), ("í", "i"), ("ó", "o"), ("ú", "u"), ("ü", "u"), ("ñ", "n"),
+            ("Á", "a"), ("É", "e"), ("Í", "i"), ("Ó", "o"), ("Ú", "u"), ("Ü", "u"), ("Ñ", "n"))
+
+
+def _normalizar_sql(expresion: str) -> str:
+    """
+    Equivalente en SQL de normalizar_valor() para los valores del catálogo
+    ('La Paz' -> 'la_paz', 'Cochabámba' -> 'cochabamba'). Es una aproximación:
+    no elimina otros signos ni colapsa espacios repetidos.
+    """
+    sql = f"lower(trim({expresion}))"
+    for letra, base in _ACENTOS:
+        sql = f"replace({sql}, '{letra}', '{base}')"
+    return f"replace({sql}, ' ', '_')"
+
+
+# Clave de ciudad para los conteos. `ciudad_norm` la calcula la aplicación con
+# normalizar_valor(); si un escritor externo no la llena, los triggers
+# trg_propiedades_norm_* la completan con la misma expresión, así que el conteo
+# y la búsqueda usan la misma clave.
+_CLAVE_CIUDAD = "COALESCE({fila}.ciudad_norm, " + _normalizar_sql("{fila}.ciudad") + ")"
+_DISPONIBLE = "COALESCE({fila}.disponible, 0)"
+_COMPLETAR_NORM = f"""
+            UPDATE propiedades SET
+                ciudad_norm = COALESCE(ciudad_norm, {_normalizar_sql("ciudad")}),
+                tipo_norm = COALESCE(tipo_norm, {_normalizar_sql("tipo")})
+            WHERE id = NEW.id;"""
+
+# Triggers sobre `propiedades`. Se pueden suspender durante cargas masivas
+# (ver utils/ingestar_propiedades.py) y recrear al terminar.
+TRIGGERS_PROPIEDADES = {
+    "trg_propiedades_version_ins": """
+        CREATE TRIGGER IF NOT EXISTS trg_propiedades_version_ins
+        AFTER INSERT ON propiedades
+        BEGIN
+            UPDATE catalogo_meta SET version = version + 1 WHERE id = 1;
+        END
+    """,
+    "trg_propiedades_version_upd": """
+        CREATE TRIGGER IF NOT EXISTS trg_propiedades_version_upd
+        AFTER UPDATE ON propiedades
+        BEGIN
+            UPDATE catalogo_meta SET version = version + 1 WHERE id = 1;
+        END
+    """,
+    "trg_propiedades_version_del": """
+        CREATE TRIGGER IF NOT EXISTS trg_propiedades_version_del
+        AFTER DELETE ON propiedades
+        BEGIN
+            UPDATE catalogo_meta SET version = version + 1 WHERE id = 1;
+        END
+    """,
+    # ciudad_norm/tipo_norm de filas escritas sin ellas (sqlite3, otros scripts)
+    "trg_propiedades_norm_ins": f"""
+        CREATE TRIGGER IF NOT EXISTS trg_propiedades_norm_ins
+        AFTER INSERT ON propiedades
+        WHEN NEW.ciudad_norm IS NULL OR NEW.tipo_norm IS NULL
+        BEGIN{_COMPLETAR_NORM}
+        END
+    """,
+    "trg_propiedades_norm_upd": f"""
+        CREATE TRIGGER IF NOT EXISTS trg_propiedades_norm_upd
+        AFTER UPDATE ON propiedades
+        WHEN NEW.ciudad_norm IS NULL OR NEW.tipo_norm IS NULL
+        BEGIN{_COMPLETAR_NORM}
+        END
+    """,
+    # Conteos materializados por (ciudad_norm, tipo, disponible)
+    "trg_propiedades_conteo_ins": f"""
+        CREATE TRIGGER IF NOT EXISTS trg_propiedades_conteo_ins
+        AFTER INSERT ON propiedades
+        BEGIN
+            INSERT INTO conteo_propiedades (ciudad_norm, tipo, disponible, cantidad)
+            VALUES ({_CLAVE_CIUDAD.format(fila="NEW")}, NEW.tipo, {_DISPONIBLE.format(fila="NEW")}, 1)
+            ON CONFLICT (ciudad_norm, tipo, disponible) DO UPDATE SET cantidad = cantidad + 1;
+        END
+    """,
+    "trg_propiedades_conteo_upd": f"""
+        CREATE TRIGGER IF NOT EXISTS trg_propiedades_conteo_upd
+        AFTER UPDATE OF ciudad, ciudad_norm, tipo, disponible ON propiedades
+        BEGIN
+            UPDATE conteo_propiedades SET cantidad = cantidad - 1
+            WHERE ciudad_norm = {_CLAVE_CIUDAD.format(fila="OLD")}
+              AND tipo = OLD.tipo AND disponible = {_DISPONIBLE.format(fila="OLD")};
+            DELETE FROM conteo_propiedades WHERE cantidad <= 0;
+            INSERT INTO conteo_propiedades (ciudad_norm, tipo, disponible, cantidad)
+            VALUES ({_CLAVE_CIUDAD.format(fila="NEW")}, NEW.tipo, {_DISPONIBLE.format(fila="NEW")}, 1)
+            ON CONFLICT (ciudad_norm, tipo, disponible) DO UPDATE SET cantidad = cantidad + 1;
+        END
+    """,
+    "trg_propiedades_conteo_del": f"""
+        CREATE TRIGGER IF NOT EXISTS trg_propiedades_conteo_del
+        AFTER DELETE ON propiedades
+        BEGIN
+            UPDATE conteo_propiedades SET cantidad = cantidad - 1
+            WHERE ciudad_norm = {_CLAVE_CIUDAD.format(fila="OLD")}
+              AND tipo = OLD.tipo AND disponible = {_DISPONIBLE.format(fila="OLD")};
+            DELETE FROM conteo_propiedades WHERE cantidad <= 0;
+        END
+    """,
+}
+
+# Los sinónimos cambian el resultado de las búsquedas: editarlos también
+# cambia la versión del catálogo (invalida cachés y la tabla en memoria)
+TRIGGERS_SINONIMOS = {
+    f"trg_sinonimos_version_{sufijo}": f"""
+        CREATE TRIGGER IF NOT EXISTS trg_sinonimos_version_{sufijo}
+        AFTER {evento} ON sinonimos_busqueda
+        BEGIN
+            UPDATE catalogo_meta SET version = version + 1 WHERE id = 1;
+        END
+    """
+    for sufijo, evento in (("ins", "INSERT"), ("upd", "UPDATE"), ("del", "DELETE"))
+}
+
+
+
+SINONIMOS_INICIALES = [
+    ("tipo", "casas", "casa"),
+    ("tipo", "depto", "departamento"),
+    ("tipo", "deptos", "departamento"),
+    ("tipo", "dpto", "departamento"),
+    ("tipo", "depa", "departamento"),
+    ("tipo", "departamentos", "departamento"),
+    ("tipo", "apartamento", "departamento"),
+    ("tipo", "terrenos", "terreno"),
+    ("tipo", "lote", "terreno"),
+    ("ciudad", "lp", "la_paz"),
+    ("ciudad", "lpz", "la_paz"),
+    ("ciudad", "paz", "la_paz"),
+    ("ciudad", "scz", "santa_cruz"),
+    ("ciudad", "santa_cruz_de_la_sierra", "santa_cruz"),
+    ("ciudad", "cbba", "cochabamba"),
+    ("ciudad", "cocha", "cochabamba"),
+]
+
+
+def crear_triggers(cursor):
+    """Crea (si no existen) los triggers de mantenimiento de `propiedades`"""
+    for sql in TRIGGERS_PROPIEDADES.values():
+        cursor.execute(sql)
+
+
+def actualizar_triggers(cursor) -> bool:
+    """
+    Recrea los triggers cuya definición cambió (o que faltan).
+
+    Returns:
+        True si se recreó alguno
+    """
+    recreados = False
+    for nombre, sql in {**TRIGGERS_PROPIEDADES, **TRIGGERS_SINONIMOS}.items():
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (nombre,))
+        fila = cursor.fetchone()
+        esperado = " ".join(sql.replace("IF NOT EXISTS ", "").split())
+        if fila is None or " ".join(fila[0].split()) != esperado:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+            cursor.execute(sql)
+            recreados = True
+    return recreados
+
+
+def eliminar_triggers(cursor):
+    """Elimina los triggers de mantenimiento de `propiedades`"""
+    for nombre in TRIGGERS_PROPIEDADES:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+
+
+def incrementar_version_catalogo(cursor):
+    """Marca el catálogo como modificado (invalida snapshots en memoria)"""
+    cursor.execute("UPDATE catalogo_meta SET version = version + 1 WHERE id = 1")
+
+
+def reconstruir_conteos(cursor):
+    """Recalcula desde cero la tabla de conteos materializados"""
+    cursor.execute("DELETE FROM conteo_propiedades")
+    cursor.execute(
+        f"""
+        INSERT INTO conteo_propiedades (ciudad_norm, tipo, disponible, cantidad)
+        SELECT {_CLAVE_CIUDAD.format(fila="propiedades")}, tipo,
+               {_DISPONIBLE.format(fila="propiedades")}, COUNT(*)
+        FROM propiedades
+        GROUP BY 1, 2, 3
+    """
+    )
+
+
+def migrar_esquema(conn):
+    """
+    Aplica de forma idempotente los cambios de esquema posteriores a la
+    creación inicial de las tablas (columnas e índices nuevos).
+    """
+    cursor = conn.cursor()
+
+    # Identificador del listado en el catálogo externo (ingesta masiva)
+    if "external_id" not in _columnas(cursor, "propiedades"):
+        cursor.execute("ALTER TABLE propiedades ADD COLUMN external_id TEXT")
+    cursor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_propiedades_external_id ON propiedades(external_id)"
+    )
+
+    # Versión del catálogo: cambia con cada escritura sobre `propiedades`
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS catalogo_meta (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """
+    )
+    cursor.execute("INSERT OR IGNORE INTO catalogo_meta (id, version) VALUES (1, 0)")
+
+    # Ciudad y tipo normalizados (sin acentos ni mayúsculas) para búsquedas
+    # por igualdad sobre índices en lugar de LIKE '%x%'
+    columnas = _columnas(cursor, "propiedades")
+    for columna_norm, columna in (("ciudad_norm", "ciudad"), ("tipo_norm", "tipo")):
+        if columna_norm not in columnas:
+            cursor.execute(f"ALTER TABLE propiedades ADD COLUMN {columna_norm} TEXT")
+        cursor.execute(f"SELECT id, {columna} FROM propiedades WHERE {columna_norm} IS NULL")
+        pendientes = [(normalizar_valor(valor), id_) for id_, valor in cursor.fetchall()]
+        if pendientes:
+            cursor.executemany(
+                f"UPDATE propiedades SET {columna_norm} = ? WHERE id = ?", pendientes
+            )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_propiedades_ciudad_tipo
+        ON propiedades(ciudad_norm, tipo_norm, precio) WHERE disponible = 1
+    """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_propiedades_tipo
+        ON propiedades(tipo_norm, precio) WHERE disponible = 1
+    """
+    )
+
+    # Sinónimos de búsqueda: alias normalizado -> valor canónico normalizado
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sinonimos_busqueda (
+            campo TEXT NOT NULL CHECK(campo IN ('ciudad', 'tipo')),
+            alias TEXT NOT NULL,
+            canonico TEXT NOT NULL,
+            PRIMARY KEY (campo, alias)
+        ) WITHOUT ROWID
+    """
+    )
+    cursor.executemany(
+        "INSERT OR IGNORE INTO sinonimos_busqueda (campo, alias, canonico) VALUES (?, ?, ?)",
+        SINONIMOS_INICIALES,
+    )
+
+    # Conteos materializados, mantenidos por triggers
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'conteo_propiedades'"
+    )
+    conteos_existentes = cursor.fetchone() is not None
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS conteo_propiedades (
+            ciudad_norm TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            disponible INTEGER NOT NULL,
+            cantidad INTEGER NOT NULL,
+            PRIMARY KEY (ciudad_norm, tipo, disponible)
+        ) WITHOUT ROWID
+    """
+    )
+
+    # Correspondencia propiedad -> fila de la matriz de embeddings
+    # (ver utils/indice_semantico.py)
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS embeddings_propiedades (
+            propiedad_id INTEGER PRIMARY KEY,
+            fila INTEGER NOT NULL UNIQUE,
+            huella TEXT NOT NULL,
+            lista INTEGER
+        )
+    """
+    )
+
+    # Retención por usuario (ver utils/archivar_conversaciones.py).
+    # dias_inactividad NULL = nunca archivar; dias_conservacion NULL = conservar siempre
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS politicas_retencion (
+            usuario_id INTEGER PRIMARY KEY,
+            dias_inactividad INTEGER,
+            dias_conservacion INTEGER,
+            FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+        )
+    """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_conversaciones_actualizacion ON conversaciones(fecha_actualizacion)"
+    )
+
+    # Consumo de cada llamada al modelo, ligado al mensaje del asistente que
+    # produjo (NULL si el turno terminó sin respuesta). usuario_id y
+    # conversacion_id se copian para agregar sin JOIN y para que el registro
+    # sobreviva al archivado de la conversación.
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS uso_llm (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mensaje_id INTEGER,
+            conversacion_id INTEGER,
+            usuario_id INTEGER,
+            etapa TEXT NOT NULL,
+            modelo TEXT,
+            tool TEXT,
+            tokens_prompt INTEGER,
+            tokens_generados INTEGER,
+            ms_carga REAL,
+            ms_prompt REAL,
+            ms_generacion REAL,
+            ms_total REAL,
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_uso_llm_usuario ON uso_llm(usuario_id, fecha_creacion)"
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_uso_llm_mensaje ON uso_llm(mensaje_id)")
+
+    if actualizar_triggers(cursor) or not conteos_existentes:
+        reconstruir_conteos(cursor)
+
+
 def inicializar_db():
     """Crea la base de datos y tabla de propiedades con datos de ejemplo"""
 
@@ -79,6 +424,8 @@ def inicializar_db():
         "CREATE INDEX IF NOT EXISTS idx_mensajes_conversacion ON mensajes(conversacion_id)"
     )
 
+    migrar_esquema(conn)
+
     # Verificar si ya hay datos
     cursor.execute("SELECT COUNT(*) FROM propiedades")
     if cursor.fetchone()[0] == 0:
@@ -155,10 +502,14 @@ def inicializar_db():
         cursor.executemany(
             """
             INSERT INTO propiedades 
-            (tipo, ciudad, zona, precio, dormitorios, banos, area_m2, descripcion, disponible)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            (tipo, ciudad, zona, precio, dormitorios, banos, area_m2, descripcion, disponible,
+             ciudad_norm, tipo_norm)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """,
-            propiedades_ejemplo,
+            [
+                (*p, normalizar_valor(p[1]), normalizar_valor(p[0]))
+                for p in propiedades_ejemplo
+            ],
         )
 
         print(
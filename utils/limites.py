@@ -0,0 +1,229 @@
+"""
+Límites de uso para /chat: token buckets por usuario y por IP y cuota diaria
+de tokens del modelo.
+
+Los buckets viven en memoria del proceso o en un archivo SQLite compartido por
+todos los workers del host (Config.RATE_LIMIT_BACKEND). Un lote cuesta una
+ficha por mensaje: si el bucket está lleno se admite aunque cueste más que la
+ráfaga, y el saldo queda negativo hasta que se recupere. La cuota diaria se
+calcula con lo registrado en `uso_llm` y se cachea unos segundos, así que
+verificar una petición no llama al modelo ni escribe en la base principal.
+"""
+
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from config import Config
+from utils.cache import ConexionPorHilo, obtener_cache
+from utils.database_helpers import get_db_connection
+
+
+class BucketsMemoria:
+    """Token buckets en memoria del proceso, acotados a `max_claves` (LRU)"""
+
+    def __init__(self, max_claves: int = 100000):
+        self.max_claves = max_claves
+        # clave -> (fichas, actualizado, capacidad, por_segundo)
+        self._buckets: "OrderedDict[str, Tuple[float, float, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consumir(self, clave: str, capacidad: float, por_segundo: float, costo: float = 1) -> float:
+        """
+        Intenta consumir `costo` fichas del bucket.
+
+        Returns:
+            0 si se permitió; si no, segundos hasta que haya fichas suficientes
+        """
+        ahora = time.monotonic()
+        # Un costo mayor que la ráfaga se admite con el bucket lleno (queda en deuda)
+        necesarias = min(costo, capacidad)
+        with self._lock:
+            nueva = clave not in self._buckets
+            fichas, antes = self._buckets[clave][:2] if not nueva else (capacidad, ahora)
+            fichas = min(capacidad, fichas + (ahora - antes) * por_segundo)
+            espera = 0.0
+            if fichas >= necesarias:
+                fichas -= costo
+            else:
+                espera = (necesarias - fichas) / por_segundo
+            self._buckets[clave] = (fichas, ahora, capacidad, por_segundo)
+            self._buckets.move_to_end(clave)
+            if nueva and len(self._buckets) > self.max_claves:
+                self._purgar(ahora)
+            return espera
+
+    def _purgar(self, ahora: float):
+        # Un bucket lleno (según su propia capacidad) equivale a uno inexistente
+        self._buckets = OrderedDict(
+            (k, v) for k, v in self._buckets.items()
+            if v[0] + (ahora - v[1]) * v[3] < v[2]
+        )
+        if len(self._buckets) > self.max_claves:
+            # Todos en uso: se descartan los menos recientes, con margen para no
+            # recorrer el diccionario en cada clave nueva
+            while len(self._buckets) > self.max_claves * 0.9:
+                self._buckets.popitem(last=False)
+
+
+class BucketsSQLite:
+    """Token buckets en un archivo SQLite compartido entre procesos del host"""
+
+    # Cada cuántos segundos se borran los buckets que ya se llenaron
+    INTERVALO_PURGA = 60
+
+    def __init__(self, ruta: str = "data/limites.db"):
+        self.ruta = ruta
+        self._conexion = ConexionPorHilo(ruta)
+        self._proxima_purga = 0.0
+        conn = self._conexion()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS buckets (
+                clave TEXT PRIMARY KEY,
+                fichas REAL NOT NULL,
+                actualizado REAL NOT NULL,
+                lleno_en REAL NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        """
+        )
+        columnas = {fila[1] for fila in conn.execute("PRAGMA table_info(buckets)")}
+        if "lleno_en" not in columnas:
+            conn.execute("ALTER TABLE buckets ADD COLUMN lleno_en REAL NOT NULL DEFAULT 0")
+
+    def consumir(self, clave: str, capacidad: float, por_segundo: float, costo: float = 1) -> float:
+        conn = self._conexion()
+        # Reloj de pared: tiene que ser comparable entre procesos
+        ahora = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            fila = conn.execute(
+                "SELECT fichas, actualizado FROM buckets WHERE clave = ?", (clave,)
+            ).fetchone()
+            fichas, antes = fila if fila else (capacidad, ahora)
+            fichas = min(capacidad, fichas + max(0.0, ahora - antes) * por_segundo)
+            necesarias = min(costo, capacidad)
+            espera = 0.0
+            if fichas >= necesarias:
+                fichas -= costo
+            else:
+                espera = (necesarias - fichas) / por_segundo
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (clave, fichas, actualizado, lleno_en) VALUES (?, ?, ?, ?)",
+                (clave, fichas, ahora, ahora + (capacidad - fichas) / por_segundo),
+            )
+            if ahora >= self._proxima_purga:
+                # Un bucket lleno equivale a uno inexistente: se pueden borrar
+                self._proxima_purga = ahora + self.INTERVALO_PURGA
+                conn.execute("DELETE FROM buckets WHERE lleno_en < ?", (ahora,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return espera
+
+
+def tokens_usados_hoy(usuario_id) -> int:
+    """Tokens de prompt y generados por el usuario desde el inicio del día (UTC)"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT COALESCE(SUM(COALESCE(tokens_prompt, 0) + COALESCE(tokens_generados, 0)), 0)
+            FROM uso_llm
+            WHERE usuario_id = ? AND fecha_creacion >= date('now')
+            """,
+            (usuario_id,),
+        )
+        return cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+
+class LimitadorChat:
+    """Aplica los límites por usuario, por IP y la cuota diaria de tokens"""
+
+    def __init__(self, backend: Optional[str] = None):
+        backend = (backend or Config.RATE_LIMIT_BACKEND).lower()
+        if backend == "memoria":
+            self.buckets = BucketsMemoria()
+        elif backend == "sqlite":
+            self.buckets = BucketsSQLite(Config.RATE_LIMIT_URL or "data/limites.db")
+        elif backend == "ninguno":
+            self.buckets = None
+        else:
+            raise ValueError(f"Backend de límites desconocido: '{backend}'")
+        self.backend = backend
+        self._rechazos: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _rechazar(self, motivo: str, mensaje: str, espera: float) -> Tuple[str, int]:
+        with self._lock:
+            self._rechazos[motivo] += 1
+        return mensaje, max(1, int(espera + 0.999))
+
+    def _cuota_usada(self, usuario_id) -> int:
+        cache = obtener_cache()
+        usados = cache.get("cuotas", str(usuario_id))
+        if usados is None:
+            usados = tokens_usados_hoy(usuario_id)
+            cache.set("cuotas", str(usuario_id), usados, ttl=Config.CUOTA_CACHE_SEG)
+        return usados
+
+    def verificar(self, usuario_id=None, ip: Optional[str] = None) -> Optional[Tuple[str, int]]:
+        """
+        Verifica si la petición puede pasar.
+
+        Returns:
+            None si se permite, o (mensaje, segundos para reintentar)
+        """
+        return self.verificar_lote({usuario_id: 1}, ip)
+
+    def verificar_lote(
+        self, mensajes_por_usuario: Dict[Hashable, int], ip: Optional[str] = None
+    ) -> Optional[Tuple[str, int]]:
+        """
+        Verifica un lote: cada mensaje cuesta una ficha del bucket de la IP y
+        otra del bucket de su usuario, y cada usuario debe tener cuota.
+
+        Args:
+            mensajes_por_usuario: Cantidad de mensajes por usuario_id (None = sin usuario)
+
+        Returns:
+            None si se permite, o (mensaje, segundos para reintentar)
+        """
+        if self.buckets is not None:
+            total = sum(mensajes_por_usuario.values())
+            if ip and Config.RATE_IP_POR_MIN > 0:
+                espera = self.buckets.consumir(
+                    f"ip:{ip}", Config.RATE_IP_RAFAGA, Config.RATE_IP_POR_MIN / 60, costo=total
+                )
+                if espera:
+                    return self._rechazar("ip", "Demasiadas peticiones desde esta IP", espera)
+            if Config.RATE_USUARIO_POR_MIN > 0:
+                for usuario_id, cantidad in mensajes_por_usuario.items():
+                    if usuario_id is None:
+                        continue
+                    espera = self.buckets.consumir(
+                        f"usuario:{usuario_id}",
+                        Config.RATE_USUARIO_RAFAGA,
+                        Config.RATE_USUARIO_POR_MIN / 60,
+                        costo=cantidad,
+                    )
+                    if espera:
+                        return self._rechazar("usuario", "Demasiadas peticiones para este usuario", espera)
+
+        if Config.CUOTA_TOKENS_DIARIA > 0:
+            for usuario_id in mensajes_por_usuario:
+                if usuario_id is not None and self._cuota_usada(usuario_id) >= Config.CUOTA_TOKENS_DIARIA:
+                    # Reintentar a partir de la medianoche UTC
+                    espera = 86400 - time.time() % 86400
+                    return self._rechazar("cuota", "Cuota diaria de uso del modelo agotada", espera)
+
+        return None
+
+    def metricas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": self.backend, "rechazos": dict(self._rechazos)}
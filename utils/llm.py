@@ -0,0 +1,280 @@
+"""
+Construcción perezosa del modelo y de la cadena de prompts, e invocación con
+plazos, circuit breaker y hedging.
+
+Importar langchain_ollama tarda más de un segundo, así que ni el import ni
+ChatOllama se crean hasta la primera llamada que los necesita.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+from config import Config
+from prompts.system_prompts import generar_system_prompt, generar_system_prompt_charla
+from utils.resiliencia import (
+    CircuitBreaker,
+    CircuitoAbierto,
+    Deadline,
+    DeadlineExcedido,
+    VentanaLatencias,
+)
+
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_llms = {}
+_chains = {}
+
+
+def obtener_llm(modelo: str = None, base_url: str = None):
+    """Devuelve (creándolo la primera vez) el ChatOllama para un modelo y backend"""
+    modelo = modelo or Config.MODEL_NAME
+    base_url = base_url or Config.OLLAMA_BASE_URL
+    with _lock:
+        if (modelo, base_url) not in _llms:
+            import httpx
+            from langchain_ollama import ChatOllama
+
+            logger.info("Inicializando modelo %s (%s)", modelo, base_url)
+            _llms[(modelo, base_url)] = ChatOllama(
+                model=modelo,
+                temperature=Config.MODEL_TEMPERATURE,
+                base_url=base_url,
+                keep_alive=Config.OLLAMA_KEEP_ALIVE,
+                client_kwargs={
+                    "timeout": httpx.Timeout(
+                        Config.LLM_TIMEOUT_LECTURA, connect=Config.LLM_TIMEOUT_CONEXION
+                    )
+                },
+            )
+        return _llms[(modelo, base_url)]
+
+
+def obtener_chain(tools, modelo: str = None, base_url: str = None, charla: bool = False):
+    """
+    Devuelve la cadena system prompt + modelo para las tools dadas.
+
+    Con charla=True usa el prompt sin instrucciones de tools (etapa de charla).
+    """
+    modelo = modelo or Config.MODEL_NAME
+    base_url = base_url or Config.OLLAMA_BASE_URL
+    llm = obtener_llm(modelo, base_url)
+    clave = (modelo, base_url, charla)
+    with _lock:
+        if clave not in _chains:
+            from langchain_core.prompts import ChatPromptTemplate
+
+            sistema = generar_system_prompt_charla() if charla else generar_system_prompt(tools)
+            prompt = ChatPromptTemplate.from_messages([("system", sistema), ("human", "{input}")])
+            _chains[clave] = prompt | llm
+        return _chains[clave]
+
+
+def extraer_uso(respuesta, etapa: str, tool: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Extrae el consumo de una respuesta de Ollama (`response_metadata`).
+
+    Ollama reporta las duraciones en nanosegundos; se guardan en milisegundos.
+    Los campos ausentes quedan en None.
+
+    Args:
+        respuesta: Mensaje devuelto por `chain.invoke`
+        etapa: Llamada dentro del turno ('ruteo', 'respuesta', ...)
+        tool: Tool usada en el turno, si hubo
+    """
+    meta = getattr(respuesta, "response_metadata", None) or {}
+    tokens = getattr(respuesta, "usage_metadata", None) or {}
+
+    def ms(campo):
+        valor = meta.get(campo)
+        return round(valor / 1e6, 3) if valor is not None else None
+
+    return {
+        "etapa": etapa,
+        "modelo": meta.get("model") or Config.MODEL_NAME,
+        "tool": tool,
+        "tokens_prompt": meta.get("prompt_eval_count", tokens.get("input_tokens")),
+        "tokens_generados": meta.get("eval_count", tokens.get("output_tokens")),
+        "ms_carga": ms("load_duration"),
+        "ms_prompt": ms("prompt_eval_duration"),
+        "ms_generacion": ms("eval_duration"),
+        "ms_total": ms("total_duration"),
+    }
+
+
+# ===== INVOCACIÓN CON PLAZOS, CIRCUIT BREAKER Y HEDGING =====
+
+_circuitos: Dict[str, CircuitBreaker] = {}
+_latencias: Dict[str, VentanaLatencias] = {}
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm")
+
+
+def backends() -> List[str]:
+    """Backends de Ollama: el principal y, si está configurado, el de hedging"""
+    urls = [Config.OLLAMA_BASE_URL]
+    if Config.OLLAMA_HEDGE_URL and Config.OLLAMA_HEDGE_URL != Config.OLLAMA_BASE_URL:
+        urls.append(Config.OLLAMA_HEDGE_URL)
+    return urls
+
+
+def circuito(base_url: str) -> CircuitBreaker:
+    with _lock:
+        if base_url not in _circuitos:
+            _circuitos[base_url] = CircuitBreaker(
+                base_url,
+                max_fallos=Config.CIRCUITO_MAX_FALLOS,
+                enfriamiento=Config.CIRCUITO_ENFRIAMIENTO_SEG,
+            )
+        return _circuitos[base_url]
+
+
+def latencias(etapa: str) -> VentanaLatencias:
+    with _lock:
+        return _latencias.setdefault(etapa, VentanaLatencias())
+
+
+def plazo_etapa(etapa: str) -> float:
+    """Plazo total de una etapa (Config.LLM_DEADLINE_<ETAPA>, o el de la petición)"""
+    return getattr(Config, f"LLM_DEADLINE_{etapa.upper()}", Config.CHAT_DEADLINE_SEG)
+
+
+def estado_backends() -> Dict[str, Any]:
+    """Estado de los circuitos y percentiles de latencia por etapa"""
+    return {
+        "circuitos": {url: circuito(url).resumen() for url in backends()},
+        "latencias": {
+            etapa: {
+                "muestras": len(ventana),
+                "p50_seg": ventana.percentil(50),
+                "p95_seg": ventana.percentil(95),
+            }
+            for etapa, ventana in list(_latencias.items())
+        },
+    }
+
+
+class _Intento:
+    """Llamada a un backend; su resultado se registra en el circuito una sola vez"""
+
+    __slots__ = ("url", "prueba", "_registrado", "_lock")
+
+    def __init__(self, url: str, prueba: bool):
+        self.url = url
+        self.prueba = prueba
+        self._registrado = False
+        self._lock = threading.Lock()
+
+    def registrar(self, exito: bool):
+        with self._lock:
+            if self._registrado:
+                return
+            self._registrado = True
+        if exito:
+            circuito(self.url).registrar_exito()
+        else:
+            circuito(self.url).registrar_fallo()
+
+    def abandonar(self, futuro, vencido: bool):
+        """
+        Deja de esperar la llamada. Si seguía en cola se cancela y, si era la
+        prueba del semiabierto, se libera; si ya corría y venció el plazo,
+        cuenta como fallo (su resultado tardío se ignora).
+        """
+        if futuro.cancel():
+            with self._lock:
+                self._registrado = True
+            if self.prueba:
+                circuito(self.url).liberar_prueba()
+        elif vencido:
+            self.registrar(False)
+
+
+def _llamar(tools, entrada, modelo, intento: _Intento, etapa):
+    inicio = time.monotonic()
+    try:
+        respuesta = obtener_chain(tools, modelo, intento.url, charla=etapa == "charla").invoke(entrada)
+    except Exception:
+        intento.registrar(False)
+        raise
+    intento.registrar(True)
+    latencias(etapa).registrar(time.monotonic() - inicio)
+    return respuesta
+
+
+def invocar_chain(
+    tools,
+    entrada: Dict[str, Any],
+    etapa: str,
+    deadline: Optional[Deadline] = None,
+    modelo: str = None,
+):
+    """
+    Invoca la cadena con el plazo de la etapa, acotado por el de la petición.
+
+    Salta los backends con el circuito abierto. Si hay un backend de hedging
+    y la llamada supera el p95 de latencias de la etapa, envía un duplicado
+    al segundo backend y se queda con la primera respuesta.
+
+    Raises:
+        CircuitoAbierto: si todos los backends están marcados como caídos
+        DeadlineExcedido: si no hubo respuesta a tiempo
+    """
+    deadline = deadline or Deadline(Config.CHAT_DEADLINE_SEG)
+    fin = time.monotonic() + deadline.limitar(plazo_etapa(etapa))
+    candidatos = backends()
+    intentos: Dict[Any, _Intento] = {}
+
+    def lanzar_siguiente():
+        # Se reserva justo antes de llamar: en semiabierto reserva la prueba
+        while candidatos:
+            url = candidatos.pop(0)
+            reserva = circuito(url).reservar()
+            if reserva is not None:
+                intento = _Intento(url, prueba=reserva == "prueba")
+                futuro = _executor.submit(_llamar, tools, entrada, modelo, intento, etapa)
+                intentos[futuro] = intento
+                return futuro
+        return None
+
+    primero = lanzar_siguiente()
+    if primero is None:
+        raise CircuitoAbierto("Todos los backends de Ollama están marcados como caídos")
+    pendientes = {primero}
+
+    hedge_tras = None
+    ventana = latencias(etapa)
+    if candidatos and len(ventana) >= Config.HEDGE_MIN_MUESTRAS:
+        hedge_tras = ventana.percentil(Config.HEDGE_PERCENTIL)
+
+    error: Optional[BaseException] = None
+    inicio = time.monotonic()
+    while pendientes:
+        espera = fin - time.monotonic()
+        if hedge_tras is not None:
+            espera = min(espera, inicio + hedge_tras - time.monotonic())
+        listos, pendientes = wait(pendientes, timeout=max(0.0, espera), return_when=FIRST_COMPLETED)
+
+        for futuro in listos:
+            if futuro.exception() is None:
+                for otro in pendientes:
+                    intentos[otro].abandonar(otro, vencido=False)
+                return futuro.result()
+            error = futuro.exception()
+
+        if time.monotonic() >= fin:
+            for futuro in pendientes:
+                intentos[futuro].abandonar(futuro, vencido=True)
+            raise DeadlineExcedido(f"La etapa '{etapa}' superó su plazo")
+
+        if not pendientes or (hedge_tras is not None and time.monotonic() - inicio >= hedge_tras):
+            # Falló el backend anterior, o va más lento que el p95: probar el siguiente
+            hedge_tras = None
+            siguiente = lanzar_siguiente()
+            if siguiente is not None:
+                pendientes.add(siguiente)
+
+    raise error
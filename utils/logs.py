@@ -0,0 +1,143 @@
+"""
+Logging estructurado y no bloqueante.
+
+Los registros se encolan con un QueueHandler y un QueueListener en segundo
+plano los formatea y escribe, así la petición no espera por stdout. Cada
+línea es un JSON con nivel, logger, mensaje, request_id y los campos extra.
+
+    LOG_LEVEL           nivel mínimo (independiente de FLASK_DEBUG)
+    LOG_FORMATO         'json' o 'texto'
+    LOG_MAX_CARACTERES  recorte de textos largos (mensajes, respuestas); 0 = ocultarlos
+    LOG_MUESTREO        fracción de payloads de nivel DEBUG que se registran
+
+Uso:
+    logger = logging.getLogger(__name__)
+    logger.info("Tool ejecutada", extra={"tool": nombre, "ms": 12.3})
+    logger.debug("Respuesta: %s", Recortado(texto))
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+from config import Config
+
+
+request_id_actual: contextvars.ContextVar = contextvars.ContextVar("request_id", default=None)
+
+# Atributos propios de LogRecord; el resto son campos pasados con extra=
+_ATRIBUTOS_RECORD = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def nuevo_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class Recortado:
+    """
+    Texto que se recorta (o se oculta) solo si el registro llega a emitirse.
+
+    Con LOG_MAX_CARACTERES = 0 solo se muestra la longitud.
+    """
+
+    __slots__ = ("texto",)
+
+    def __init__(self, texto):
+        self.texto = texto
+
+    def __str__(self):
+        texto = "" if self.texto is None else str(self.texto)
+        limite = Config.LOG_MAX_CARACTERES
+        if limite <= 0:
+            return f"<{len(texto)} caracteres>"
+        if len(texto) <= limite:
+            return texto
+        return f"{texto[:limite]}… (+{len(texto) - limite})"
+
+
+def muestrear() -> bool:
+    """True para la fracción LOG_MUESTREO de payloads verbosos que se registran"""
+    return random.random() < Config.LOG_MUESTREO
+
+
+class FiltroContexto(logging.Filter):
+    """Agrega el request_id del contexto actual a cada registro"""
+
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_actual.get()
+        return True
+
+
+class FormatoJSON(logging.Formatter):
+    def format(self, record):
+        datos = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            datos["request_id"] = record.request_id
+        for clave, valor in record.__dict__.items():
+            if clave not in _ATRIBUTOS_RECORD and clave != "request_id":
+                datos[clave] = valor
+        if record.exc_info:
+            datos["exc"] = self.formatException(record.exc_info)
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class _Encolador(logging.handlers.QueueHandler):
+    """QueueHandler que no formatea: el mensaje se arma en el hilo del listener"""
+
+    def prepare(self, record):
+        # La cola es en memoria (no se serializa), así que el registro viaja tal cual.
+        # Los argumentos deben ser inmutables o Recortado, que se evalúa al emitir.
+        return record
+
+
+def configurar_logging(nivel: Optional[str] = None, formato: Optional[str] = None):
+    """
+    Configura el logger raíz con un QueueHandler. Idempotente.
+
+    Args:
+        nivel: Nivel mínimo (por defecto Config.LOG_LEVEL)
+        formato: 'json' o 'texto' (por defecto Config.LOG_FORMATO)
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    salida = logging.StreamHandler(sys.stdout)
+    if (formato or Config.LOG_FORMATO).lower() == "json":
+        salida.setFormatter(FormatoJSON())
+    else:
+        salida.setFormatter(
+            logging.Formatter("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s")
+        )
+
+    cola: queue.Queue = queue.Queue(-1)
+    encolador = _Encolador(cola)
+    # El request_id se toma en el hilo que registra, no en el del listener
+    encolador.addFilter(FiltroContexto())
+
+    raiz = logging.getLogger()
+    raiz.handlers[:] = [encolador]
+    raiz.setLevel((nivel or Config.LOG_LEVEL).upper())
+    # El log de accesos de werkzeug duplica lo que ya registra la app
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(cola, salida, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
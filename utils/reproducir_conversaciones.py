@@ -0,0 +1,392 @@
+"""
+Reproduce turnos reales de usuario bajo dos configuraciones y compara.
+
+Lee los mensajes de usuario de la tabla `mensajes` (o de un archivo NDJSON /
+texto plano) y los pasa por `procesar_chat` con cada configuración. Reporta
+lado a lado la distribución de latencias, llamadas al modelo por turno, tokens
+y los turnos en que cambia la tool elegida.
+
+Una configuración es un JSON (o la ruta a un archivo .json) con valores de
+Config a sobrescribir, más dos claves especiales:
+    PROMPT   "modulo:funcion" alternativa a generar_system_prompt(tools)
+    TOOLS    lista con los nombres de las tools habilitadas
+
+Se trabaja sobre una copia temporal de la base de datos, con un índice
+semántico propio y sin caché, para no tocar datos reales ni medir aciertos de
+caché.
+
+Uso:
+    python -m utils.reproducir_conversaciones --limite 50 \\
+        --a '{}' --b '{"MODEL_RUTEO": "llama3.2:1b"}'
+    python -m utils.reproducir_conversaciones --fixture turnos.ndjson --simulado \\
+        --a '{}' --b '{"PROMPT": "prompts.experimento:generar_system_prompt"}'
+"""
+
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import re
+import shutil
+import statistics
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from config import Config
+import utils.database_helpers as database_helpers
+import utils.indice_semantico as indice_semantico
+import utils.llm as llm
+
+
+# ===== MODELO SIMULADO =====
+
+
+class _Respuesta:
+    def __init__(self, content: str, response_metadata: Dict[str, Any]):
+        self.content = content
+        self.response_metadata = response_metadata
+
+
+class ModeloSimulado:
+    """
+    Sustituto local de la cadena de Ollama para reproducir sin modelo.
+
+    Elige tools con reglas por palabras clave y simula tokens y latencia
+    proporcionales al texto, de modo que los cambios de cableado y de prompt
+    se reflejan en las métricas aunque no haya un modelo real.
+    """
+
+    REGLAS = (
+        (r"rekaliber", "obtener_info_rekaliber", ()),
+        (r"kristof", "obtener_info_kristof", ()),
+        (r"cu[aá]nt[oa]s", "contar_propiedades", ("ciudad",)),
+        (r"casa|departamento|terreno|propiedad", "buscar_propiedades", ("tipo", "ciudad")),
+    )
+    TIPOS = ("casa", "departamento", "terreno")
+    CIUDADES = ("la paz", "cochabamba", "santa cruz", "sucre", "oruro", "tarija", "potosi")
+
+    def __init__(self, modelo: str, tools, system_prompt: str, seg_por_token: float = 0.0):
+        self.modelo = modelo
+        self.nombres_tools = {t.name for t in tools}
+        self.tokens_sistema = len(system_prompt.split())
+        self.seg_por_token = seg_por_token
+
+    def _rutear(self, texto: str) -> str:
+        minusculas = texto.lower()
+        for patron, tool, campos in self.REGLAS:
+            if tool in self.nombres_tools and re.search(patron, minusculas):
+                params = []
+                if "tipo" in campos:
+                    params += [f'tipo="{t.capitalize()}"' for t in self.TIPOS if t in minusculas][:1]
+                if "ciudad" in campos:
+                    params += [f'ciudad="{c.title()}"' for c in self.CIUDADES if c in minusculas][:1]
+                return f"[USAR_TOOL:{' '.join([tool] + params)}]"
+        return "¡Hola! ¿En qué puedo ayudarte? 😊"
+
+    def invoke(self, entrada: Dict[str, Any]) -> _Respuesta:
+        texto = entrada["input"]
+        if texto.startswith("Has usado la herramienta"):
+            salida = "Aquí tienes la información que encontré. " * 3
+        else:
+            salida = self._rutear(texto)
+
+        tokens_prompt = self.tokens_sistema + len(texto.split())
+        tokens_salida = len(salida.split())
+        segundos = (tokens_prompt * 0.1 + tokens_salida) * self.seg_por_token
+        time.sleep(segundos)
+        return _Respuesta(
+            salida,
+            {
+                "model": self.modelo,
+                "prompt_eval_count": tokens_prompt,
+                "eval_count": tokens_salida,
+                "total_duration": int(segundos * 1e9),
+            },
+        )
+
+
+# ===== CARGA DE TURNOS =====
+
+
+def turnos_desde_db(limite: int = 100) -> List[Dict[str, Any]]:
+    """Últimos mensajes de usuario guardados en la base de datos"""
+    conn = database_helpers.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT m.contenido, c.usuario_id
+        FROM mensajes m
+        JOIN conversaciones c ON c.id = m.conversacion_id
+        WHERE m.rol = 'usuario'
+        ORDER BY m.id DESC
+        LIMIT ?
+        """,
+        (limite,),
+    )
+    turnos = [{"message": fila["contenido"], "usuario_id": fila["usuario_id"]} for fila in cursor.fetchall()]
+    conn.close()
+    return turnos[::-1]
+
+
+def turnos_desde_archivo(ruta: str, limite: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Turnos de un archivo NDJSON ({"message", "usuario_id"}) o texto plano"""
+    from utils.chat_lote import _leer_entrada, normalizar_items
+
+    with open(ruta, encoding="utf-8") as f:
+        turnos = normalizar_items(_leer_entrada(f))
+    return turnos[:limite] if limite else turnos
+
+
+# ===== REPRODUCCIÓN =====
+
+
+def _leer_configuracion(valor: str) -> Dict[str, Any]:
+    if os.path.isfile(valor):
+        with open(valor, encoding="utf-8") as f:
+            return json.load(f)
+    return json.loads(valor or "{}")
+
+
+def _importar_funcion(ruta: str):
+    modulo, funcion = ruta.split(":")
+    return getattr(importlib.import_module(modulo), funcion)
+
+
+@contextlib.contextmanager
+def _configuracion_aplicada(app_modulo, overrides: Dict[str, Any]):
+    """Aplica los overrides sobre Config, el prompt y las tools; los revierte al salir"""
+    overrides = dict(overrides)
+    prompt = overrides.pop("PROMPT", None)
+    nombres_tools = overrides.pop("TOOLS", None)
+
+    previos = {clave: getattr(Config, clave) for clave in overrides}
+    prompt_previo = llm.generar_system_prompt
+    tools_previas = app_modulo.tools
+    try:
+        for clave, valor in overrides.items():
+            setattr(Config, clave, valor)
+        if prompt:
+            llm.generar_system_prompt = _importar_funcion(prompt)
+        if nombres_tools is not None:
+            app_modulo.tools = [t for t in tools_previas if t.name in nombres_tools]
+        llm._chains.clear()
+        yield
+    finally:
+        for clave, valor in previos.items():
+            setattr(Config, clave, valor)
+        llm.generar_system_prompt = prompt_previo
+        app_modulo.tools = tools_previas
+        llm._chains.clear()
+
+
+def reproducir(app_modulo, turnos: List[Dict[str, Any]], overrides: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Pasa cada turno por procesar_chat y registra latencia, llamadas y tokens"""
+    llamadas: List[Dict[str, Any]] = []
+    obtener_chain_original = llm.obtener_chain
+
+    class _Grabadora:
+        def __init__(self, chain):
+            self.chain = chain
+
+        def invoke(self, entrada):
+            respuesta = self.chain.invoke(entrada)
+            llamadas.append(llm.extraer_uso(respuesta, "reproduccion"))
+            return respuesta
+
+    resultados = []
+    with _configuracion_aplicada(app_modulo, overrides):
+        llm.obtener_chain = lambda *a, **k: _Grabadora(obtener_chain_original(*a, **k))
+        try:
+            for indice, turno in enumerate(turnos):
+                llamadas.clear()
+                inicio = time.perf_counter()
+                respuesta, status = app_modulo.procesar_chat(dict(turno))
+                resultados.append(
+                    {
+                        "indice": indice,
+                        "status": status,
+                        "segundos": time.perf_counter() - inicio,
+                        "llamadas_llm": len(llamadas),
+                        "tokens_prompt": sum(u["tokens_prompt"] or 0 for u in llamadas),
+                        "tokens_generados": sum(u["tokens_generados"] or 0 for u in llamadas),
+                        "tool": respuesta.get("tool_used"),
+                        "error": respuesta.get("error"),
+                    }
+                )
+        finally:
+            llm.obtener_chain = obtener_chain_original
+    return resultados
+
+
+def _percentil(valores: List[float], p: float) -> Optional[float]:
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def resumir(resultados: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Métricas agregadas de una reproducción"""
+    segundos = [r["segundos"] for r in resultados]
+    n = len(resultados) or 1
+    tools: Dict[str, int] = {}
+    for r in resultados:
+        tools[r["tool"] or "(ninguna)"] = tools.get(r["tool"] or "(ninguna)", 0) + 1
+    return {
+        "turnos": len(resultados),
+        "errores": sum(1 for r in resultados if r["status"] >= 400),
+        "latencia_media": statistics.mean(segundos) if segundos else None,
+        "latencia_p50": _percentil(segundos, 50),
+        "latencia_p90": _percentil(segundos, 90),
+        "latencia_p99": _percentil(segundos, 99),
+        "llamadas_llm_por_turno": sum(r["llamadas_llm"] for r in resultados) / n,
+        "tokens_prompt_por_turno": sum(r["tokens_prompt"] for r in resultados) / n,
+        "tokens_generados_por_turno": sum(r["tokens_generados"] for r in resultados) / n,
+        "tools": tools,
+    }
+
+
+def comparar(
+    turnos: List[Dict[str, Any]],
+    config_a: Dict[str, Any],
+    config_b: Dict[str, Any],
+    simulado: bool = False,
+    seg_por_token: float = 0.0,
+) -> Dict[str, Any]:
+    """
+    Reproduce los turnos con ambas configuraciones sobre una copia de la base.
+
+    Returns:
+        {"a": resumen, "b": resumen, "diferencias_tool": [...], "detalle": {...}}
+    """
+    directorio = tempfile.mkdtemp(prefix="reproduccion_")
+    copia = os.path.join(directorio, "propiedades.db")
+    shutil.copyfile(database_helpers.DB_PATH, copia)
+
+    # Todo lo que lee o escribe datos apunta al directorio temporal: la base
+    # (tools incluidas, vía get_db_connection), el archivo de conversaciones
+    # y el índice semántico. Las tools corren en hilos porque un proceso hijo
+    # no vería estas sustituciones.
+    sustituciones = [
+        (database_helpers, "DB_PATH", copia),
+        (database_helpers, "ARCHIVO_DB_PATH", os.path.join(directorio, "archivo.db")),
+        (indice_semantico, "_indice", None),
+        (Config, "INDICE_SEMANTICO_DIR", os.path.join(directorio, "indice_semantico")),
+        (Config, "TOOL_PROCESOS", 0),
+        (Config, "CACHE_TTL_RESPUESTAS", 0),
+        (llm, "obtener_chain", llm.obtener_chain),
+    ]
+    originales = [(objeto, nombre, getattr(objeto, nombre)) for objeto, nombre, _ in sustituciones]
+    try:
+        for objeto, nombre, valor in sustituciones:
+            setattr(objeto, nombre, valor)
+
+        import app as app_modulo
+        from utils.cache import SinCache
+
+        app_modulo.cache = SinCache()
+
+        if simulado:
+            llm.obtener_chain = lambda tools, modelo=None, base_url=None, charla=False: ModeloSimulado(
+                modelo or Config.MODEL_NAME,
+                [] if charla else tools,
+                llm.generar_system_prompt_charla() if charla else llm.generar_system_prompt(tools),
+                seg_por_token,
+            )
+
+        detalle = {
+            "a": reproducir(app_modulo, turnos, config_a),
+            "b": reproducir(app_modulo, turnos, config_b),
+        }
+    finally:
+        for objeto, nombre, valor in originales:
+            setattr(objeto, nombre, valor)
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    diferencias = [
+        {"indice": a["indice"], "message": turnos[a["indice"]].get("message"), "a": a["tool"], "b": b["tool"]}
+        for a, b in zip(detalle["a"], detalle["b"])
+        if a["tool"] != b["tool"]
+    ]
+    return {
+        "a": resumir(detalle["a"]),
+        "b": resumir(detalle["b"]),
+        "diferencias_tool": diferencias,
+        "detalle": detalle,
+    }
+
+
+def _imprimir(reporte: Dict[str, Any]):
+    filas = (
+        ("turnos", "{}"),
+        ("errores", "{}"),
+        ("latencia_media", "{:.3f} s"),
+        ("latencia_p50", "{:.3f} s"),
+        ("latencia_p90", "{:.3f} s"),
+        ("latencia_p99", "{:.3f} s"),
+        ("llamadas_llm_por_turno", "{:.2f}"),
+        ("tokens_prompt_por_turno", "{:.1f}"),
+        ("tokens_generados_por_turno", "{:.1f}"),
+    )
+    print(f"{'métrica':<28}{'A':>14}{'B':>14}")
+    for clave, formato in filas:
+        valores = [reporte[lado][clave] for lado in ("a", "b")]
+        celdas = ["-" if v is None else formato.format(v) for v in valores]
+        print(f"{clave:<28}{celdas[0]:>14}{celdas[1]:>14}")
+
+    print("\nTools elegidas:")
+    for tool in sorted(set(reporte["a"]["tools"]) | set(reporte["b"]["tools"])):
+        print(f"   {tool:<33}{reporte['a']['tools'].get(tool, 0):>8}{reporte['b']['tools'].get(tool, 0):>14}")
+
+    diferencias = reporte["diferencias_tool"]
+    print(f"\nTurnos con distinta tool: {len(diferencias)}")
+    for d in diferencias[:20]:
+        print(f"   #{d['indice']} {d['message']!r}: {d['a']} -> {d['b']}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Reproduce turnos de usuario con dos configuraciones y compara métricas"
+    )
+    parser.add_argument("--fixture", help="NDJSON o texto plano con los turnos (por defecto, la tabla mensajes)")
+    parser.add_argument("--limite", type=int, default=100, help="Máximo de turnos a reproducir")
+    parser.add_argument("--a", default="{}", help="Overrides de la configuración A (JSON o archivo)")
+    parser.add_argument("--b", default="{}", help="Overrides de la configuración B (JSON o archivo)")
+    parser.add_argument("--simulado", action="store_true", help="Usar el modelo simulado en lugar de Ollama")
+    parser.add_argument(
+        "--seg-por-token",
+        type=float,
+        default=0.0,
+        help="Latencia simulada por token generado (solo con --simulado)",
+    )
+    parser.add_argument("--json", help="Guardar el reporte completo en este archivo")
+    args = parser.parse_args(argv)
+
+    if args.fixture:
+        turnos = turnos_desde_archivo(args.fixture, args.limite)
+    else:
+        turnos = turnos_desde_db(args.limite)
+    if not turnos:
+        print("⚠️  No hay turnos para reproducir")
+        return
+
+    print(f"🔁 Reproduciendo {len(turnos)} turnos con dos configuraciones...")
+    reporte = comparar(
+        turnos,
+        _leer_configuracion(args.a),
+        _leer_configuracion(args.b),
+        simulado=args.simulado,
+        seg_por_token=args.seg_por_token,
+    )
+    _imprimir(reporte)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reporte, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Reporte guardado en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
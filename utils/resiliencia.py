@@ -0,0 +1,132 @@
+"""
+Plazos, circuit breakers y latencias para las llamadas a backends lentos.
+
+    Deadline          plazo total de una petición; se propaga a cada etapa
+    CircuitBreaker    deja de llamar a un backend tras N fallos seguidos
+    VentanaLatencias  últimas latencias de una etapa, para calcular percentiles
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+
+class DeadlineExcedido(TimeoutError):
+    """Se agotó el plazo de la petición o de una etapa"""
+
+
+class CircuitoAbierto(RuntimeError):
+    """El backend está marcado como caído y no se le envían llamadas"""
+
+
+class Deadline:
+    """Plazo absoluto medido con reloj monotónico"""
+
+    def __init__(self, segundos: float):
+        self.segundos = segundos
+        self.limite = time.monotonic() + segundos
+
+    def restante(self) -> float:
+        return max(0.0, self.limite - time.monotonic())
+
+    def vencido(self) -> bool:
+        return self.restante() <= 0
+
+    def limitar(self, segundos: Optional[float]) -> float:
+        """El menor entre `segundos` y el tiempo que queda"""
+        restante = self.restante()
+        return restante if segundos is None else min(segundos, restante)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker clásico de tres estados.
+
+    cerrado     las llamadas pasan; `max_fallos` fallos seguidos lo abren
+    abierto     se rechaza todo durante `enfriamiento` segundos
+    semiabierto pasa una única llamada de prueba; su resultado lo cierra o reabre
+    """
+
+    def __init__(self, nombre: str, max_fallos: int = 5, enfriamiento: float = 30.0):
+        self.nombre = nombre
+        self.max_fallos = max_fallos
+        self.enfriamiento = enfriamiento
+        self._fallos = 0
+        self._abierto_desde: Optional[float] = None
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self) -> str:
+        if self._abierto_desde is None:
+            return "cerrado"
+        if time.monotonic() - self._abierto_desde < self.enfriamiento:
+            return "abierto"
+        return "semiabierto"
+
+    def reservar(self) -> Optional[str]:
+        """
+        Reserva una llamada al backend.
+
+        Returns:
+            "cerrado" si pasa normalmente, "prueba" si es la llamada de prueba
+            del estado semiabierto (quien la reserva debe registrar su resultado
+            o liberarla), o None si se rechaza
+        """
+        with self._lock:
+            estado = self.estado
+            if estado == "cerrado":
+                return "cerrado"
+            if estado == "semiabierto" and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return "prueba"
+            return None
+
+    def permitir(self) -> bool:
+        """True si se puede llamar al backend ahora"""
+        return self.reservar() is not None
+
+    def liberar_prueba(self):
+        """La llamada de prueba no llegó a hacerse (p. ej. se canceló en cola)"""
+        with self._lock:
+            self._prueba_en_curso = False
+
+    def registrar_exito(self):
+        with self._lock:
+            self._fallos = 0
+            self._abierto_desde = None
+            self._prueba_en_curso = False
+
+    def registrar_fallo(self):
+        with self._lock:
+            self._fallos += 1
+            if self._prueba_en_curso or self._fallos >= self.max_fallos:
+                self._abierto_desde = time.monotonic()
+            self._prueba_en_curso = False
+
+    def resumen(self) -> Dict[str, Any]:
+        return {"estado": self.estado, "fallos_seguidos": self._fallos}
+
+
+class VentanaLatencias:
+    """Últimas N latencias (segundos) de una etapa"""
+
+    def __init__(self, tamano: int = 200):
+        self._muestras: Deque[float] = deque(maxlen=tamano)
+        self._lock = threading.Lock()
+
+    def registrar(self, segundos: float):
+        with self._lock:
+            self._muestras.append(segundos)
+
+    def __len__(self):
+        return len(self._muestras)
+
+    def percentil(self, p: float) -> Optional[float]:
+        with self._lock:
+            if not self._muestras:
+                return None
+            ordenadas = sorted(self._muestras)
+        indice = min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))
+        return ordenadas[indice]